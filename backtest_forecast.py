@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmark_pipeline import BENCHMARK_DIR
+from location_registry import load_locations
+from train_monthly_forecast import (
+    MIN_FIT_MONTHS,
+    QUANTILES,
+    build_all_series,
+    fit_group,
+    future_index,
+    horizon_quantiles,
+    humidity_climatology,
+    load_monthly_frame,
+    month_residual_quantiles,
+    predict_group,
+)
+
+# Rolling-origin backtest of the monthly forecaster (train_monthly_forecast.py).
+#
+# For every cutoff c (months of history, from --min-train in steps of --step) each series is cut to its
+# first c months, forecast --horizon months ahead and compared with what was observed. Two models are
+# scored on the same folds:
+#   ridge        the regression of forecast_series() (month one-hots + trend + sin/cos, ±1.96 residual std)
+#   climatology  its short-series fallback (calendar-month means, ±1.96 series std)
+# Series whose truncated histories share a monthly index are fitted together (fit_group/predict_group,
+# one multi-output solve per cutoff), and cutoffs are spread over a process pool with --workers.
+# Humidity is scored as it is published (forecast_payload): both models' forecasts are replaced by the
+# calendar-month means of the training months, with band and quantiles re-centred and clipped to [0, 100].
+#
+# Reported per model, overall, per variable and per lead month: MAE, RMSE, bias, coverage of the
+# [ci_lower, ci_upper] band (nominal 95%) and its mean width, the share of actuals below each forecast
+# quantile (calibrated: equal to the level) and the mean pinball loss, plus fit/predict time. Results go
+# to data/benchmarks/backtest_<timestamp>.json.
+
+MODELS = ['ridge', 'climatology']
+DEFAULT_HORIZON = 12
+DEFAULT_MIN_TRAIN = 36
+
+
+# ----------------------------------------------
+# Models on a group of series sharing a monthly index (columns of Y)
+# ----------------------------------------------
+
+def fit_climatology(idx: pd.DatetimeIndex, Y: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (calendar-month means 12 x k with the overall mean for unseen months, overall mean, std, residual
+    quantiles per calendar month) per column, as climatology_forecast() computes them.
+    """
+    month = idx.month.to_numpy() - 1
+    counts = np.bincount(month, minlength=12).astype(float)
+    sums = np.zeros((12, Y.shape[1]))
+    np.add.at(sums, month, Y)
+    overall = Y.mean(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts[:, None] > 0, sums / counts[:, None], overall)
+    std = Y.std(axis=0, ddof=1) if Y.shape[0] > 1 else np.zeros(Y.shape[1])
+    by_month = month_residual_quantiles(month + 1, Y - means[month], int((counts > 0).sum()))
+    return means, overall, np.nan_to_num(std), by_month
+
+
+def predict_climatology(idx: pd.DatetimeIndex, fit: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+                        horizon: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    means, _, std, by_month = fit
+    idx_future = future_index(idx[-1], horizon)
+    preds = means[idx_future.month.to_numpy() - 1]
+    return preds, preds - 1.96 * std, preds + 1.96 * std, horizon_quantiles(preds, by_month, idx_future)
+
+
+def fit_ridge(idx: pd.DatetimeIndex, Y: np.ndarray, horizon: int):
+    return fit_group(idx, Y, horizon)
+
+
+def predict_ridge(idx: pd.DatetimeIndex, fit, horizon: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    preds, lower, upper, _, quantiles = predict_group(idx, fit, horizon)
+    return preds, lower, upper, quantiles
+
+
+def publish_humidity(idx: pd.DatetimeIndex, Y: np.ndarray, columns: np.ndarray, horizon: int,
+                     forecast: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]) -> Tuple[np.ndarray, ...]:
+    """forecast (preds, lower, upper, quantiles) with forecast_payload's humidity treatment applied to `columns` of Y."""
+    preds, lower, upper, quantiles = (a.copy() for a in forecast)
+    target_months = list(future_index(idx[-1], horizon).month)
+    for j in columns:
+        preds[:, j], lower[:, j], upper[:, j], quantiles[:, :, j] = humidity_climatology(
+            pd.Series(Y[:, j], index=idx), target_months, preds[:, j], lower[:, j], upper[:, j], quantiles[:, :, j])
+    return preds, lower, upper, quantiles
+
+
+FIT = {'ridge': fit_ridge, 'climatology': fit_climatology}
+PREDICT = {'ridge': predict_ridge, 'climatology': predict_climatology}
+
+# Per-observation fold results; quantile_error (actual - quantile) is levels x observations
+FOLD_KEYS = ['series', 'lead', 'error', 'covered', 'width', 'quantile_error']
+
+
+# ----------------------------------------------
+# Folds
+# ----------------------------------------------
+
+def index_groups(series_list: List[pd.Series]) -> List[Tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]]:
+    """(monthly index, series ids, values len(index) x k) for every set of series with identical indexes."""
+    groups: Dict[bytes, List[int]] = {}
+    for i, s in enumerate(series_list):
+        groups.setdefault(s.index.values.tobytes(), []).append(i)
+    out = []
+    for members in groups.values():
+        idx = series_list[members[0]].index
+        out.append((idx, np.array(members), np.column_stack([series_list[i].to_numpy(dtype=float) for i in members])))
+    return out
+
+
+def backtest_cutoffs(series_list: List[pd.Series], cutoffs: List[int], horizon: int,
+                     humidity: Optional[np.ndarray] = None) -> Dict:
+    """
+    Forecast errors of every model for the given cutoffs. Returns per model flat arrays (series id, lead,
+    error, covered, width) over all folds with an observed target, and total fit/predict seconds.
+    humidity flags the series (by id) that are scored with the published humidity treatment.
+    """
+    if humidity is None:
+        humidity = np.zeros(len(series_list), dtype=bool)
+    out = {m: {key: [] for key in FOLD_KEYS} for m in MODELS}
+    for rec in out.values():
+        rec.update({'fit_s': 0.0, 'predict_s': 0.0, 'fits': 0})
+    full = index_groups(series_list)
+    months = [idx.values.astype('datetime64[M]') for idx, _, _ in full]
+    leads = np.arange(1, horizon + 1)
+    for c in cutoffs:
+        # Index groups whose first c months coincide are fitted together
+        folds: Dict[bytes, List[int]] = {}
+        for g, (idx, _, _) in enumerate(full):
+            if len(idx) > c:
+                folds.setdefault(idx[:c].values.tobytes(), []).append(g)
+        for gs in folds.values():
+            idx = full[gs[0]][0][:c]
+            Y = np.hstack([full[g][2][:c] for g in gs])
+            target = idx[-1:].values.astype('datetime64[M]') + leads
+            actual = []
+            for g in gs:
+                pos = np.minimum(np.searchsorted(months[g], target), len(months[g]) - 1)
+                hit = months[g][pos] == target
+                actual.append(np.where(hit[:, None], full[g][2][pos], np.nan))
+            actual = np.hstack(actual)
+            observed = ~np.isnan(actual)
+            lead = np.broadcast_to(leads[:, None], actual.shape)[observed]
+            ids = np.concatenate([full[g][1] for g in gs])
+            series_ids = np.broadcast_to(ids[None, :], actual.shape)[observed]
+            humidity_columns = np.flatnonzero(humidity[ids])
+            for model in MODELS:
+                started = time.perf_counter()
+                fit = FIT[model](idx, Y, horizon)
+                fitted = time.perf_counter()
+                preds, lower, upper, quantiles = PREDICT[model](idx, fit, horizon)
+                if humidity_columns.size:
+                    preds, lower, upper, quantiles = publish_humidity(idx, Y, humidity_columns, horizon,
+                                                                      (preds, lower, upper, quantiles))
+                rec = out[model]
+                rec['fit_s'] += fitted - started
+                rec['predict_s'] += time.perf_counter() - fitted
+                rec['fits'] += 1
+                rec['series'].append(series_ids)
+                rec['lead'].append(lead)
+                rec['error'].append((preds - actual)[observed])
+                rec['covered'].append(((actual >= lower) & (actual <= upper))[observed])
+                rec['width'].append((upper - lower)[observed])
+                # levels x observations
+                rec['quantile_error'].append((actual[None] - quantiles)[:, observed])
+    for rec in out.values():
+        rec['quantile_error'] = (np.concatenate(rec['quantile_error'], axis=1) if rec['quantile_error']
+                                 else np.empty((len(QUANTILES), 0)))
+        for key in FOLD_KEYS[:-1]:
+            rec[key] = np.concatenate(rec[key]) if rec[key] else np.empty(0)
+    return out
+
+
+def run_backtest(series_list: List[pd.Series], cutoffs: List[int], horizon: int,
+                 workers: int = 1, humidity: Optional[np.ndarray] = None) -> Dict:
+    """backtest_cutoffs() over all cutoffs, interleaved across `workers` processes, merged per model."""
+    if workers <= 1 or len(cutoffs) <= 1:
+        parts = [backtest_cutoffs(series_list, cutoffs, horizon, humidity)]
+    else:
+        shards = [cutoffs[w::workers] for w in range(workers) if cutoffs[w::workers]]
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            parts = list(pool.map(backtest_cutoffs, [series_list] * len(shards), shards, [horizon] * len(shards),
+                                  [humidity] * len(shards)))
+    merged = {}
+    for model in MODELS:
+        recs = [p[model] for p in parts]
+        merged[model] = {key: np.concatenate([r[key] for r in recs], axis=-1) for key in FOLD_KEYS}
+        for key in ('fit_s', 'predict_s', 'fits'):
+            merged[model][key] = sum(r[key] for r in recs)
+    return merged
+
+
+# ----------------------------------------------
+# Scores
+# ----------------------------------------------
+
+def scores(frame: pd.DataFrame) -> Dict:
+    err = frame['error'].to_numpy()
+    return {
+        'n': int(err.size),
+        'mae': float(np.mean(np.abs(err))) if err.size else None,
+        'rmse': float(np.sqrt(np.mean(err ** 2))) if err.size else None,
+        'bias': float(np.mean(err)) if err.size else None,
+        'coverage': float(frame['covered'].mean()) if err.size else None,
+        'mean_width': float(frame['width'].mean()) if err.size else None,
+        'pinball': float(np.mean([frame[f'pinball_{i}'].mean() for i in range(len(QUANTILES))])) if err.size else None,
+        'quantile_below': {f'{q:g}': float(frame[f'below_{i}'].mean()) if err.size else None
+                           for i, q in enumerate(QUANTILES)},
+    }
+
+
+def summarize(merged: Dict, labels: List[Tuple[str, str]]) -> Dict:
+    """Scores per model: overall, per variable, per location/variable series and per lead month."""
+    locations = np.array([loc for loc, _ in labels])
+    variables = np.array([var for _, var in labels])
+    summary = {}
+    for model, rec in merged.items():
+        frame = pd.DataFrame({
+            'location': locations[rec['series'].astype(int)] if rec['series'].size else [],
+            'variable': variables[rec['series'].astype(int)] if rec['series'].size else [],
+            'lead': rec['lead'].astype(int),
+            'error': rec['error'],
+            'covered': rec['covered'].astype(bool),
+            'width': rec['width'],
+        })
+        levels = np.array(QUANTILES)[:, None]
+        qe = rec['quantile_error']
+        pinball = np.maximum(levels * qe, (levels - 1.0) * qe)
+        for i in range(len(QUANTILES)):
+            frame[f'below_{i}'] = qe[i] < 0
+            frame[f'pinball_{i}'] = pinball[i]
+        summary[model] = {
+            'overall': scores(frame),
+            'by_variable': {var: scores(g) for var, g in frame.groupby('variable', sort=True)},
+            'by_series': {f'{loc}/{var}': scores(g) for (loc, var), g in frame.groupby(['location', 'variable'], sort=True)},
+            'by_lead': {str(lead): scores(g) for lead, g in frame.groupby('lead', sort=True)},
+            'timings': {
+                'fits': rec['fits'],
+                'fit_s': rec['fit_s'],
+                'predict_s': rec['predict_s'],
+                'fit_ms_per_fit': 1000.0 * rec['fit_s'] / rec['fits'] if rec['fits'] else None,
+                'predict_ms_per_fit': 1000.0 * rec['predict_s'] / rec['fits'] if rec['fits'] else None,
+            },
+        }
+    return summary
+
+
+def format_summary(summary: Dict) -> str:
+    lines = [f"{'model':<12} {'variable':<14} {'n':>7} {'MAE':>9} {'RMSE':>9} {'bias':>9} {'cover':>6} {'width':>9} "
+             f"{'pinball':>9}"]
+    for model, s in summary.items():
+        for name, sc in [('all', s['overall'])] + list(s['by_variable'].items()):
+            if not sc['n']:
+                continue
+            lines.append(f"{model:<12} {name:<14} {sc['n']:>7} {sc['mae']:>9.3f} {sc['rmse']:>9.3f} "
+                         f"{sc['bias']:>9.3f} {sc['coverage']:>6.1%} {sc['mean_width']:>9.3f} {sc['pinball']:>9.3f}")
+    for model, s in summary.items():
+        if s['overall']['n']:
+            below = ', '.join(f'{q}: {v:.1%}' for q, v in s['overall']['quantile_below'].items())
+            lines.append(f'{model}: share of actuals below each quantile ({below})')
+    for model, s in summary.items():
+        t = s['timings']
+        lines.append(f"{model}: {t['fits']} fits, fit {t['fit_s']:.3f}s, predict {t['predict_s']:.3f}s")
+    return '\n'.join(lines)
+
+
+def load_series(locations: List[str]) -> Tuple[List[pd.Series], List[Tuple[str, str]]]:
+    """Every forecast target of every location as train_monthly_forecast builds them, with (location, name)."""
+    series_list, labels = [], []
+    for loc in locations:
+        try:
+            monthly, _ = load_monthly_frame(loc)
+        except Exception as e:
+            print(f"Failed {loc}: {e}")
+            continue
+        for spec in build_all_series(monthly):
+            series_list.append(spec.values.dropna())
+            labels.append((loc, spec.name))
+    return series_list, labels
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of the monthly forecaster.')
+    parser.add_argument('--locations', default=None, help='Comma-separated location keys (default: all registered)')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help='Months forecast at every cutoff')
+    parser.add_argument('--min-train', type=int, default=DEFAULT_MIN_TRAIN,
+                        help=f'Months of history at the first cutoff (at least {MIN_FIT_MONTHS}, the ridge minimum)')
+    parser.add_argument('--step', type=int, default=1, help='Months between cutoffs')
+    parser.add_argument('--workers', type=int, default=1, help='Processes the cutoffs are spread over')
+    parser.add_argument('--output', default=None, help='Output JSON path (default data/benchmarks/backtest_<ts>.json)')
+    args = parser.parse_args(argv)
+    if args.min_train < MIN_FIT_MONTHS:
+        parser.error(f'--min-train must be at least {MIN_FIT_MONTHS}')
+
+    locations = args.locations.split(',') if args.locations else list(load_locations())
+    started = time.perf_counter()
+    series_list, labels = load_series(locations)
+    if not series_list:
+        print('No series to backtest')
+        return
+    longest = max(len(s) for s in series_list)
+    cutoffs = list(range(args.min_train, longest, args.step))
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    humidity = np.array([name == 'humidity' for _, name in labels])
+    merged = run_backtest(series_list, cutoffs, args.horizon, args.workers, humidity)
+    wall_s = time.perf_counter() - started
+
+    summary = summarize(merged, labels)
+    print(format_summary(summary))
+    print(f'{len(series_list)} series, {len(cutoffs)} cutoffs, {wall_s:.2f}s ({args.workers} worker(s))')
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {'locations': locations, 'horizon': args.horizon, 'min_train': args.min_train, 'step': args.step,
+                   'workers': args.workers, 'cutoffs': len(cutoffs), 'series': len(series_list)},
+        'timings': {'load_s': load_s, 'backtest_s': wall_s},
+        'models': summary,
+    }
+    out_path = args.output or os.path.join(BENCHMARK_DIR, f"backtest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {out_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+import os
+import gc
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nasa_power_download import LOCATIONS, parse_daily_response, parse_hourly_response
+from preprocess_probabilities import (
+    HOURLY_VARIABLES,
+    THRESHOLDS,
+    build_daily_json,
+    build_hourly_json,
+    calculate_day_of_year_stats,
+    summarize_city,
+)
+from train_monthly_forecast import forecast_batch, forecast_series, monthly_frame_from_daily, monthly_time_series
+
+# Benchmark suite for the download -> preprocess -> forecast pipeline on synthetic NASA POWER data.
+#
+# Every stage runs once untimed (warm-up), `repeat` times for wall time, and once more under
+# tracemalloc for peak Python/numpy heap memory. Stages run at each requested number of years;
+# the scaling block fits time ~ rows^exponent across those scales (1.0 = linear).
+# Results are written as JSON so runs can be diffed across commits and machines.
+
+BENCHMARK_DIR = os.path.join('data', 'benchmarks')
+
+DAILY_VARIABLES = ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 'WS2M', 'WS10M', 'WS10M_MAX',
+                   'RH2M', 'PS', 'QV2M', 'ALLSKY_SFC_SW_DWN']
+
+# Seasonal model per base variable: (annual mean, seasonal amplitude, day-to-day noise sd, lower, upper).
+# Amplitudes peak mid-July; MAX/MIN, 10 m wind and precipitation are derived from these below.
+SYNTHETIC_CLIMATE: Dict[str, Tuple[float, float, float, float, float]] = {
+    'T2M': (13.0, 11.0, 2.5, -40.0, 50.0),
+    'WS2M': (2.0, 0.4, 0.8, 0.0, 30.0),
+    'RH2M': (68.0, -10.0, 9.0, 0.0, 100.0),
+    'PS': (93.5, -0.4, 0.5, 80.0, 105.0),
+    'QV2M': (7.0, 4.0, 1.2, 0.0, 30.0),
+    'ALLSKY_SFC_SW_DWN': (4.0, 2.8, 1.1, 0.0, 12.0),
+}
+
+STAGES = ['parse_daily_response', 'parse_hourly_response', 'calculate_day_of_year_stats', 'build_hourly_json',
+          'summarize_city', 'monthly_time_series', 'monthly_frame_from_daily', 'forecast_series',
+          'forecast_batch']
+
+
+# ----------------------------------------------
+# Synthetic data shaped like data/raw/*_raw.csv
+# ----------------------------------------------
+
+def _seasonal(rng: np.random.Generator, doy: np.ndarray, spec: Tuple[float, float, float, float, float],
+              shift: float) -> np.ndarray:
+    mean, amp, noise, lower, upper = spec
+    season = np.cos(2.0 * np.pi * (doy - 196.0) / 365.25)
+    values = mean + shift + amp * season + rng.normal(0.0, noise, doy.shape[0])
+    return np.clip(values, lower, upper)
+
+
+def synthetic_frame(index: pd.DatetimeIndex, variables: List[str], seed: int = 0) -> pd.DataFrame:
+    """
+    Weather-like columns for `index` (daily or hourly): seasonal cycles plus noise, skewed intermittent
+    precipitation and a diurnal cycle for sub-daily indexes. Values are rounded like the API export.
+    """
+    rng = np.random.default_rng(seed)
+    n = index.shape[0]
+    doy = index.dayofyear.to_numpy().astype(float)
+    hourly = n > 1 and (index[1] - index[0]) < pd.Timedelta(days=1)
+    diurnal = np.sin(2.0 * np.pi * (index.hour.to_numpy() - 9.0) / 24.0) if hourly else np.zeros(n)
+    shift = rng.normal(0.0, 1.5)  # per-location climate offset
+
+    base = {var: _seasonal(rng, doy, spec, shift if var == 'T2M' else 0.0) for var, spec in SYNTHETIC_CLIMATE.items()}
+    base['T2M'] = base['T2M'] + 5.0 * diurnal
+    base['RH2M'] = np.clip(base['RH2M'] - 15.0 * diurnal, 0.0, 100.0)
+    if hourly:
+        base['ALLSKY_SFC_SW_DWN'] = np.clip(base['ALLSKY_SFC_SW_DWN'] * (1.0 + 2.0 * diurnal), 0.0, None)
+    spread = np.abs(rng.normal(5.0, 1.5, n))
+    base['T2M_MAX'] = base['T2M'] + spread
+    base['T2M_MIN'] = base['T2M'] - spread
+    base['WS10M'] = base['WS2M'] * rng.uniform(1.4, 1.7, n)
+    base['WS10M_MAX'] = base['WS10M'] * rng.uniform(1.5, 2.5, n)
+    # Wet-day occurrence with a spring maximum; hourly rain is rarer and lighter per step
+    scale = 6.0 if hourly else 1.0
+    wet_prob = (0.33 + 0.12 * np.cos(2.0 * np.pi * (doy - 120.0) / 365.25)) / scale
+    base['PRECTOTCORR'] = np.where(rng.random(n) < wet_prob, rng.gamma(0.7, 4.0 / scale, n), 0.0)
+
+    data = {var: np.round(base[var], 4 if var == 'ALLSKY_SFC_SW_DWN' else 2) for var in variables if var in base}
+    return pd.DataFrame(data, index=index)
+
+
+def synthetic_daily_frame(years: int, variables: Optional[List[str]] = None, seed: int = 0,
+                          start_year: int = 2005) -> pd.DataFrame:
+    index = pd.date_range(f'{start_year}-01-01', f'{start_year + years - 1}-12-31', freq='D', name='date')
+    return synthetic_frame(index, variables or DAILY_VARIABLES, seed)
+
+
+def synthetic_hourly_frame(years: int, variables: Optional[List[str]] = None, seed: int = 0,
+                           start_year: int = 2005) -> pd.DataFrame:
+    index = pd.date_range(f'{start_year}-01-01', f'{start_year + years - 1}-12-31 23:00', freq='h', name='datetime')
+    return synthetic_frame(index, variables or HOURLY_VARIABLES, seed)
+
+
+def to_power_response(df: pd.DataFrame, resolution: str) -> Dict:
+    """
+    Wrap a frame in the NASA POWER point API JSON layout: parameter -> {timestamp key: value}, with
+    YYYYMMDD keys for daily and YYYYMMDDHH keys for hourly (as the hourly endpoint returns them).
+    """
+    fmt = '%Y%m%d' if resolution == 'daily' else '%Y%m%d%H'
+    keys = list(df.index.strftime(fmt))
+    parameter = {var: dict(zip(keys, df[var].tolist())) for var in df.columns}
+    return {'type': 'Feature', 'properties': {'parameter': parameter}}
+
+
+# ----------------------------------------------
+# Measurement
+# ----------------------------------------------
+
+def measure(fn: Callable[[], object], repeat: int = 3) -> Dict:
+    """Best/mean wall time over `repeat` runs after one warm-up, plus peak traced memory of one extra run."""
+    fn()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'wall_s_best': min(times),
+        'wall_s_mean': float(np.mean(times)),
+        'peak_mem_mb': peak / 1e6,
+    }
+
+
+def scaling_exponent(rows: List[int], times: List[float]) -> Optional[float]:
+    """Least-squares slope of log(time) against log(rows); None with fewer than two distinct scales."""
+    x = np.log(np.asarray(rows, dtype=float))
+    y = np.log(np.maximum(np.asarray(times, dtype=float), 1e-9))
+    if np.unique(x).shape[0] < 2:
+        return None
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def _location_keys(n_locations: int) -> List[str]:
+    # Stages look up coordinates/names in LOCATIONS, so synthetic locations reuse its keys cyclically
+    keys = list(LOCATIONS.keys())
+    return [keys[i % len(keys)] for i in range(n_locations)]
+
+
+def benchmark_scale(years: int, n_locations: int, variables: List[str], repeat: int = 3,
+                    stages: Optional[List[str]] = None, seed: int = 0) -> Dict:
+    """Run every selected stage over n_locations synthetic locations of `years` years each."""
+    stages = stages or STAGES
+    hourly_variables = [v for v in variables if v in HOURLY_VARIABLES]
+    locations = []
+    for i, key in enumerate(_location_keys(n_locations)):
+        daily = synthetic_daily_frame(years, variables, seed + i)
+        hourly = synthetic_hourly_frame(years, hourly_variables, seed + 1000 + i) if hourly_variables else pd.DataFrame()
+        locations.append((key, daily, hourly))
+
+    daily_rows = sum(len(d) for _, d, _ in locations)
+    hourly_rows = sum(len(h) for _, _, h in locations)
+    result = {
+        'years': years,
+        'locations': n_locations,
+        'daily_rows': daily_rows,
+        'hourly_rows': hourly_rows,
+        'stages': {},
+    }
+
+    def run(stage: str, fn: Callable[[], object], rows: int):
+        if stage in stages:
+            result['stages'][stage] = dict(measure(fn, repeat), rows=rows)
+            print(f"  {years:>3}y {stage:<28} {result['stages'][stage]['wall_s_best']:.4f}s "
+                  f"peak {result['stages'][stage]['peak_mem_mb']:.1f} MB")
+
+    if 'parse_daily_response' in stages:
+        daily_responses = [to_power_response(d, 'daily') for _, d, _ in locations]
+        run('parse_daily_response', lambda: [parse_daily_response(r) for r in daily_responses], daily_rows)
+        del daily_responses
+    if 'parse_hourly_response' in stages and hourly_rows:
+        hourly_responses = [to_power_response(h, 'hourly') for _, _, h in locations]
+        run('parse_hourly_response', lambda: [parse_hourly_response(r) for r in hourly_responses], hourly_rows)
+        del hourly_responses
+
+    daily_vars = [v for v in THRESHOLDS if v in variables]
+    run('calculate_day_of_year_stats',
+        lambda: [calculate_day_of_year_stats(d, v, THRESHOLDS[v]) for _, d, _ in locations for v in daily_vars],
+        daily_rows)
+    if hourly_rows:
+        run('build_hourly_json', lambda: [build_hourly_json(k, h) for k, _, h in locations], hourly_rows)
+    run('summarize_city', lambda: [summarize_city(d, k) for k, d, _ in locations], daily_rows)
+
+    if 'monthly_frame_from_daily' in stages:
+        run('monthly_frame_from_daily', lambda: [monthly_frame_from_daily(d) for _, d, _ in locations], daily_rows)
+    if {'monthly_time_series', 'forecast_series', 'forecast_batch'} & set(stages):
+        series_vars = [v for v in ('PRECTOTCORR', 'T2M_MAX', 'WS10M_MAX', 'RH2M') if v in daily_vars]
+        stats = [build_daily_json(k, d) for k, d, _ in locations]
+        run('monthly_time_series',
+            lambda: [monthly_time_series(s, v) for s in stats for v in series_vars], daily_rows)
+        monthly = [monthly_time_series(s, v)[0] for s in stats for v in series_vars]
+        run('forecast_series', lambda: [forecast_series(m, horizon=12) for m in monthly],
+            sum(len(m) for m in monthly))
+        run('forecast_batch', lambda: forecast_batch(monthly, horizon=12), sum(len(m) for m in monthly))
+    return result
+
+
+def run_benchmarks(years_list: List[int], n_locations: int = 1, variables: Optional[List[str]] = None,
+                   repeat: int = 3, stages: Optional[List[str]] = None, seed: int = 0) -> Dict:
+    variables = variables or DAILY_VARIABLES
+    scales = []
+    for years in years_list:
+        print(f'Scale: {years} years x {n_locations} location(s)')
+        scales.append(benchmark_scale(years, n_locations, variables, repeat, stages, seed))
+
+    scaling = {}
+    for stage in stages or STAGES:
+        points = [(s['stages'][stage]['rows'], s['stages'][stage]['wall_s_best']) for s in scales if stage in s['stages']]
+        if points:
+            scaling[stage] = {
+                'rows': [p[0] for p in points],
+                'wall_s_best': [p[1] for p in points],
+                'exponent': scaling_exponent([p[0] for p in points], [p[1] for p in points]),
+            }
+
+    return {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'years': years_list,
+            'locations': n_locations,
+            'variables': variables,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+        },
+        'scales': scales,
+        'scaling': scaling,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages on synthetic NASA POWER data.')
+    parser.add_argument('--years', type=int, nargs='+', default=[5, 10, 20],
+                        help='Record lengths to benchmark (one scale per value)')
+    parser.add_argument('--locations', type=int, default=1, help='Synthetic locations per scale')
+    parser.add_argument('--variables', nargs='+', default=DAILY_VARIABLES)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (best and mean are reported)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON report path (default data/benchmarks/pipeline_<timestamp>.json)')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(sorted(args.years), args.locations, args.variables, args.repeat, args.stages, args.seed)
+    output = args.output or os.path.join(BENCHMARK_DIR, f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print('\nScaling (time ~ rows^exponent):')
+    for stage, s in report['scaling'].items():
+        exponent = 'n/a' if s['exponent'] is None else f"{s['exponent']:.2f}"
+        print(f'  {stage:<28} {exponent}')
+    print(f'Saved benchmark report: {output}')
+
+
+if __name__ == '__main__':
+    main()
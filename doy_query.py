@@ -0,0 +1,138 @@
+import os
+import argparse
+from typing import Dict, Union
+
+import numpy as np
+
+# Arbitrary-threshold queries against the per-DOY sorted samples persisted by preprocess_probabilities.py
+# (<city>_doy_samples.npz). Each variable is stored CSR-style: `values` holds every sample sorted by
+# (DOY, value) and `offsets[d-1]:offsets[d]` is the slice for day-of-year d. Queries are vectorized
+# binary searches over those slices, so thousands of (threshold, DOY) pairs resolve in one call.
+
+PROCESSED_DIR = os.path.join('data', 'processed')
+
+ArrayLike = Union[float, int, np.ndarray, list]
+
+
+def samples_path(city_key: str, processed_dir: str = PROCESSED_DIR) -> str:
+    return os.path.join(processed_dir, f'{city_key}_doy_samples.npz')
+
+
+class DoySamples:
+    """Sorted per-DOY samples of one (location, variable)."""
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray):
+        if offsets.shape != (367,):
+            raise ValueError(f'offsets must have 367 entries (DOY 1..366 boundaries), got {offsets.shape}')
+        self.values = np.asarray(values, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, counts: np.ndarray) -> 'DoySamples':
+        """Build from a sorted, NaN-padded (366 x width) sample matrix as made by grouped_sample_matrix."""
+        valid = np.arange(matrix.shape[1])[None, :] < counts[:, None]
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        return cls(matrix[valid], offsets)
+
+    def sample_size(self, doy: ArrayLike) -> np.ndarray:
+        d = np.asarray(doy, dtype=np.int64)
+        return self.offsets[d] - self.offsets[d - 1]
+
+    def _insertion_point(self, x: np.ndarray, doy: np.ndarray, strict: bool) -> np.ndarray:
+        # Batched binary search within each DOY slice; strict=False counts values <= x, strict=True values < x
+        lo = self.offsets[doy - 1].copy()
+        hi = self.offsets[doy].copy()
+        last = max(self.values.shape[0] - 1, 0)
+        values = self.values if self.values.size else np.zeros(1)
+        while True:
+            active = lo < hi
+            if not active.any():
+                return lo
+            mid = (lo + hi) // 2
+            v = values[np.minimum(mid, last)]
+            right = active & ((v < x) if strict else (v <= x))
+            lo = np.where(right, mid + 1, lo)
+            hi = np.where(active & ~right, mid, hi)
+
+    def _prepare(self, x: ArrayLike, doy: ArrayLike):
+        x_arr, d_arr = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(doy, dtype=np.int64))
+        if ((d_arr < 1) | (d_arr > 366)).any():
+            raise ValueError('doy must be in 1..366')
+        return x_arr.ravel(), d_arr.ravel(), x_arr.shape
+
+    def prob_above(self, x: ArrayLike, doy: ArrayLike) -> np.ndarray:
+        """P(variable > x on DOY d); x and doy broadcast against each other. NaN where a DOY has no samples."""
+        xs, ds, shape = self._prepare(x, doy)
+        n = self.offsets[ds] - self.offsets[ds - 1]
+        count_le = self._insertion_point(xs, ds, strict=False) - self.offsets[ds - 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = np.where(n > 0, (n - count_le) / n, np.nan)
+        return out.reshape(shape)[()]
+
+    def prob_below(self, x: ArrayLike, doy: ArrayLike) -> np.ndarray:
+        """P(variable < x on DOY d); same conventions as prob_above."""
+        xs, ds, shape = self._prepare(x, doy)
+        n = self.offsets[ds] - self.offsets[ds - 1]
+        count_lt = self._insertion_point(xs, ds, strict=True) - self.offsets[ds - 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = np.where(n > 0, count_lt / n, np.nan)
+        return out.reshape(shape)[()]
+
+    def quantile(self, q: ArrayLike, doy: ArrayLike) -> np.ndarray:
+        """Value at quantile q (0..1) on DOY d with linear interpolation, matching the JSON percentiles."""
+        qs, ds, shape = self._prepare(q, doy)
+        if ((qs < 0) | (qs > 1)).any():
+            raise ValueError('q must be in [0, 1]')
+        start = self.offsets[ds - 1]
+        n = self.offsets[ds] - start
+        virtual = qs * np.maximum(n - 1, 0)
+        lo = np.floor(virtual).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+        values = self.values if self.values.size else np.full(1, np.nan)
+        last = values.shape[0] - 1
+        a = values[np.minimum(start + lo, last)]
+        b = values[np.minimum(start + hi, last)]
+        t = virtual - lo
+        diff = b - a
+        out = np.where(t >= 0.5, b - diff * (1.0 - t), a + diff * t)
+        return np.where(n > 0, out, np.nan).reshape(shape)[()]
+
+
+def save_doy_samples(city_key: str, samples: Dict[str, DoySamples], processed_dir: str = PROCESSED_DIR) -> str:
+    path = samples_path(city_key, processed_dir)
+    arrays = {}
+    for var, s in samples.items():
+        arrays[f'{var}/values'] = s.values
+        arrays[f'{var}/offsets'] = s.offsets
+    np.savez(path, **arrays)
+    return path
+
+
+def load_doy_samples(city_key: str, processed_dir: str = PROCESSED_DIR) -> Dict[str, DoySamples]:
+    """Load every variable's sorted samples for a location."""
+    with np.load(samples_path(city_key, processed_dir), allow_pickle=False) as data:
+        variables = sorted({key.split('/')[0] for key in data.files})
+        return {var: DoySamples(data[f'{var}/values'], data[f'{var}/offsets']) for var in variables}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query per-DOY exceedance probabilities and percentiles.')
+    parser.add_argument('city')
+    parser.add_argument('variable')
+    parser.add_argument('--doy', type=int, nargs='+', required=True, help='Day(s) of year, 1..366')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--above', type=float, help='Report P(variable > value)')
+    group.add_argument('--below', type=float, help='Report P(variable < value)')
+    group.add_argument('--quantile', type=float, help='Report the value at this quantile (0..1)')
+    args = parser.parse_args()
+
+    s = load_doy_samples(args.city)[args.variable]
+    doys = np.array(args.doy)
+    if args.above is not None:
+        result, label = s.prob_above(args.above, doys), f'P({args.variable} > {args.above})'
+    elif args.below is not None:
+        result, label = s.prob_below(args.below, doys), f'P({args.variable} < {args.below})'
+    else:
+        result, label = s.quantile(args.quantile, doys), f'{args.variable} q{args.quantile}'
+    for d, r, n in zip(doys, np.atleast_1d(result), s.sample_size(doys)):
+        print(f'{args.city} DOY {d}: {label} = {r:.4f} (n={n})')
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Persistent cache of fitted monthly forecasts, so scheduled reruns only refit series whose inputs changed.
+#
+# Layout: data/cache/forecast/forecasts.json
+#   {key: {label, preds, lower, upper, months, quantiles, created_at, last_used}}
+#   key = sha256 of the series (monthly index + values) and the model configuration, which covers the
+#   make_features()/fitting code and the hyperparameters (train_monthly_forecast.model_config()).
+#
+# One label ("<location>/<series>") has at most one entry: storing a new fit for a label evicts the fit
+# of its previous inputs, which can never be hit again. Beyond max_entries the least recently used
+# entries are evicted. Floats round-trip exactly through JSON, so cached forecasts equal refitted ones.
+
+CACHE_DIR = os.path.join('data', 'cache', 'forecast')
+CACHE_FILE = 'forecasts.json'
+DEFAULT_MAX_ENTRIES = 10_000
+
+# (preds, lower, upper, months, quantiles levels x horizon), as train_monthly_forecast returns them
+Fit = Tuple[np.ndarray, np.ndarray, np.ndarray, List[str], np.ndarray]
+
+
+def series_key(series: pd.Series, config: Dict) -> str:
+    """Fingerprint of one input series (index and float64 values) under a model configuration."""
+    h = hashlib.sha256()
+    h.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+    h.update(series.index.values.astype('datetime64[ns]').tobytes())
+    h.update(np.ascontiguousarray(series.to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+
+class ForecastCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._dirty = False
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries: Dict[str, Dict] = self._load()
+
+    def _path(self) -> str:
+        return os.path.join(self.cache_dir, CACHE_FILE)
+
+    def _load(self) -> Dict[str, Dict]:
+        path = self._path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # A corrupt cache only costs refits
+            return {}
+
+    def get(self, key: str) -> Optional[Fit]:
+        """Cached (preds, lower, upper, months, quantiles) for key, else None."""
+        entry = self.entries.get(key)
+        if entry is None or 'quantiles' not in entry:
+            self.misses += 1
+            return None
+        entry['last_used'] = time.time()
+        self._dirty = True
+        self.hits += 1
+        return (np.array(entry['preds'], dtype=float), np.array(entry['lower'], dtype=float),
+                np.array(entry['upper'], dtype=float), list(entry['months']),
+                np.array(entry['quantiles'], dtype=float))
+
+    def put(self, key: str, label: str, fit: Fit):
+        preds, lower, upper, months, quantiles = fit
+        for old in [k for k, e in self.entries.items() if e.get('label') == label and k != key]:
+            del self.entries[old]
+            self.evicted += 1
+        now = time.time()
+        self.entries[key] = {
+            'label': label,
+            'preds': [float(x) for x in preds],
+            'lower': [float(x) for x in lower],
+            'upper': [float(x) for x in upper],
+            'months': list(months),
+            'quantiles': [[float(x) for x in row] for row in quantiles],
+            'created_at': now,
+            'last_used': now,
+        }
+        self._dirty = True
+        self.evict()
+
+    def evict(self):
+        """Drop the least recently used entries beyond max_entries."""
+        excess = len(self.entries) - self.max_entries
+        if excess <= 0:
+            return
+        for key, _ in sorted(self.entries.items(), key=lambda kv: kv[1].get('last_used', 0))[:excess]:
+            del self.entries[key]
+            self.evicted += 1
+
+    def close(self):
+        """Persist new fits and last-used times (atomic replace)."""
+        if not self._dirty:
+            return
+        tmp = self._path() + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self._path())
+        self._dirty = False
+
+    def summary(self) -> str:
+        return (f'forecast cache: {self.hits} hits, {self.misses} refitted, {self.evicted} evicted, '
+                f'{len(self.entries)} entries')
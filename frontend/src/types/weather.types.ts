@@ -52,7 +52,8 @@ export interface DayStats {
   max: number;
   percentiles: Percentiles;
   probabilities: Probabilities;
-  yearly_values: YearlyValue[];
+  // Absent in the compact summary format; its per-year values live in the packed file of WeatherData.yearly_values
+  yearly_values?: YearlyValue[];
   trend?: Trend;
 }
 
@@ -60,11 +61,24 @@ export interface VariableStats {
   [dayOfYear: string]: DayStats;
 }
 
+// Header of the packed float32 yearly-values file written alongside a compact daily summary
+export interface PackedYearlyValues {
+  file: string;
+  dtype: 'float32';
+  byte_order: 'little';
+  layout: string; // 'variable x year x day_of_year'
+  variables: string[];
+  years: number[];
+  shape: [number, number, number];
+}
+
 export interface WeatherData {
   location: string;
   coordinates: Coordinates;
   data_period: DataPeriod;
   nasa_source: NASASource;
+  format?: 'compact';
+  yearly_values?: PackedYearlyValues;
   variables: {
     PRECTOTCORR?: VariableStats;
     T2M_MAX?: VariableStats;
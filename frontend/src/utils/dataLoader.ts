@@ -45,19 +45,27 @@ function adjustHumidityData(data: WeatherData): WeatherData {
 }
 
 /**
- * Load daily stats for a specific location
+ * Load daily stats for a specific location.
+ * Prefers the compact summary (no per-year values); falls back to the full daily_stats file.
  */
 export async function loadDailyStats(location: string): Promise<WeatherData> {
-  const primary = `${DATA_BASE}/processed/${location}_daily_stats.json`;
-  try {
-    const data = await fetchJson<WeatherData>(primary);
-    return adjustHumidityData(data);
-  } catch (e) {
+  const candidates = [
+    `${DATA_BASE}/processed/${location}_daily_summary.json`,
+    `${DATA_BASE}/processed/${location}_daily_stats.json`,
     // Fallback path: some deployments serve data under /data instead of /static-data
-    const alt = `${import.meta.env.BASE_URL}data/processed/${location}_daily_stats.json`;
-    const data = await fetchJson<WeatherData>(alt);
-    return adjustHumidityData(data);
+    `${import.meta.env.BASE_URL}data/processed/${location}_daily_summary.json`,
+    `${import.meta.env.BASE_URL}data/processed/${location}_daily_stats.json`,
+  ];
+  let lastError: unknown;
+  for (const url of candidates) {
+    try {
+      const data = await fetchJson<WeatherData>(url);
+      return adjustHumidityData(data);
+    } catch (e) {
+      lastError = e;
+    }
   }
+  throw lastError;
 }
 
 /**
@@ -0,0 +1,191 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from preprocess_probabilities import (
+    HOURLY_VARIABLES,
+    hourly_document,
+    hourly_period,
+    hourly_stats_from_arrays,
+    hourly_thresholds,
+    matrix_stats,
+)
+from memory_budget import doy_hour_keys, frame_nbytes, widen
+from raw_qc import merge_qc_reports, qc_chunks
+from raw_store import RAW_DIR, iter_raw_chunks, raw_row_count
+
+# Out-of-core hourly statistics for multi-decade hourly archives.
+#
+# The hourly raw data is streamed in bounded chunks (raw_store.iter_raw_chunks) and folded into one
+# HourlyAccumulator per pass. The accumulator keeps each variable's samples as a (DOY, hour) x years
+# matrix, the smallest state that still gives exact percentiles; accumulators are mergeable, so chunks,
+# partitions or hosts can be combined in any order. Finalising sorts each row, giving the same matrix
+# preprocess_probabilities.grouped_sample_matrix builds from the full frame, so hourly_stats.json is
+# identical to the in-memory path, with any --qc mode (QC holds the rows near a chunk edge back until the
+# next chunk arrives, see raw_qc.qc_chunks).
+#
+# plan_hourly_passes splits the budget: the accumulators of one pass get at most half of it (variables
+# are spread over several passes over the data when they do not fit), the rest bounds the chunk size.
+# The floor is one variable's accumulator, about 12 MB for 40 years; the budget does not cover the
+# output JSON itself, which is the same size as in the in-memory path. hourly_fits_in_memory estimates
+# the in-memory path's peak so a --max-memory budget can choose between the two per city.
+
+HOURLY_GROUPS = 366 * 24
+HOURS_PER_YEAR = 8760
+MIN_CHUNK_ROWS = 24 * 31
+# Bytes per value while a chunk is grouped: the parsed column, the float64 copy, keys and sort order
+CHUNK_BYTES_PER_VALUE = 40
+INDEX_BYTES_PER_ROW = 32
+# Matrix-sized arrays alive while a variable is finalised: samples, sorted copy, matrix_stats temporaries
+FINALIZE_COPIES = 4
+# In-memory path on top of the loaded frame (measured): one variable's float64 values, keys, sort order
+# and sample matrix per row while its stats run, or QC's float64 grid copies and flags per stored value
+IN_MEMORY_BYTES_PER_ROW = 56
+QC_BYTES_PER_VALUE = 20
+
+
+class HourlyAccumulator:
+    """Mergeable per-(DOY, hour) sample matrices for a set of hourly variables."""
+
+    def __init__(self, variables: List[str], capacity: int = 1):
+        self.variables = list(variables)
+        self.matrices = {var: np.full((HOURLY_GROUPS, max(1, capacity)), np.nan) for var in self.variables}
+        self.counts = {var: np.zeros(HOURLY_GROUPS, dtype=np.int64) for var in self.variables}
+        self.start: Optional[pd.Timestamp] = None
+        self.end: Optional[pd.Timestamp] = None
+        self.years: set = set()
+        self.seen: set = set()  # variables present as columns, even if all NaN (still listed in the JSON)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(m.nbytes for m in self.matrices.values()) + sum(c.nbytes for c in self.counts.values())
+
+    def _scatter(self, var: str, keys: np.ndarray, values: np.ndarray):
+        counts = self.counts[var]
+        added = np.bincount(keys, minlength=HOURLY_GROUPS)
+        needed = int((counts + added).max())
+        matrix = self.matrices[var]
+        if needed > matrix.shape[1]:
+            grown = np.full((HOURLY_GROUPS, max(needed, 2 * matrix.shape[1])), np.nan)
+            grown[:, :matrix.shape[1]] = matrix
+            self.matrices[var] = matrix = grown
+        order = np.argsort(keys, kind='stable')
+        keys_s = keys[order]
+        starts = np.concatenate(([0], np.cumsum(added)[:-1]))
+        matrix[keys_s, counts[keys_s] + np.arange(keys_s.shape[0]) - starts[keys_s]] = values[order]
+        counts += added
+
+    def update(self, chunk: pd.DataFrame):
+        """Fold one chunk of the hourly frame (any time range, any order) into the accumulators."""
+        if chunk.empty:
+            return
+        index = chunk.index
+        keys = doy_hour_keys(index)
+        for var in self.variables:
+            if var not in chunk.columns:
+                continue
+            self.seen.add(var)
+            values = widen(chunk[var].to_numpy())
+            ok = ~np.isnan(values)
+            self._scatter(var, keys[ok], values[ok])
+        lo, hi = index.min(), index.max()
+        self.start = lo if self.start is None else min(self.start, lo)
+        self.end = hi if self.end is None else max(self.end, hi)
+        self.years.update(np.unique(index.year).tolist())
+
+    def merge(self, other: 'HourlyAccumulator'):
+        """Add every sample and the covered period of another accumulator."""
+        for var in other.variables:
+            if var not in self.matrices:
+                self.variables.append(var)
+                self.matrices[var] = np.full((HOURLY_GROUPS, 1), np.nan)
+                self.counts[var] = np.zeros(HOURLY_GROUPS, dtype=np.int64)
+            counts = other.counts[var]
+            filled = np.arange(other.matrices[var].shape[1])[None, :] < counts[:, None]
+            self._scatter(var, np.repeat(np.arange(HOURLY_GROUPS), counts), other.matrices[var][filled])
+        if other.start is not None:
+            self.start = other.start if self.start is None else min(self.start, other.start)
+            self.end = other.end if self.end is None else max(self.end, other.end)
+        self.years |= other.years
+        self.seen |= other.seen
+
+    def arrays(self, var: str, thresholds: Dict[str, float]) -> Dict:
+        """hourly_stats_arrays output for var, from the sorted, trimmed sample matrix."""
+        counts = self.counts[var]
+        width = int(counts.max()) if counts.max() > 0 else 1
+        return matrix_stats(np.sort(self.matrices[var][:, :width], axis=1), counts, thresholds)
+
+
+def plan_hourly_passes(variables: List[str], n_rows: int, memory_bytes: int) -> Tuple[List[List[str]], int]:
+    """(variable groups, one pass over the data each; chunk rows) that keep the passes within memory_bytes."""
+    capacity = n_rows // HOURS_PER_YEAR + 2
+    per_variable = FINALIZE_COPIES * HOURLY_GROUPS * capacity * 8
+    per_pass = max(1, min(len(variables), (memory_bytes // 2) // per_variable))
+    passes = [variables[i:i + per_pass] for i in range(0, len(variables), per_pass)]
+    row_bytes = INDEX_BYTES_PER_ROW + per_pass * CHUNK_BYTES_PER_VALUE
+    chunk_rows = max(MIN_CHUNK_ROWS, (memory_bytes - per_pass * per_variable) // row_bytes)
+    return passes, int(chunk_rows)
+
+
+def in_memory_hourly_bytes(n_rows: int, n_variables: int, itemsize: int = 8, qc: str = 'off') -> int:
+    """Estimated peak of loading the whole hourly frame and computing its stats (output JSON excluded)."""
+    working = n_rows * IN_MEMORY_BYTES_PER_ROW
+    if qc != 'off':
+        working = max(working, n_rows * n_variables * QC_BYTES_PER_VALUE)
+    return frame_nbytes(n_rows, n_variables, itemsize) + working
+
+
+def hourly_fits_in_memory(city_key: str, memory_bytes: int, qc: str = 'off', compact: bool = False,
+                          base_dir: str = RAW_DIR) -> bool:
+    """Whether the in-memory hourly path for a city stays within memory_bytes (compact: float32 frames)."""
+    n_rows = raw_row_count(city_key, 'hourly', base_dir)
+    return in_memory_hourly_bytes(n_rows, len(HOURLY_VARIABLES), 4 if compact else 8, qc) <= memory_bytes
+
+
+def accumulate_chunks(chunks: Iterable[pd.DataFrame], variables: List[str], capacity: int = 1,
+                      qc: str = 'off') -> Tuple[HourlyAccumulator, Optional[Dict]]:
+    """
+    Fold time-ordered chunks into a new accumulator, QC'ing them first unless qc='off' (raw_qc.qc_chunks
+    carries rows across chunk edges, so fill interpolates like the whole-frame QC); returns (acc, QC report).
+    """
+    acc = HourlyAccumulator(variables, capacity)
+    reports: List[Dict] = []
+    if qc != 'off':
+        chunks = qc_chunks(chunks, 'hourly', fill=qc == 'fill', reports=reports)
+    for chunk in chunks:
+        acc.update(chunk)
+    return acc, merge_qc_reports(reports) if qc != 'off' else None
+
+
+def build_hourly_json_chunked(city_key: str, memory_bytes: int, qc: str = 'off',
+                              base_dir: str = RAW_DIR) -> Tuple[Dict, Optional[Dict]]:
+    """
+    hourly_stats.json for a city without loading its hourly frame: one bounded-memory pass over the raw
+    data per variable group. Returns (hourly_json, hourly QC report or None when qc='off').
+    """
+    n_rows = raw_row_count(city_key, 'hourly', base_dir)
+    passes, chunk_rows = plan_hourly_passes(HOURLY_VARIABLES, n_rows, memory_bytes)
+    capacity = n_rows // HOURS_PER_YEAR + 2
+
+    results: Dict[str, Tuple[Dict, Optional[Dict]]] = {}
+    period = None
+    qc_report = None
+    for variables in passes:
+        chunks = iter_raw_chunks(city_key, 'hourly', variables, chunk_rows, base_dir)
+        acc, report = accumulate_chunks(chunks, variables, capacity, qc)
+        if report is not None:
+            if qc_report is None:
+                qc_report = report
+            else:
+                qc_report['variables'].update(report['variables'])
+        for var in variables:
+            if var in acc.seen:
+                results[var] = hourly_stats_from_arrays(acc.arrays(var, hourly_thresholds(var)), var)
+        if period is None:
+            period = hourly_period(acc.start, acc.end, len(acc.years))
+        del acc
+
+    if period is None or period['start'] is None:
+        return hourly_document(city_key, hourly_period(None, None, 0), {}), qc_report
+    return hourly_document(city_key, period, results), qc_report
@@ -0,0 +1,323 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from preprocess_probabilities import (
+    BOOTSTRAP_SEED,
+    PERCENTILES,
+    THRESHOLDS,
+    bootstrap_intervals,
+    doy_records,
+    doy_samples,
+    exceeds,
+    grouped_sample_matrix,
+    matrix_trend,
+)
+from memory_budget import widen
+
+# Persisted accumulator state, one .npz per location
+STATE_DIR = os.path.join('data', 'state')
+
+# NASA POWER replaces recently released (near-real-time) values with final ones for a few months. The
+# state records a fingerprint of the last REVISION_DAYS days up to its watermark and of THRESHOLDS, and is
+# rebuilt from the full frame when either no longer matches.
+REVISION_DAYS = 120
+
+# Maximum centroids kept per DOY by the quantile sketch. While a DOY has at most this many
+# samples the sketch holds them exactly, so percentiles match a full recompute.
+SKETCH_SIZE = 128
+
+
+@dataclass
+class DoyState:
+    """Mergeable per-DOY accumulators for one (location, variable); arrays are indexed by DOY-1."""
+    variable: str
+    threshold_names: List[str]
+    count: np.ndarray           # (366,) int
+    total: np.ndarray           # (366,) sum of values
+    total_sq: np.ndarray        # (366,) sum of squared values
+    vmin: np.ndarray            # (366,) NaN where empty
+    vmax: np.ndarray            # (366,)
+    years: np.ndarray           # (Y,) sorted calendar years
+    year_sum: np.ndarray        # (366, Y)
+    year_count: np.ndarray      # (366, Y)
+    exceed: np.ndarray          # (366, T) threshold exceedance counts, columns follow threshold_names
+    sketch_values: np.ndarray   # (366, K) centroid values ascending, NaN padded
+    sketch_weights: np.ndarray  # (366, K) centroid weights, 0 for padding
+
+
+# ----------------------------------------------
+# Quantile sketch: sorted weighted centroids, compacted to SKETCH_SIZE
+# ----------------------------------------------
+
+def _sort_rows(values: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(values, axis=1)  # NaN padding sorts last
+    return np.take_along_axis(values, order, axis=1), np.take_along_axis(weights, order, axis=1)
+
+
+def merge_sketches(values_a: np.ndarray, weights_a: np.ndarray, values_b: np.ndarray, weights_b: np.ndarray,
+                   size: int = SKETCH_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge two row-wise centroid sketches; rows over `size` centroids are compacted into equal-weight bins."""
+    values, weights = _sort_rows(np.concatenate([values_a, values_b], axis=1),
+                                 np.concatenate([weights_a, weights_b], axis=1))
+    valid = ~np.isnan(values)
+    n_entries = valid.sum(axis=1)
+    width = max(int(np.minimum(n_entries, size).max()) if n_entries.size else 0, 1)
+    if not (n_entries > size).any():
+        return values[:, :width], weights[:, :width]
+
+    # Equal-weight binning for oversized rows; smaller rows keep one centroid per entry
+    rows, cols = values.shape
+    total = np.maximum(weights.sum(axis=1), 1e-300)
+    cum_before = np.cumsum(weights, axis=1) - weights
+    bins = np.where((n_entries > size)[:, None],
+                    np.floor(cum_before / total[:, None] * size).astype(np.int64),
+                    np.arange(cols)[None, :])
+    flat = (np.arange(rows)[:, None] * width + np.minimum(bins, width - 1))[valid]
+    w = weights[valid]
+    wsum = np.bincount(flat, weights=w, minlength=rows * width)
+    vsum = np.bincount(flat, weights=values[valid] * w, minlength=rows * width)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out_values = np.where(wsum > 0, vsum / wsum, np.nan).reshape(rows, width)
+    return _sort_rows(out_values, wsum.reshape(rows, width))
+
+
+def sketch_quantile(values: np.ndarray, weights: np.ndarray, q: float) -> np.ndarray:
+    """
+    Row-wise linear-interpolated quantile of a centroid sketch. Each centroid sits at the centre of the
+    rank range it covers, so unit-weight (exact) sketches reproduce numpy's 'linear' method.
+    """
+    valid = weights > 0
+    n = valid.sum(axis=1)
+    total = weights.sum(axis=1)
+    centers = np.where(valid, np.cumsum(weights, axis=1) - weights + (weights - 1.0) / 2.0, np.inf)
+    target = q * np.maximum(total - 1.0, 0.0)
+    last = np.maximum(n - 1, 0)
+    lo = np.clip((centers <= target[:, None]).sum(axis=1) - 1, 0, last)
+    hi = np.minimum(lo + 1, last)
+    c_lo = np.take_along_axis(centers, lo[:, None], axis=1)[:, 0]
+    c_hi = np.take_along_axis(centers, hi[:, None], axis=1)[:, 0]
+    v_lo = np.take_along_axis(values, lo[:, None], axis=1)[:, 0]
+    v_hi = np.take_along_axis(values, hi[:, None], axis=1)[:, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(c_hi > c_lo, np.clip((target - c_lo) / (c_hi - c_lo), 0.0, 1.0), 0.0)
+        diff = v_hi - v_lo
+        out = np.where(t >= 0.5, v_hi - diff * (1.0 - t), v_lo + diff * t)
+    return np.where(n > 0, out, np.nan)
+
+
+# ----------------------------------------------
+# Building, merging and reading states
+# ----------------------------------------------
+
+def state_from_frame(df: pd.DataFrame, variable: str, thresholds: Dict[str, float]) -> DoyState:
+    """Accumulate every non-null row of df[variable] into a fresh DoyState."""
+    if variable in df.columns:
+        values, doy, year = doy_samples(df, variable)
+    else:
+        values, doy, year = np.empty(0), np.empty(0, dtype=np.int16), np.empty(0, dtype=np.int16)
+    # int64 from here: cell ids (DOY x years) outgrow int16
+    doy = doy.astype(np.int64) - 1
+
+    matrix, counts = grouped_sample_matrix(doy, values, 366)
+    rows = np.arange(366)
+    last = np.maximum(counts - 1, 0)
+    years, year_idx = np.unique(year, return_inverse=True)
+    cell = doy * years.shape[0] + year_idx
+    size = 366 * years.shape[0]
+    empty = np.full((366, 0), np.nan)
+    sketch_values, sketch_weights = merge_sketches(matrix, (~np.isnan(matrix)).astype(float), empty, empty)
+
+    names = list(thresholds.keys())
+    exceed = np.zeros((366, len(names)), dtype=np.int64)
+    for j, name in enumerate(names):
+        exceed[:, j] = exceeds(matrix, name, thresholds[name]).sum(axis=1)
+
+    return DoyState(
+        variable=variable,
+        threshold_names=names,
+        count=counts.astype(np.int64),
+        total=np.bincount(doy, weights=values, minlength=366),
+        total_sq=np.bincount(doy, weights=values * values, minlength=366),
+        vmin=np.where(counts > 0, matrix[:, 0], np.nan),
+        vmax=np.where(counts > 0, matrix[rows, last], np.nan),
+        years=years.astype(np.int64),
+        year_sum=np.bincount(cell, weights=values, minlength=size).reshape(366, years.shape[0]),
+        year_count=np.bincount(cell, minlength=size).reshape(366, years.shape[0]).astype(np.int64),
+        exceed=exceed,
+        sketch_values=sketch_values,
+        sketch_weights=sketch_weights,
+    )
+
+
+def _align_years(state: DoyState, years: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    idx = np.searchsorted(years, state.years)
+    year_sum = np.zeros((366, years.shape[0]))
+    year_count = np.zeros((366, years.shape[0]), dtype=np.int64)
+    year_sum[:, idx] = state.year_sum
+    year_count[:, idx] = state.year_count
+    return year_sum, year_count
+
+
+def merge_states(a: DoyState, b: DoyState) -> DoyState:
+    """Combine two states of the same variable; the result equals a state built from both inputs' rows."""
+    if a.variable != b.variable or a.threshold_names != b.threshold_names:
+        raise ValueError(f'Cannot merge states for {a.variable} {a.threshold_names} and {b.variable} {b.threshold_names}')
+    years = np.union1d(a.years, b.years).astype(np.int64)
+    a_sum, a_count = _align_years(a, years)
+    b_sum, b_count = _align_years(b, years)
+    sketch_values, sketch_weights = merge_sketches(a.sketch_values, a.sketch_weights, b.sketch_values, b.sketch_weights)
+    return DoyState(
+        variable=a.variable,
+        threshold_names=a.threshold_names,
+        count=a.count + b.count,
+        total=a.total + b.total,
+        total_sq=a.total_sq + b.total_sq,
+        vmin=np.fmin(a.vmin, b.vmin),
+        vmax=np.fmax(a.vmax, b.vmax),
+        years=years,
+        year_sum=a_sum + b_sum,
+        year_count=a_count + b_count,
+        exceed=a.exceed + b.exceed,
+        sketch_values=sketch_values,
+        sketch_weights=sketch_weights,
+    )
+
+
+def state_arrays(state: DoyState) -> Dict:
+    """Statistics of a DoyState in the doy_stats_arrays layout, ready for doy_records."""
+    count = state.count
+    n = np.maximum(count, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, state.total / n, np.nan)
+        var = np.maximum(state.total_sq - state.total * state.total / n, 0.0) / np.maximum(count - 1, 1)
+        yearly = np.where(state.year_count > 0, state.year_sum / np.maximum(state.year_count, 1), np.nan)
+    return {
+        'count': count,
+        'mean': mean,
+        'median': sketch_quantile(state.sketch_values, state.sketch_weights, 0.5),
+        'std': np.where(count > 1, np.sqrt(var), 0.0),
+        'min': state.vmin,
+        'max': state.vmax,
+        'percentiles': {
+            name: sketch_quantile(state.sketch_values, state.sketch_weights, q) for name, q in PERCENTILES.items()
+        },
+        'probabilities': {name: state.exceed[:, j] / n for j, name in enumerate(state.threshold_names)},
+        'yearly': yearly,
+        'years': state.years,
+        'trend': matrix_trend(yearly, state.years),
+    }
+
+
+# ----------------------------------------------
+# Persistence
+# ----------------------------------------------
+
+def _state_path(city_key: str, state_dir: str) -> str:
+    return os.path.join(state_dir, f'{city_key}_daily_state.npz')
+
+
+def thresholds_fingerprint(thresholds: Dict[str, Dict[str, float]] = THRESHOLDS) -> str:
+    """Hash of the threshold names and values the exceedance counts were accumulated for."""
+    return hashlib.sha256(json.dumps(thresholds, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def tail_fingerprint(daily_df: pd.DataFrame, watermark: Optional[pd.Timestamp]) -> Optional[str]:
+    """Hash of the THRESHOLDS columns (exact float64 values) of the rows in the REVISION_DAYS up to watermark."""
+    if watermark is None:
+        return None
+    tail = daily_df[(daily_df.index > watermark - pd.Timedelta(days=REVISION_DAYS)) & (daily_df.index <= watermark)]
+    h = hashlib.sha256()
+    h.update(tail.index.values.astype('datetime64[ns]').tobytes())
+    for variable in THRESHOLDS:
+        if variable in tail.columns:
+            h.update(variable.encode('utf-8'))
+            h.update(np.ascontiguousarray(widen(tail[variable].to_numpy()), dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def save_location_state(city_key: str, states: Dict[str, DoyState], watermark: Optional[pd.Timestamp],
+                        state_dir: str = STATE_DIR, fingerprints: Optional[Dict[str, Optional[str]]] = None):
+    os.makedirs(state_dir, exist_ok=True)
+    meta = {
+        'watermark': watermark.isoformat() if watermark is not None else None,
+        'variables': {var: st.threshold_names for var, st in states.items()},
+        'fingerprints': fingerprints or {},
+    }
+    arrays = {'meta': np.array(json.dumps(meta))}
+    for var, st in states.items():
+        for f in fields(DoyState):
+            if f.name not in ('variable', 'threshold_names'):
+                arrays[f'{var}/{f.name}'] = getattr(st, f.name)
+    tmp_path = _state_path(city_key, state_dir) + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, _state_path(city_key, state_dir))
+
+
+def load_location_state(city_key: str, state_dir: str = STATE_DIR
+                        ) -> Tuple[Dict[str, DoyState], Optional[pd.Timestamp], Dict[str, Optional[str]]]:
+    """
+    Return (states by variable, watermark, fingerprints); empty states, None and {} when nothing is
+    persisted yet. States written before fingerprints were recorded return {}.
+    """
+    path = _state_path(city_key, state_dir)
+    if not os.path.exists(path):
+        return {}, None, {}
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        states = {}
+        for var, names in meta['variables'].items():
+            kwargs = {f.name: data[f'{var}/{f.name}'] for f in fields(DoyState)
+                      if f.name not in ('variable', 'threshold_names')}
+            states[var] = DoyState(variable=var, threshold_names=list(names), **kwargs)
+    watermark = pd.Timestamp(meta['watermark']) if meta['watermark'] else None
+    return states, watermark, meta.get('fingerprints', {})
+
+
+def update_location_state(city_key: str, daily_df: pd.DataFrame, state_dir: str = STATE_DIR,
+                          bootstrap: int = 0, seed: int = BOOTSTRAP_SEED) -> Dict[str, Dict]:
+    """
+    Fold daily rows newer than the stored watermark into the persisted state for city_key and return
+    per-variable day-of-year stats (calculate_day_of_year_stats layout) regenerated from it.
+    Older rows are assumed unchanged as long as the last REVISION_DAYS before the watermark and THRESHOLDS
+    still match their stored fingerprints; otherwise the state is rebuilt from daily_df.
+    bootstrap > 0 adds confidence intervals resampled from the stored per-year values.
+    """
+    states, watermark, fingerprints = load_location_state(city_key, state_dir)
+    if watermark is not None:
+        if not fingerprints:
+            reason = 'state has no fingerprints yet'
+        elif fingerprints.get('thresholds') != thresholds_fingerprint():
+            reason = 'thresholds changed'
+        elif fingerprints.get('tail') != tail_fingerprint(daily_df, watermark):
+            reason = f'values in the {REVISION_DAYS} days up to {watermark.date()} were revised'
+        else:
+            reason = None
+        if reason is not None:
+            print(f'Rebuilding incremental state for {city_key}: {reason}')
+            states, watermark = {}, None
+    new_rows = daily_df if watermark is None else daily_df[daily_df.index > watermark]
+
+    for variable, thresholds in THRESHOLDS.items():
+        if variable not in daily_df.columns:
+            continue
+        delta = state_from_frame(new_rows, variable, thresholds)
+        states[variable] = merge_states(states[variable], delta) if variable in states else delta
+
+    if not daily_df.empty:
+        latest = daily_df.index.max()
+        watermark = latest if watermark is None else max(watermark, latest)
+    save_location_state(city_key, states, watermark, state_dir,
+                        {'thresholds': thresholds_fingerprint(), 'tail': tail_fingerprint(daily_df, watermark)})
+    results = {}
+    for var, st in states.items():
+        arrays = state_arrays(st)
+        if bootstrap > 0:
+            arrays['bootstrap'] = bootstrap_intervals(arrays['yearly'], THRESHOLDS[var], bootstrap, seed)
+        results[var] = doy_records(arrays, var)
+    return results
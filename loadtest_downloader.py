@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import platform
+import argparse
+import contextlib
+import io
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from benchmark_pipeline import BENCHMARK_DIR
+from mock_power_server import MockPowerServer
+from nasa_power_async import download_locations
+from nasa_power_download import (
+    PARAMETERS_DAILY,
+    PARAMETERS_HOURLY,
+    download_nasa_power_daily,
+    download_nasa_power_hourly,
+    parse_daily_response,
+    parse_hourly_response,
+)
+
+# Load test for the NASA POWER downloaders against mock_power_server (no network, no cache).
+#
+# For every fault profile a fresh stand-in server is started, and each scenario downloads the same
+# locations and ranges: the serial engine at every chunk size, and the async engine at every
+# concurrency with fixed or adaptive chunks. Per scenario we record wall time, requests by status as
+# seen by the server, failed attempts (requests that did not return a usable chunk, i.e. retries plus
+# chunks given up on), throughput in rows/s, requests/s and MB/s, and whether the frames equal the
+# fault-free reference. Results go to data/benchmarks/loadtest_<timestamp>.json.
+#
+# The serial engine runs with sleep_between=0 so the comparison is request handling, not polite pauses;
+# both engines keep their real retry backoff, which is what the error profiles measure.
+
+PROFILES: Dict[str, Dict] = {
+    'clean': {},
+    'latency': {'latency_s': 0.05, 'latency_per_day_s': 0.001},
+    'flaky': {'error_rate': 0.05, 'malformed_rate': 0.02, 'latency_s': 0.02},
+    'throttled': {'max_rps': 8.0, 'latency_s': 0.02},
+}
+
+# (lat, lon) points in distinct POWER grid cells
+POINTS = [(41.7151, 44.8271), (41.6168, 41.6367), (42.2679, 42.6946), (40.1792, 44.4991),
+          (43.2389, 76.8897), (55.7558, 37.6173), (48.8566, 2.3522), (35.6762, 139.6503)]
+
+
+def _reference(mock: MockPowerServer, points: List, daily_range, hourly_range, params_daily, params_hourly) -> Dict:
+    """Frames a fault-free download must produce, parsed exactly as the downloaders parse them."""
+    return {
+        f'p{i}': (parse_daily_response(mock.power_response(lat, lon, *daily_range, params_daily, 'daily')),
+                  parse_hourly_response(mock.power_response(lat, lon, *hourly_range, params_hourly, 'hourly')))
+        for i, (lat, lon) in enumerate(points)
+    }
+
+
+def _matches(got: Optional[pd.DataFrame], expected: pd.DataFrame) -> bool:
+    if got is None or got.empty:
+        return expected.empty
+    return got.sort_index(axis=1).equals(expected.sort_index(axis=1))
+
+
+def run_scenario(mock: MockPowerServer, scenario: Dict, points: List, daily_range, hourly_range,
+                 params_daily: List[str], params_hourly: List[str], reference: Dict) -> Dict:
+    mock.reset_stats()
+    locations = {f'p{i}': {'lat': lat, 'lon': lon} for i, (lat, lon) in enumerate(points)}
+    started = time.perf_counter()
+    # Progress bars and per-chunk warnings would swamp the report
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        if scenario['engine'] == 'serial':
+            results = {
+                key: (download_nasa_power_daily(loc['lat'], loc['lon'], *daily_range, params_daily,
+                                                chunk_years=scenario['chunk_years'], sleep_between=0.0,
+                                                base_url=mock.base_url_daily),
+                      download_nasa_power_hourly(loc['lat'], loc['lon'], *hourly_range, params_hourly,
+                                                 chunk_months=scenario['chunk_months'], sleep_between=0.0,
+                                                 base_url=mock.base_url_hourly))
+                for key, loc in locations.items()
+            }
+        else:
+            results = download_locations(locations, daily_range, hourly_range, params_daily, params_hourly,
+                                         concurrency=scenario['concurrency'], rate=scenario['rate'],
+                                         base_url_daily=mock.base_url_daily, base_url_hourly=mock.base_url_hourly,
+                                         adaptive=scenario['adaptive'], request_log=None,
+                                         chunk_years=scenario['chunk_years'], chunk_months=scenario['chunk_months'])
+    wall = time.perf_counter() - started
+
+    stats = dict(mock.stats)
+    rows = sum(len(d) + len(h) for d, h in results.values())
+    expected_rows = sum(len(d) + len(h) for d, h in reference.values())
+    return dict(scenario, **{
+        'wall_s': wall,
+        'requests': stats['requests'],
+        'status': stats['status'],
+        'malformed': stats['malformed'],
+        'failed_attempts': stats['requests'] - stats['ok'],
+        'rows': rows,
+        'missing_rows': expected_rows - rows,
+        'correct': all(_matches(results[k][0], reference[k][0]) and _matches(results[k][1], reference[k][1])
+                       for k in reference),
+        'rows_per_s': rows / wall if wall else None,
+        'requests_per_s': stats['requests'] / wall if wall else None,
+        'mb_per_s': stats['bytes'] / 1e6 / wall if wall else None,
+    })
+
+
+def build_scenarios(concurrency: List[int], chunk_years: List[int], chunk_months: List[int], rate: float,
+                    engines: List[str], adaptive: bool) -> List[Dict]:
+    scenarios = []
+    if 'serial' in engines:
+        scenarios += [{'engine': 'serial', 'concurrency': 1, 'rate': None, 'adaptive': False,
+                       'chunk_years': y, 'chunk_months': m} for y in chunk_years for m in chunk_months]
+    if 'async' in engines:
+        scenarios += [{'engine': 'async', 'concurrency': c, 'rate': rate, 'adaptive': False,
+                       'chunk_years': y, 'chunk_months': m}
+                      for c in concurrency for y in chunk_years for m in chunk_months]
+        if adaptive:
+            scenarios += [{'engine': 'async', 'concurrency': c, 'rate': rate, 'adaptive': True,
+                           'chunk_years': None, 'chunk_months': None} for c in concurrency]
+    return scenarios
+
+
+def run_loadtest(profiles: List[str], scenarios: List[Dict], n_points: int = 2, daily_years: int = 2,
+                 hourly_months: int = 3, seed: int = 0) -> Dict:
+    points = POINTS[:n_points]
+    daily_range = (f'{2024 - daily_years + 1}0101', '20241231')
+    hourly_end = pd.Timestamp('2024-01-01') + pd.DateOffset(months=hourly_months) - pd.Timedelta(days=1)
+    hourly_range = ('20240101', hourly_end.strftime('%Y%m%d'))
+    params_daily, params_hourly = list(PARAMETERS_DAILY), list(PARAMETERS_HOURLY)
+
+    results = []
+    for profile in profiles:
+        with MockPowerServer(seed=seed, **PROFILES[profile]) as mock:
+            reference = _reference(mock, points, daily_range, hourly_range, params_daily, params_hourly)
+            for scenario in scenarios:
+                record = run_scenario(mock, scenario, points, daily_range, hourly_range, params_daily,
+                                      params_hourly, reference)
+                record['profile'] = profile
+                results.append(record)
+                print(format_result(record))
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count(), 'pandas': pd.__version__},
+        'config': {'points': n_points, 'daily_range': daily_range, 'hourly_range': hourly_range, 'seed': seed,
+                   'profiles': {p: PROFILES[p] for p in profiles}},
+        'results': results,
+    }
+
+
+def format_result(r: Dict) -> str:
+    if r['adaptive']:
+        chunks = 'adaptive'
+    else:
+        chunks = f"{r['chunk_years']}y/{r['chunk_months']}mo"
+    return (f"{r['profile']:<10} {r['engine']:<6} c={r['concurrency']:<3} {chunks:<9} "
+            f"{r['wall_s']:7.2f}s  {r['requests']:5d} req ({r['failed_attempts']} failed)  "
+            f"{r['requests_per_s']:7.1f} req/s  {r['rows_per_s']:10.0f} rows/s  {r['mb_per_s']:6.2f} MB/s  "
+            f"{'ok' if r['correct'] else 'MISMATCH (%d rows missing)' % r['missing_rows']}")
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(',') if x]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Load-test the NASA POWER downloaders against a local stand-in.')
+    parser.add_argument('--profiles', default='clean,flaky,throttled',
+                        help=f'Comma-separated fault profiles ({", ".join(PROFILES)})')
+    parser.add_argument('--engines', default='serial,async', help='Comma-separated engines (serial, async)')
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 4, 8], help='Async concurrency levels, e.g. 1,4,8')
+    parser.add_argument('--rate', type=float, default=50.0, help='Async client request starts per second')
+    parser.add_argument('--chunk-years', type=_int_list, default=[1], help='Daily chunk sizes, e.g. 1,2')
+    parser.add_argument('--chunk-months', type=_int_list, default=[1, 3], help='Hourly chunk sizes, e.g. 1,3')
+    parser.add_argument('--no-adaptive', action='store_true', help='Skip the adaptive-chunk async scenarios')
+    parser.add_argument('--points', type=int, default=2, help=f'Locations per run (max {len(POINTS)})')
+    parser.add_argument('--daily-years', type=int, default=2, help='Daily range: this many years up to 2024')
+    parser.add_argument('--hourly-months', type=int, default=3, help='Hourly range: this many months from 2024-01')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Output JSON path (default data/benchmarks/loadtest_<ts>.json)')
+    args = parser.parse_args(argv)
+
+    profiles = [p for p in args.profiles.split(',') if p]
+    unknown = [p for p in profiles if p not in PROFILES]
+    if unknown:
+        parser.error(f'unknown profile(s): {", ".join(unknown)}')
+    if not 1 <= args.points <= len(POINTS):
+        parser.error(f'--points must be between 1 and {len(POINTS)}')
+    engines = [e for e in args.engines.split(',') if e]
+
+    scenarios = build_scenarios(args.concurrency, args.chunk_years, args.chunk_months, args.rate, engines,
+                                not args.no_adaptive)
+    report = run_loadtest(profiles, scenarios, args.points, args.daily_years, args.hourly_months, args.seed)
+
+    out_path = args.output or os.path.join(BENCHMARK_DIR, f"loadtest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {out_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import os
+import csv
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Shared location registry for the download, preprocessing and forecasting scripts.
+#
+# Locations are read from locations.json next to this file, or from the file named by the
+# LOCATIONS_FILE environment variable. Both JSON and CSV are accepted:
+#   JSON: {"tbilisi": {"lat": 41.7151, "lon": 44.8271, "name": "Tbilisi, Georgia"}, ...}
+#         or [{"id": "tbilisi", "lat": ..., "lon": ..., "name": ...}, ...]
+#   CSV:  id,name,lat,lon header row, one location per line
+# Entries keep exactly {'lat', 'lon', 'name'} since they are embedded in the output JSON as 'coordinates'.
+
+REGISTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locations.json')
+PROGRESS_FILE = os.path.join('data', 'state', 'download_progress.json')
+
+# NASA POWER meteorology comes from MERRA-2 on a 0.5 deg latitude x 0.625 deg longitude grid;
+# points inside the same cell return identical series, so they are fetched once.
+POWER_GRID = (0.5, 0.625)
+
+
+def _entry(key: str, lat, lon, name: Optional[str]) -> Dict:
+    lat, lon = float(lat), float(lon)
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        raise ValueError(f'Location {key!r} has out-of-range coordinates ({lat}, {lon})')
+    return {'lat': lat, 'lon': lon, 'name': name or key}
+
+
+def load_locations(path: Optional[str] = None) -> Dict[str, Dict]:
+    """Ordered {location_key: {'lat', 'lon', 'name'}} from a JSON or CSV registry file."""
+    path = path or os.environ.get('LOCATIONS_FILE') or REGISTRY_FILE
+    locations: Dict[str, Dict] = OrderedDict()
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        rows = [dict(v, id=k) for k, v in data.items()] if isinstance(data, dict) else data
+    for row in rows:
+        key = str(row['id']).strip()
+        if key in locations:
+            raise ValueError(f'Duplicate location id {key!r} in {path}')
+        locations[key] = _entry(key, row['lat'], row['lon'], row.get('name'))
+    return dict(locations)
+
+
+def grid_cell(lat: float, lon: float, grid: Tuple[float, float] = POWER_GRID) -> Tuple[int, int]:
+    """Integer (row, col) of the POWER grid cell whose centre is nearest to the point."""
+    return int(round(lat / grid[0])), int(round(lon / grid[1]))
+
+
+def coalesce_locations(locations: Dict[str, Dict],
+                       grid: Tuple[float, float] = POWER_GRID) -> Dict[Tuple[int, int], List[str]]:
+    """Group location keys by grid cell, in registry order; the first key of each group is fetched for all."""
+    cells: Dict[Tuple[int, int], List[str]] = OrderedDict()
+    for key, loc in locations.items():
+        cells.setdefault(grid_cell(loc['lat'], loc['lon'], grid), []).append(key)
+    return dict(cells)
+
+
+class DownloadProgress:
+    """Per-location, per-resolution download status persisted as JSON so batch runs can resume."""
+
+    def __init__(self, path: str = PROGRESS_FILE):
+        self.path = path
+        self.status: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.status = json.load(f)
+
+    def mark(self, key: str, resolution: str, state: str, rows: int = 0, error: Optional[str] = None):
+        entry = {'state': state, 'rows': rows, 'updated_at': time.time()}
+        if error:
+            entry['error'] = error
+        self.status.setdefault(key, {})[resolution] = entry
+
+    def is_done(self, key: str, resolutions: Tuple[str, ...] = ('daily', 'hourly')) -> bool:
+        entry = self.status.get(key, {})
+        return all(entry.get(r, {}).get('state') == 'done' for r in resolutions)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.status, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def summary(self, keys: List[str]) -> str:
+        done = sum(self.is_done(k) for k in keys)
+        failed = sum(any(e.get('state') in ('failed', 'partial') for e in self.status.get(k, {}).values()) for k in keys)
+        return f'progress: {done}/{len(keys)} locations complete, {failed} with failures'
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import resource
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Memory-efficient mode shared by the download, preprocessing and forecast scripts.
+#
+# Compact frames hold value columns as float32 and calendar keys as int16 DOY / int8 hour / int16 year
+# instead of float64 columns and the int32 arrays DatetimeIndex accessors return. Compaction is lossless:
+# NASA POWER publishes values with a few decimals, so widen() recovers the exact float64 values by
+# rounding at the column's decimal precision, and compact_frame() keeps a column float64 unless that
+# round trip reproduces every value. Statistics computed from compact frames are therefore identical;
+# only one column at a time is widened back to float64. Compaction is decided per whole column, so
+# hourly data streamed into month partitions is written at full precision.
+#
+# StageMemory records wall time and peak resident memory per pipeline stage. On Linux the kernel's RSS
+# high-water mark is reset at the start of each stage (/proc/self/clear_refs), so peaks are per stage;
+# elsewhere the reported peak is the process peak so far (getrusage). Stages must not nest.
+
+VALUE_DTYPE = np.float32
+DOY_DTYPE = np.int16
+HOUR_DTYPE = np.int8
+YEAR_DTYPE = np.int16
+# Largest decimal precision widen() tries (POWER publishes at most 4 decimals)
+MAX_DECIMALS = 4
+# DatetimeIndex storage per row
+INDEX_BYTES = 8
+
+MEMORY_REPORT_DIR = os.path.join('data', 'benchmarks')
+_MB = 1024 * 1024
+_UNITS = {'': _MB, 'K': 1024, 'KB': 1024, 'M': _MB, 'MB': _MB, 'G': 1024 * _MB, 'GB': 1024 * _MB}
+
+
+# ----------------------------------------------
+# Compact value columns and calendar keys
+# ----------------------------------------------
+
+def widen(values: np.ndarray) -> np.ndarray:
+    """
+    float64 view of a value column. float32 columns are rounded at the smallest decimal precision
+    (0..MAX_DECIMALS) that maps every value back onto the same float32, which recovers the float64 values
+    compact_frame() started from; float64 columns are returned as they are. Rounding is only tried while
+    float32 resolves half a unit of that decimal at the column's largest magnitude, otherwise the float32
+    values are widened as they are.
+    """
+    values = np.asarray(values)
+    if values.dtype == np.float64:
+        return values
+    wide = values.astype(np.float64)
+    if values.dtype != VALUE_DTYPE or wide.size == 0:
+        return wide
+    largest = float(np.nanmax(np.abs(wide))) if not np.isnan(wide).all() else 0.0
+    for decimals in range(MAX_DECIMALS + 1):
+        # float32 rounding error is at most |x| * 2**-24
+        if largest * 2.0 ** -24 >= 0.5 * 10.0 ** -decimals:
+            break
+        rounded = np.round(wide, decimals)
+        if np.array_equal(rounded.astype(VALUE_DTYPE), values, equal_nan=True):
+            return rounded
+    return wide
+
+
+def compact_column(values: np.ndarray) -> np.ndarray:
+    """values as float32 when widen() reproduces them exactly, else unchanged."""
+    values = np.asarray(values)
+    if values.dtype != np.float64:
+        return values
+    narrow = values.astype(VALUE_DTYPE)
+    return narrow if np.array_equal(widen(narrow), values, equal_nan=True) else values
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy of df with every float64 column that compacts losslessly stored as float32."""
+    if df is None or df.empty:
+        return df
+    return pd.DataFrame({col: compact_column(df[col].to_numpy()) if df[col].dtype.kind == 'f' else df[col]
+                         for col in df.columns}, index=df.index)
+
+
+def doy_year_keys(index: pd.DatetimeIndex) -> Tuple[np.ndarray, np.ndarray]:
+    """(day of year 1..366 as int16, year as int16) for every timestamp."""
+    return index.dayofyear.to_numpy().astype(DOY_DTYPE), index.year.to_numpy().astype(YEAR_DTYPE)
+
+
+def doy_hour_keys(index: pd.DatetimeIndex) -> np.ndarray:
+    """0-based (DOY - 1) * 24 + hour group keys as int16 (at most 8783)."""
+    keys = index.dayofyear.to_numpy().astype(DOY_DTYPE) - 1
+    keys *= 24
+    keys += index.hour.to_numpy().astype(HOUR_DTYPE)
+    return keys
+
+
+def frame_nbytes(rows: int, columns: int, itemsize: int = 8) -> int:
+    """Bytes of a DatetimeIndex-ed frame with `columns` value columns of the given item size."""
+    return rows * (INDEX_BYTES + columns * itemsize)
+
+
+def parse_memory(text: str) -> int:
+    """'512M', '2G', '1.5GB', '800K' or a plain number of MB as bytes."""
+    text = str(text).strip().upper()
+    number = text.rstrip('KMGB')
+    unit = text[len(number):]
+    if unit not in _UNITS:
+        raise ValueError(f'unknown memory unit in {text!r}; use K, M or G')
+    try:
+        return int(float(number) * _UNITS[unit])
+    except ValueError:
+        raise ValueError(f'invalid memory size {text!r}') from None
+
+
+# ----------------------------------------------
+# Resident memory
+# ----------------------------------------------
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def peak_rss() -> int:
+    """Peak resident set size in bytes since the last reset_peak_rss() (else since process start)."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark to the current RSS; False where that is not supported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def children_peak_rss() -> int:
+    """Largest peak RSS of any finished child process (e.g. process-pool workers) in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageMemory:
+    """Wall time and peak RSS per named stage; disabled trackers record nothing."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.records: List[Dict] = []
+
+    @contextmanager
+    def stage(self, name: str, **labels) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        per_stage = reset_peak_rss()
+        rss_start = current_rss()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append({
+                'stage': name,
+                **labels,
+                'wall_s': time.perf_counter() - started,
+                'rss_start_mb': rss_start / _MB,
+                'rss_end_mb': current_rss() / _MB,
+                'peak_rss_mb': peak_rss() / _MB,
+                'peak_scope': 'stage' if per_stage else 'process',
+            })
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per stage name: runs, total wall time and the largest peak RSS over its runs."""
+        out: Dict[str, Dict] = {}
+        for r in self.records:
+            s = out.setdefault(r['stage'], {'runs': 0, 'wall_s': 0.0, 'peak_rss_mb': 0.0})
+            s['runs'] += 1
+            s['wall_s'] += r['wall_s']
+            s['peak_rss_mb'] = max(s['peak_rss_mb'], r['peak_rss_mb'])
+        return out
+
+    def format(self) -> str:
+        lines = [f"{'stage':<12} {'runs':>5} {'wall s':>9} {'peak RSS MB':>12}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<12} {s['runs']:>5} {s['wall_s']:>9.2f} {s['peak_rss_mb']:>12.1f}")
+        return '\n'.join(lines)
+
+    def save(self, script: str, path: Optional[str] = None, **config) -> str:
+        """Write records and summary to path (default data/benchmarks/memory_<script>_<ts>.json)."""
+        path = path or os.path.join(MEMORY_REPORT_DIR, f"memory_{script}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        report = {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'script': script,
+            'config': config,
+            'summary': self.summary(),
+            'children_peak_rss_mb': children_peak_rss() / _MB,
+            'stages': self.records,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return path
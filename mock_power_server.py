@@ -0,0 +1,277 @@
+import json
+import time
+import random
+import zlib
+import argparse
+import threading
+from datetime import datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from benchmark_pipeline import DAILY_VARIABLES, synthetic_frame, to_power_response
+from preprocess_probabilities import HOURLY_VARIABLES
+
+# Local stand-in for the NASA POWER daily/hourly point endpoints, for offline downloader tests.
+#
+# Serves /api/temporal/daily/point and /api/temporal/hourly/point with the real query parameters and
+# JSON layout (properties.parameter.<VAR>.<YYYYMMDD[HH]>). Values are deterministic: each calendar
+# year of each point is generated once from a seed derived from (seed, lat, lon, resolution, year),
+# so any chunking of a range returns the same series and expected_frame() gives the reference.
+#
+# Faults are injected per request from a seeded RNG:
+#   error_rate       HTTP 500/502/503
+#   rate_limit_rate  HTTP 429 with Retry-After; max_rps additionally enforces a server-side rate
+#   malformed_rate   HTTP 200 with a truncated body or without 'properties'
+#   latency_s        fixed delay per request, plus latency_per_day_s per requested day
+#   max_span_days    longer ranges are rejected with HTTP 422, like the real API's range limits
+# Out-of-range requests and unknown parameters also get 422, with the API's 'messages' list.
+#
+# Usage:
+#   with MockPowerServer(error_rate=0.05) as mock:
+#       download_nasa_power_daily(lat, lon, start, end, params, base_url=mock.base_url_daily)
+#   python mock_power_server.py --port 8765 --error-rate 0.05   # then --api-url http://127.0.0.1:8765
+
+DAILY_PATH = '/api/temporal/daily/point'
+HOURLY_PATH = '/api/temporal/hourly/point'
+FILL_VALUE = -999.0
+ERROR_STATUSES = (500, 502, 503)
+DATA_YEARS = (1981, 2100)
+
+
+@lru_cache(maxsize=256)
+def _year_frame(seed: int, lat: float, lon: float, resolution: str, year: int) -> pd.DataFrame:
+    """All known variables of one point for one calendar year."""
+    if resolution == 'daily':
+        index = pd.date_range(f'{year}-01-01', f'{year}-12-31', freq='D')
+        variables = DAILY_VARIABLES
+    else:
+        index = pd.date_range(f'{year}-01-01', f'{year}-12-31 23:00', freq='h')
+        variables = HOURLY_VARIABLES
+    key = f'{seed}|{lat:.4f}|{lon:.4f}|{resolution}|{year}'
+    return synthetic_frame(index, variables, zlib.crc32(key.encode('utf-8')))
+
+
+def synthetic_range(lat: float, lon: float, start: datetime, end: datetime, parameters: List[str],
+                    resolution: str, seed: int = 0) -> pd.DataFrame:
+    """Deterministic frame for [start, end] (whole days), identical whatever chunks it is requested in."""
+    years = [_year_frame(seed, lat, lon, resolution, y) for y in range(start.year, end.year + 1)]
+    df = pd.concat(years) if len(years) > 1 else years[0]
+    stop = pd.Timestamp(end) + pd.Timedelta(days=1)
+    return df.loc[(df.index >= pd.Timestamp(start)) & (df.index < stop), parameters]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so pooled sessions are exercised
+
+    def do_GET(self):
+        self.server.mock.handle(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockPowerServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, seed: int = 0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: int = 1, max_rps: Optional[float] = None,
+                 malformed_rate: float = 0.0, latency_s: float = 0.0, latency_per_day_s: float = 0.0,
+                 max_span_days: Optional[int] = None):
+        self.seed = seed
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.max_rps = max_rps
+        self.malformed_rate = malformed_rate
+        self.latency_s = latency_s
+        self.latency_per_day_s = latency_per_day_s
+        self.max_span_days = max_span_days
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = max_rps or 0.0
+        self._refilled = time.monotonic()
+        self.stats: Dict = {}
+        self.reset_stats()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- lifecycle ----
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def base_url_daily(self) -> str:
+        return self.url + DAILY_PATH
+
+    @property
+    def base_url_hourly(self) -> str:
+        return self.url + HOURLY_PATH
+
+    def start(self) -> 'MockPowerServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockPowerServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'ok': 0, 'status': {}, 'malformed': 0, 'bytes': 0, 'days': 0}
+
+    def _count(self, status: int, size: int, malformed: bool = False, days: int = 0):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['status'][str(status)] = self.stats['status'].get(str(status), 0) + 1
+            self.stats['bytes'] += size
+            self.stats['malformed'] += malformed
+            if status == 200 and not malformed:
+                self.stats['ok'] += 1
+                self.stats['days'] += days
+
+    # ---- responses ----
+    def expected_frame(self, lat: float, lon: float, start: str, end: str, parameters: List[str],
+                       resolution: str) -> pd.DataFrame:
+        """The series a fault-free download of [start, end] should produce (before client-side parsing)."""
+        return synthetic_range(lat, lon, datetime.strptime(start, '%Y%m%d'), datetime.strptime(end, '%Y%m%d'),
+                               parameters, resolution, self.seed)
+
+    def power_response(self, lat: float, lon: float, start: str, end: str, parameters: List[str],
+                       resolution: str) -> Dict:
+        body = to_power_response(self.expected_frame(lat, lon, start, end, parameters, resolution), resolution)
+        body['geometry'] = {'type': 'Point', 'coordinates': [lon, lat, 0.0]}
+        body['header'] = {'title': 'NASA/POWER stand-in', 'fill_value': FILL_VALUE, 'start': start, 'end': end}
+        body['messages'] = []
+        return body
+
+    def _validate(self, path: str, query: Dict[str, List[str]]) -> Tuple[Optional[str], Dict]:
+        """(error message or None, parsed request) for a daily/hourly point request."""
+        resolution = 'daily' if path == DAILY_PATH else 'hourly'
+        try:
+            lat = float(query['latitude'][0])
+            lon = float(query['longitude'][0])
+            start = datetime.strptime(query['start'][0], '%Y%m%d')
+            end = datetime.strptime(query['end'][0], '%Y%m%d')
+            parameters = query['parameters'][0].split(',')
+        except (KeyError, ValueError) as e:
+            return f'Invalid or missing query parameter: {e}', {}
+        known = DAILY_VARIABLES if resolution == 'daily' else HOURLY_VARIABLES
+        unknown = [p for p in parameters if p not in known]
+        if unknown:
+            return f'Unknown {resolution} parameter(s): {",".join(unknown)}', {}
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+            return 'Latitude/longitude out of range', {}
+        if end < start or start.year < DATA_YEARS[0] or end.year > DATA_YEARS[1]:
+            return 'Start/end dates out of range', {}
+        days = (end - start).days + 1
+        if self.max_span_days is not None and days > self.max_span_days:
+            return f'Requested range of {days} days exceeds {self.max_span_days}', {}
+        return None, {'lat': lat, 'lon': lon, 'start': query['start'][0], 'end': query['end'][0],
+                      'parameters': parameters, 'resolution': resolution, 'days': days}
+
+    def _rate_limited(self) -> bool:
+        with self._lock:
+            if self.rate_limit_rate and self._rng.random() < self.rate_limit_rate:
+                return True
+            if not self.max_rps:
+                return False
+            now = time.monotonic()
+            self._tokens = min(self.max_rps, self._tokens + (now - self._refilled) * self.max_rps)
+            self._refilled = now
+            if self._tokens < 1.0:
+                return True
+            self._tokens -= 1.0
+            return False
+
+    def _draw(self) -> Tuple[Optional[int], Optional[str]]:
+        """(injected 5xx status or None, malformed body kind or None) for one request."""
+        with self._lock:
+            status = self._rng.choice(ERROR_STATUSES) if self._rng.random() < self.error_rate else None
+            kind = self._rng.choice(['truncated', 'no_properties']) if self._rng.random() < self.malformed_rate else None
+        return status, kind
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        url = urlparse(handler.path)
+        if url.path not in (DAILY_PATH, HOURLY_PATH):
+            return self._send(handler, 404, json.dumps({'messages': [f'Unknown endpoint {url.path}']}))
+        error, request = self._validate(url.path, parse_qs(url.query))
+        if error:
+            return self._send(handler, 422, json.dumps({'header': 'Validation error', 'messages': [error]}))
+        if self._rate_limited():
+            return self._send(handler, 429, json.dumps({'messages': ['Too many requests']}),
+                              {'Retry-After': str(self.retry_after)})
+        status, malformed = self._draw()
+        days = request.pop('days')
+        delay = self.latency_s + self.latency_per_day_s * days
+        if delay > 0:
+            time.sleep(delay)
+        if status is not None:
+            return self._send(handler, status, json.dumps({'messages': ['Internal server error']}))
+        body = json.dumps(self.power_response(**request))
+        if malformed == 'truncated':
+            body = body[:len(body) // 2]
+        elif malformed == 'no_properties':
+            body = json.dumps({'type': 'Feature', 'messages': ['No data for the requested range']})
+        self._send(handler, 200, body, malformed=malformed is not None, days=days)
+
+    def _send(self, handler: BaseHTTPRequestHandler, status: int, body: str, headers: Optional[Dict] = None,
+              malformed: bool = False, days: int = 0):
+        data = body.encode('utf-8')
+        try:
+            handler.send_response(status)
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                handler.send_header(name, value)
+            handler.end_headers()
+            handler.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (timeout); still counted below
+        self._count(status, len(data), malformed, days)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the NASA POWER point API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic series and fault injection')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 5xx')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429')
+    parser.add_argument('--max-rps', type=float, default=None, help='Answer 429 beyond this many requests/s')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help='Share of 200 responses with a truncated body or no properties')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fixed delay per request (s)')
+    parser.add_argument('--latency-per-day', type=float, default=0.0, help='Extra delay per requested day (s)')
+    parser.add_argument('--max-span-days', type=int, default=None, help='Reject longer ranges with HTTP 422')
+    args = parser.parse_args(argv)
+
+    mock = MockPowerServer(args.host, args.port, args.seed, args.error_rate, args.rate_limit_rate, args.retry_after,
+                           args.max_rps, args.malformed_rate, args.latency, args.latency_per_day, args.max_span_days)
+    print(f'Serving NASA POWER stand-in on {mock.url} (daily: {mock.base_url_daily})')
+    try:
+        mock._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock._httpd.server_close()
+        print(json.dumps(mock.stats))
+
+
+if __name__ == '__main__':
+    main()
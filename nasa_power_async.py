@@ -0,0 +1,409 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+import requests
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+from nasa_power_download import (
+    BASE_URL_DAILY,
+    BASE_URL_HOURLY,
+    _build_daily_url,
+    _build_hourly_url,
+    add_months,
+    combine_chunks,
+    daily_chunks,
+    hourly_chunks,
+    parse_daily_response,
+    parse_hourly_response,
+    power_json,
+)
+from raw_store import write_hourly_partitions
+from response_cache import ResponseCache
+
+# Concurrent NASA POWER download engine.
+#
+# Chunk requests for every location run as asyncio tasks over one pooled requests.Session (keep-alive
+# connections, executed in worker threads). A Semaphore bounds in-flight requests and a shared
+# TokenBucket spaces request starts; when any request gets HTTP 429 the bucket pauses every task
+# (honouring Retry-After) and halves its rate, recovering gradually on success.
+# Chunking, parsing and chunk merging are the ones used by the serial downloader, so both engines
+# return identical DataFrames. With a ResponseCache, cached chunks skip the network entirely and
+# failed chunks are checkpointed for the next run.
+# With adaptive=True the fixed year/month chunks are replaced by AdaptiveChunker spans (see below).
+# Every HTTP attempt is logged with its latency and size (save_request_log) for tuning the policies.
+# Point base_url_daily/base_url_hourly at a local stand-in server to test.
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 2.0  # request starts per second across all tasks
+RETRY_STATUSES = (429, 500, 502, 503)
+MAX_RATE_LIMIT_WAITS = 20  # 429s tolerated per request; they pause everyone but do not use up retries
+REQUEST_LOG = os.path.join('data', 'state', 'request_log.jsonl')
+
+
+class TokenBucket:
+    """Async token bucket shared by all in-flight requests, with a global pause for rate-limit responses."""
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: Optional[float] = None, min_rate: float = 0.1):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    def penalize(self, delay: float):
+        """Pause all requests for `delay` seconds and halve the rate (called on HTTP 429)."""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + delay)
+        self.rate = max(self.min_rate, self.rate / 2.0)
+        self.tokens = 0.0
+        self.updated = now
+
+    def reward(self):
+        """Recover a tenth of the configured rate after a successful request."""
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10.0)
+
+
+class AsyncPowerClient:
+    """Pooled HTTP client with bounded concurrency, shared rate limiting and http_get_json's retry policy."""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE,
+                 max_retries: int = 5, backoff_base: float = 1.5, timeout: float = 60.0,
+                 session: Optional[requests.Session] = None):
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/json'})
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.request_log: List[Dict] = []
+
+    def close(self):
+        self.session.close()
+
+    def _log(self, url: str, status, started: float, size: int):
+        self.request_log.append({'url': url, 'status': status, 'latency_s': round(time.monotonic() - started, 4),
+                                 'bytes': size, 'at': time.time()})
+
+    async def get_json(self, url: str, max_retries: Optional[int] = None) -> Dict:
+        """GET and decode JSON; 5xx and network errors use up to max_retries attempts, 429s pause all requests."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        last_exc = None
+        attempt = 0
+        rate_limited = 0
+        while attempt < max_retries:
+            await self.limiter.acquire()
+            started = time.monotonic()
+            resp = None
+            try:
+                async with self._semaphore:
+                    resp = await asyncio.to_thread(self.session.get, url, timeout=self.timeout)
+                self._log(url, resp.status_code, started, len(resp.content))
+                if resp.status_code == 200:
+                    self.limiter.reward()
+                    return power_json(resp)
+                if resp.status_code == 429 and rate_limited < MAX_RATE_LIMIT_WAITS:
+                    rate_limited += 1
+                    retry_after = resp.headers.get('Retry-After', '')
+                    delay = (self.backoff_base ** rate_limited) + 1.0
+                    self.limiter.penalize(max(delay, float(retry_after)) if retry_after.isdigit() else delay)
+                    continue
+                if resp.status_code in RETRY_STATUSES:
+                    last_exc = RuntimeError(f'HTTP {resp.status_code} for url: {url}')
+                    attempt += 1
+                    if attempt < max_retries:
+                        await asyncio.sleep((self.backoff_base ** attempt) + 1.0)
+                    continue
+                resp.raise_for_status()
+            except Exception as e:
+                if resp is None:
+                    self._log(url, type(e).__name__, started, 0)
+                last_exc = e
+                attempt += 1
+                if attempt < max_retries:
+                    await asyncio.sleep((self.backoff_base ** attempt) + 0.5)
+        if last_exc:
+            raise last_exc
+        raise RuntimeError('Unknown HTTP failure without exception')
+
+
+def save_request_log(client: AsyncPowerClient, path: str = REQUEST_LOG) -> str:
+    """Append the client's per-request records (url, status, latency_s, bytes, at) as JSON lines."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in client.request_log:
+            f.write(json.dumps(record) + '\n')
+    return path
+
+
+# ----------------------------------------------
+# Adaptive chunk spans
+# ----------------------------------------------
+
+@dataclass
+class ChunkPolicy:
+    """Chunk span bounds in calendar months and the latency bands that grow or shrink it."""
+    initial_months: int
+    min_months: int
+    max_months: int
+    fast_s: float = 5.0    # successes faster than this double the span
+    slow_s: float = 30.0   # successes slower than this shrink it by a quarter
+
+
+DAILY_POLICY = ChunkPolicy(initial_months=12, min_months=1, max_months=120)
+HOURLY_POLICY = ChunkPolicy(initial_months=1, min_months=1, max_months=12)
+
+
+class AdaptiveChunker:
+    """
+    Hands out month-aligned (start, end) ranges for one location/resolution. Fast successes grow the span
+    and slow ones shrink it; a timeout or 5xx halves it and re-queues the failed range in smaller pieces,
+    down to min_months. Rate limiting (429) is handled globally by the TokenBucket and leaves spans alone.
+    """
+
+    def __init__(self, start_date: str, end_date: str, policy: ChunkPolicy):
+        self.start = datetime.strptime(start_date, '%Y%m%d')
+        self.end = datetime.strptime(end_date, '%Y%m%d')
+        self.policy = policy
+        self.span = policy.initial_months
+        self.cursor = datetime(self.start.year, self.start.month, 1)
+        self.retry: Deque[Tuple[datetime, int]] = deque()
+
+    def next_range(self) -> Optional[Tuple[datetime, datetime, datetime, int]]:
+        """(chunk_start, chunk_end, month-aligned start, months) of the next request, or None when done."""
+        if self.retry:
+            aligned, months = self.retry.popleft()
+        elif self.cursor <= self.end:
+            aligned, months = self.cursor, self.span
+            self.cursor = add_months(aligned, months)
+        else:
+            return None
+        return max(self.start, aligned), min(self.end, add_months(aligned, months) - timedelta(days=1)), aligned, months
+
+    def succeeded(self, latency: float):
+        if latency < self.policy.fast_s:
+            self.span = min(self.policy.max_months, self.span * 2)
+        elif latency > self.policy.slow_s:
+            self.span = max(self.policy.min_months, (self.span * 3) // 4)
+
+    def failed(self, aligned: datetime, months: int) -> bool:
+        """Shrink after a failed range and re-queue it in halves; False when it was already at min_months."""
+        self.span = max(self.policy.min_months, self.span // 2)
+        if months <= self.policy.min_months:
+            return False
+        piece = max(self.policy.min_months, months // 2)
+        for offset in range(0, months, piece):
+            start = add_months(aligned, offset)
+            if start <= self.end:  # the failed span may run past the range; drop the empty tail
+                self.retry.append((start, min(piece, months - offset)))
+        return True
+
+
+def range_months(start_date: str, end_date: str) -> int:
+    start = datetime.strptime(start_date, '%Y%m%d')
+    end = datetime.strptime(end_date, '%Y%m%d')
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+async def fetch_chunk_json_async(client: AsyncPowerClient, url: str, chunk_end: datetime,
+                                 cache: Optional[ResponseCache] = None, max_retries: Optional[int] = None) -> Dict:
+    """Async counterpart of fetch_chunk_json; cache disk I/O (gzip bodies, manifest flushes) runs off the event loop."""
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, url)
+        if cached is not None:
+            return cached
+    try:
+        json_obj = await client.get_json(url, max_retries)
+    except Exception as e:
+        if cache is not None:
+            await asyncio.to_thread(cache.mark_failed, url, chunk_end, e)
+        raise
+    if cache is not None:
+        await asyncio.to_thread(cache.put, url, json_obj, chunk_end)
+    return json_obj
+
+
+async def _fetch_chunks(client: AsyncPowerClient, urls: List[Tuple[datetime, datetime, str]], parser,
+                        label: str, pbar: Optional[tqdm] = None, cache: Optional[ResponseCache] = None,
+                        on_chunk: Optional[Callable[[pd.DataFrame], Awaitable[None]]] = None) -> pd.DataFrame:
+    async def fetch(chunk_start: datetime, chunk_end: datetime, url: str) -> Optional[pd.DataFrame]:
+        try:
+            part = parser(await fetch_chunk_json_async(client, url, chunk_end, cache))
+            if on_chunk is not None and not part.empty:
+                await on_chunk(part)  # streamed: hand the chunk over instead of keeping it
+                return None
+            return part
+        except Exception as e:
+            print(f"Warning: {label} chunk {chunk_start.date()} to {chunk_end.date()} failed: {e}")
+            return None
+        finally:
+            if pbar is not None:
+                pbar.update(1)
+
+    # gather keeps request order, so duplicate-timestamp resolution matches the serial downloader
+    parts = await asyncio.gather(*(fetch(*u) for u in urls))
+    return combine_chunks([p for p in parts if p is not None and not p.empty])
+
+
+async def _fetch_adaptive(client: AsyncPowerClient, chunker: AdaptiveChunker, build_url: Callable[[datetime, datetime], str],
+                          parser, label: str, pbar: Optional[tqdm] = None, cache: Optional[ResponseCache] = None,
+                          on_chunk: Optional[Callable[[pd.DataFrame], Awaitable[None]]] = None) -> pd.DataFrame:
+    parts: List[Tuple[datetime, pd.DataFrame]] = []
+
+    async def worker():
+        while True:
+            item = chunker.next_range()
+            if item is None:
+                return
+            chunk_start, chunk_end, aligned, months = item
+            url = build_url(chunk_start, chunk_end)
+            # Ranges that can still be split get a single attempt; splitting is the retry
+            retries = 1 if months > chunker.policy.min_months else None
+            started = time.monotonic()
+            try:
+                json_obj = await fetch_chunk_json_async(client, url, chunk_end, cache, retries)
+            except Exception as e:
+                if chunker.failed(aligned, months):
+                    # Split into smaller retries: the pieces, not this span, decide whether the range failed
+                    if cache is not None:
+                        await asyncio.to_thread(cache.forget_failure, url)
+                    continue
+                print(f"Warning: {label} chunk {chunk_start.date()} to {chunk_end.date()} failed: {e}")
+            else:
+                chunker.succeeded(time.monotonic() - started)
+                part = parser(json_obj)
+                if on_chunk is not None and not part.empty:
+                    await on_chunk(part)  # streamed: hand the chunk over instead of keeping it
+                elif not part.empty:
+                    parts.append((chunk_start, part))
+            if pbar is not None:
+                pbar.update(months)
+
+    # Workers share the chunker, so later requests pick up the span learned from earlier ones
+    await asyncio.gather(*(worker() for _ in range(client.concurrency)))
+    parts.sort(key=lambda p: p[0])
+    return combine_chunks([p for _, p in parts])
+
+
+async def download_daily_async(client: AsyncPowerClient, lat: float, lon: float, start_date: str, end_date: str,
+                               parameters: List[str], chunk_years: int = 1, base_url: str = BASE_URL_DAILY,
+                               pbar: Optional[tqdm] = None, cache: Optional[ResponseCache] = None,
+                               adaptive: bool = False) -> pd.DataFrame:
+    """Async counterpart of download_nasa_power_daily; year chunks (or adaptive spans) are requested concurrently."""
+    if adaptive:
+        return await _fetch_adaptive(
+            client, AdaptiveChunker(start_date, end_date, DAILY_POLICY),
+            lambda s, e: _build_daily_url(lat, lon, s.strftime('%Y%m%d'), e.strftime('%Y%m%d'), parameters, base_url),
+            parse_daily_response, 'Daily', pbar, cache)
+    urls = [(s, e, _build_daily_url(lat, lon, s.strftime('%Y%m%d'), e.strftime('%Y%m%d'), parameters, base_url))
+            for s, e in daily_chunks(start_date, end_date, chunk_years)]
+    return await _fetch_chunks(client, urls, parse_daily_response, 'Daily', pbar, cache)
+
+
+async def download_hourly_async(client: AsyncPowerClient, lat: float, lon: float, start_date: str, end_date: str,
+                                parameters: List[str], chunk_months: int = 1, base_url: str = BASE_URL_HOURLY,
+                                pbar: Optional[tqdm] = None, cache: Optional[ResponseCache] = None,
+                                on_chunk: Optional[Callable[[pd.DataFrame], Awaitable[None]]] = None,
+                                adaptive: bool = False) -> pd.DataFrame:
+    """Async counterpart of download_nasa_power_hourly; month chunks (or adaptive spans) are requested concurrently."""
+    if adaptive:
+        return await _fetch_adaptive(
+            client, AdaptiveChunker(start_date, end_date, HOURLY_POLICY),
+            lambda s, e: _build_hourly_url(lat, lon, s.strftime('%Y%m%d'), e.strftime('%Y%m%d'), parameters, base_url),
+            parse_hourly_response, 'Hourly', pbar, cache, on_chunk)
+    urls = [(s, e, _build_hourly_url(lat, lon, s.strftime('%Y%m%d'), e.strftime('%Y%m%d'), parameters, base_url))
+            for s, e in hourly_chunks(start_date, end_date, chunk_months)]
+    return await _fetch_chunks(client, urls, parse_hourly_response, 'Hourly', pbar, cache, on_chunk)
+
+
+async def download_locations_async(locations: Dict[str, Dict[str, float]], daily_range: Tuple[str, str],
+                                   hourly_range: Tuple[str, str], params_daily: List[str],
+                                   params_hourly: List[str], concurrency: int = DEFAULT_CONCURRENCY,
+                                   rate: float = DEFAULT_RATE, base_url_daily: str = BASE_URL_DAILY,
+                                   base_url_hourly: str = BASE_URL_HOURLY, cache: Optional[ResponseCache] = None,
+                                   stream_hourly: bool = False, adaptive: bool = False,
+                                   request_log: Optional[str] = REQUEST_LOG, chunk_years: int = 1,
+                                   chunk_months: int = 1,
+                                   ) -> Dict[str, Tuple[pd.DataFrame, Union[pd.DataFrame, List[str]]]]:
+    """
+    Download daily and hourly frames for every location at once; returns {city_key: (daily_df, hourly_df)}.
+    With stream_hourly, hourly chunks go straight into month partitions (raw_store.write_hourly_partitions)
+    and the sorted partition keys written take the place of hourly_df. adaptive=True sizes chunks with
+    AdaptiveChunker instead of fixed chunk_years / chunk_months spans; per-request records are appended to
+    request_log unless it is None.
+    """
+    client = AsyncPowerClient(concurrency, rate)
+    if adaptive:
+        total, unit = len(locations) * (range_months(*daily_range) + range_months(*hourly_range)), 'mo'
+    else:
+        total, unit = len(locations) * (len(daily_chunks(*daily_range, chunk_years)) +
+                                        len(hourly_chunks(*hourly_range, chunk_months))), 'req'
+    try:
+        with tqdm(total=total, desc='Chunks', unit=unit) as pbar:
+            async def one(key: str, loc: Dict[str, float]):
+                parts = set()
+                lock = asyncio.Lock()
+
+                async def write_chunk(part: pd.DataFrame):
+                    # Partition merges read, sort and rewrite a month on disk: run them off the event loop,
+                    # one at a time per location so two chunks of the same month never race on a partition
+                    async with lock:
+                        parts.update(await asyncio.to_thread(write_hourly_partitions, part, key))
+
+                on_chunk = write_chunk if stream_hourly else None
+                daily_df, hourly_df = await asyncio.gather(
+                    download_daily_async(client, loc['lat'], loc['lon'], *daily_range, params_daily, chunk_years,
+                                         base_url=base_url_daily, pbar=pbar, cache=cache, adaptive=adaptive),
+                    download_hourly_async(client, loc['lat'], loc['lon'], *hourly_range, params_hourly, chunk_months,
+                                          base_url=base_url_hourly, pbar=pbar, cache=cache, on_chunk=on_chunk,
+                                          adaptive=adaptive),
+                )
+                return daily_df, sorted(parts) if stream_hourly else hourly_df
+            results = await asyncio.gather(*(one(key, loc) for key, loc in locations.items()))
+    finally:
+        client.close()
+        if request_log:
+            save_request_log(client, request_log)
+    return {key: tuple(frames) for key, frames in zip(locations.keys(), results)}
+
+
+def download_locations(locations: Dict[str, Dict[str, float]], daily_range: Tuple[str, str],
+                       hourly_range: Tuple[str, str], params_daily: List[str], params_hourly: List[str],
+                       **kwargs) -> Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]:
+    """Blocking wrapper around download_locations_async for scripts."""
+    return asyncio.run(download_locations_async(locations, daily_range, hourly_range, params_daily,
+                                                params_hourly, **kwargs))
@@ -1,21 +1,27 @@
 import os
 import time
 import json
+import shutil
+import argparse
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from itertools import chain
+from typing import Callable, Dict, List, Optional, Tuple
 
 import requests
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from location_registry import DownloadProgress, coalesce_locations, load_locations
+from memory_budget import StageMemory, compact_frame, frame_nbytes, parse_memory
+from raw_store import hourly_parts_path, raw_csv_path, write_hourly_partitions, write_raw_store
+from response_cache import CACHE_DIR, ResponseCache
+
 # ----------------------------------------------
 # Config: Locations and Parameters
 # ----------------------------------------------
-LOCATIONS: Dict[str, Dict[str, float]] = {
-    'tbilisi': {'lat': 41.7151, 'lon': 44.8271, 'name': 'Tbilisi, Georgia'},
-    'batumi': {'lat': 41.6168, 'lon': 41.6367, 'name': 'Batumi, Georgia'},
-    'kutaisi': {'lat': 42.2679, 'lon': 42.7050, 'name': 'Kutaisi, Georgia'},
-}
+# Shared location registry (locations.json or $LOCATIONS_FILE)
+LOCATIONS: Dict[str, Dict[str, float]] = load_locations()
 
 # NASA POWER parameter names and human-friendly descriptions
 PARAMETERS_DAILY: Dict[str, str] = {
@@ -62,8 +68,9 @@ PARAMETERS_HOURLY: Dict[str, str] = {
     'ALLSKY_SFC_SW_DWN': 'All Sky Surface Shortwave Downward Irradiance',
 }
 
-BASE_URL_DAILY = "https://power.larc.nasa.gov/api/temporal/daily/point"
-BASE_URL_HOURLY = "https://power.larc.nasa.gov/api/temporal/hourly/point"
+API_URL = "https://power.larc.nasa.gov"
+BASE_URL_DAILY = f"{API_URL}/api/temporal/daily/point"
+BASE_URL_HOURLY = f"{API_URL}/api/temporal/hourly/point"
 COMMUNITY = "RE"  # Renewable Energy community provides the broadest set of variables
 
 # Ensure output directories exist
@@ -75,6 +82,15 @@ os.makedirs(os.path.join('data', 'demo'), exist_ok=True)
 # ----------------------------------------------
 # HTTP helpers with retry/backoff and polite rate limiting
 # ----------------------------------------------
+def power_json(resp: requests.Response) -> Dict:
+    """Decode a 200 response, rejecting bodies without 'properties' so they are retried rather than read as no data."""
+    json_obj = resp.json()
+    if not isinstance(json_obj, dict) or 'properties' not in json_obj:
+        messages = json_obj.get('messages') if isinstance(json_obj, dict) else None
+        raise ValueError(f"Response without 'properties' for url: {resp.url} {messages or ''}".rstrip())
+    return json_obj
+
+
 def http_get_json(url: str, max_retries: int = 5, backoff_base: float = 1.5, timeout: float = 60.0):
     """
     GET the URL and parse JSON with robust retry and exponential backoff.
@@ -89,7 +105,7 @@ def http_get_json(url: str, max_retries: int = 5, backoff_base: float = 1.5, tim
         try:
             resp = requests.get(url, timeout=timeout, headers={"Accept": "application/json"})
             if resp.status_code == 200:
-                return resp.json()
+                return power_json(resp)
             # If rate limited, sleep a bit longer
             if resp.status_code in (429, 503, 502, 500):
                 delay = (backoff_base ** attempt) + 1.0
@@ -106,18 +122,37 @@ def http_get_json(url: str, max_retries: int = 5, backoff_base: float = 1.5, tim
     raise RuntimeError("Unknown HTTP failure without exception")
 
 
-def _build_daily_url(lat: float, lon: float, start: str, end: str, parameters: List[str]) -> str:
+def fetch_chunk_json(url: str, chunk_end: datetime, cache: Optional[ResponseCache] = None) -> Dict:
+    """http_get_json through the response cache: cached chunks are reused, fetched ones stored, failures checkpointed."""
+    if cache is not None:
+        cached = cache.get(url)
+        if cached is not None:
+            return cached
+    try:
+        json_obj = http_get_json(url)
+    except Exception as e:
+        if cache is not None:
+            cache.mark_failed(url, chunk_end, e)
+        raise
+    if cache is not None:
+        cache.put(url, json_obj, chunk_end)
+    return json_obj
+
+
+def _build_daily_url(lat: float, lon: float, start: str, end: str, parameters: List[str],
+                     base_url: str = BASE_URL_DAILY) -> str:
     params_str = ",".join(parameters)
     return (
-        f"{BASE_URL_DAILY}?parameters={params_str}&community={COMMUNITY}"
+        f"{base_url}?parameters={params_str}&community={COMMUNITY}"
         f"&longitude={lon}&latitude={lat}&start={start}&end={end}&format=JSON"
     )
 
 
-def _build_hourly_url(lat: float, lon: float, start: str, end: str, parameters: List[str]) -> str:
+def _build_hourly_url(lat: float, lon: float, start: str, end: str, parameters: List[str],
+                      base_url: str = BASE_URL_HOURLY) -> str:
     params_str = ",".join(parameters)
     return (
-        f"{BASE_URL_HOURLY}?parameters={params_str}&community={COMMUNITY}"
+        f"{base_url}?parameters={params_str}&community={COMMUNITY}"
         f"&longitude={lon}&latitude={lat}&start={start}&end={end}&format=JSON"
     )
 
@@ -126,6 +161,136 @@ def _build_hourly_url(lat: float, lon: float, start: str, end: str, parameters:
 # Parsing helpers
 # ----------------------------------------------
 
+# Index resolutions the per-value parsers produce, so fast-path frames are identical to theirs
+_DAILY_INDEX_UNIT = pd.to_datetime(['20000101'], format='%Y%m%d').unit
+_HOURLY_INDEX_UNIT = pd.DatetimeIndex([datetime(2000, 1, 1)]).unit
+
+
+def _parse_day_keys(keys: np.ndarray) -> Optional[np.ndarray]:
+    """YYYYMMDD strings (or their integer values) -> datetime64[D], or None if any key is not a valid date."""
+    try:
+        k = keys.astype(np.int64)
+    except ValueError:
+        return None
+    year, month, day = k // 10000, k // 100 % 100, k % 100
+    if ((month < 1) | (month > 12) | (day < 1) | (year < 1)).any():
+        return None
+    first = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1)
+    days = first.astype('datetime64[D]') + (day - 1)
+    # Day overflow (e.g. 20200231) rolls into the next month; strptime rejects those keys
+    if (days.astype('datetime64[M]') != first).any():
+        return None
+    return days
+
+
+def _column_values(values: List) -> Optional[np.ndarray]:
+    """Bulk float conversion (None -> NaN); None when values are not all numeric or null."""
+    try:
+        out = np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    return out if out.ndim == 1 else None
+
+
+def _frame_column(values: np.ndarray):
+    # The per-value parsers leave an all-null column as object dtype holding None
+    return [None] * values.shape[0] if np.isnan(values).all() else values
+
+
+def _parse_daily_fast(parameters: Dict) -> Optional[pd.DataFrame]:
+    """
+    Bulk path for the usual daily layout where every parameter maps the same YYYYMMDD keys to scalars.
+    Returns None for anything else so parse_daily_response falls back to the per-value loop.
+    """
+    maps = list(parameters.values())
+    if not all(isinstance(vmap, dict) for vmap in maps) or not maps[0]:
+        return None
+    keys = list(maps[0].keys())
+    if any(list(vmap.keys()) != keys for vmap in maps[1:]):
+        return None
+    key_arr = np.array(keys)
+    if key_arr.dtype.kind != 'U' or (np.char.str_len(key_arr) != 8).any():
+        return None
+    days = _parse_day_keys(key_arr)
+    if days is None:
+        return None
+    columns = [_column_values(list(vmap.values())) for vmap in maps]
+    if any(col is None for col in columns):
+        return None
+
+    order = np.argsort(key_arr, kind='stable')
+    data = {var: _frame_column(col[order]) for var, col in zip(parameters.keys(), columns)}
+    index = pd.DatetimeIndex(days[order], name='date').as_unit(_DAILY_INDEX_UNIT)
+    return pd.DataFrame(data, index=index)
+
+
+def _hourly_column(date_map: Dict) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    # (epoch seconds, values) for one parameter, or None if its layout needs the per-value parser
+    keys = np.array(list(date_map.keys()))
+    values = list(date_map.values())
+    if keys.dtype.kind != 'U':
+        return None
+    key_len = np.char.str_len(keys)
+    if all(isinstance(v, (list, tuple)) for v in values):
+        # date -> [h0, h1, ...]: hour i of each list lands at day + i hours
+        if (key_len != 8).any():
+            return None
+        days = _parse_day_keys(keys)
+        flat = _column_values(list(chain.from_iterable(values)))
+        if days is None or flat is None:
+            return None
+        lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        hours = np.arange(flat.shape[0], dtype=np.int64) - starts
+        seconds = np.repeat(days.astype(np.int64) * 86400, lengths) + hours * 3600
+        return seconds, flat
+    if any(v is None or isinstance(v, (list, tuple, dict)) for v in values):
+        # Null scalars are skipped by the per-value parser (float(None) fails); keep those semantics there
+        return None
+    # YYYYMMDDHH -> value
+    if (key_len != 10).any():
+        return None
+    try:
+        k = keys.astype(np.int64)
+    except ValueError:
+        return None
+    days, hour = _parse_day_keys(k // 100), k % 100
+    flat = _column_values(values)
+    if days is None or flat is None or (hour > 23).any():
+        return None
+    return days.astype(np.int64) * 86400 + hour * 3600, flat
+
+
+def _parse_hourly_fast(parameters: Dict) -> Optional[pd.DataFrame]:
+    """
+    Bulk path for the common hourly layouts (YYYYMMDD -> list of hourly values, or YYYYMMDDHH -> value).
+    Timestamps are built as int64 arrays and columns aligned on their sorted union with searchsorted.
+    Returns None for other shapes so parse_hourly_response falls back to the per-value loop.
+    """
+    columns = {}
+    for var, date_map in parameters.items():
+        if not isinstance(date_map, dict):
+            continue
+        if not date_map:
+            continue
+        parsed = _hourly_column(date_map)
+        if parsed is None:
+            return None
+        columns[var] = parsed
+    if not columns:
+        return None
+
+    stamps = np.unique(np.concatenate([seconds for seconds, _ in columns.values()]))
+    data = {}
+    for var in sorted(columns):
+        seconds, values = columns[var]
+        col = np.full(stamps.shape[0], np.nan)
+        col[np.searchsorted(stamps, seconds)] = values
+        data[var] = _frame_column(col)
+    index = pd.DatetimeIndex(stamps.astype('datetime64[s]'), name='datetime').as_unit(_HOURLY_INDEX_UNIT)
+    return pd.DataFrame(data, index=index)
+
+
 def parse_daily_response(json_obj: Dict) -> pd.DataFrame:
     """Parse NASA POWER daily JSON to a DataFrame with Date index.
 
@@ -139,7 +304,11 @@ def parse_daily_response(json_obj: Dict) -> pd.DataFrame:
     if not parameters:
         return pd.DataFrame()
 
-    # Collect all date keys
+    df = _parse_daily_fast(parameters)
+    if df is not None:
+        return df
+
+    # Fallback for irregular payloads: collect all date keys
     all_dates = set()
     for vmap in parameters.values():
         if isinstance(vmap, dict):
@@ -174,6 +343,10 @@ def parse_hourly_response(json_obj: Dict) -> pd.DataFrame:
     if not parameters:
         return pd.DataFrame()
 
+    df = _parse_hourly_fast(parameters)
+    if df is not None:
+        return df
+
     # Gather rows of (timestamp, {var: value})
     records: Dict[pd.Timestamp, Dict[str, float]] = {}
     for var, date_map in parameters.items():
@@ -223,12 +396,65 @@ def parse_hourly_response(json_obj: Dict) -> pd.DataFrame:
     return df
 
 
+# ----------------------------------------------
+# Request chunking (shared with the async engine in nasa_power_async.py)
+# ----------------------------------------------
+
+def daily_chunks(start_date: str, end_date: str, chunk_years: int = 1) -> List[Tuple[datetime, datetime]]:
+    """(chunk_start, chunk_end) pairs covering start..end in blocks of chunk_years calendar years."""
+    start_dt = datetime.strptime(start_date, '%Y%m%d')
+    end_dt = datetime.strptime(end_date, '%Y%m%d')
+    chunks = []
+    cur = datetime(start_dt.year, 1, 1)
+    while cur.year <= end_dt.year:
+        chunks.append((max(start_dt, datetime(cur.year, 1, 1)),
+                       min(end_dt, datetime(cur.year + chunk_years - 1, 12, 31))))
+        cur = datetime(cur.year + chunk_years, 1, 1)
+    return chunks
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    """First day of the month `months` calendar months after dt's month."""
+    total = dt.year * 12 + dt.month - 1 + months
+    return datetime(total // 12, total % 12 + 1, 1)
+
+
+def hourly_chunks(start_date: str, end_date: str, chunk_months: int = 1) -> List[Tuple[datetime, datetime]]:
+    """(chunk_start, chunk_end) pairs covering start..end in blocks of chunk_months calendar months."""
+    start_dt = datetime.strptime(start_date, '%Y%m%d')
+    end_dt = datetime.strptime(end_date, '%Y%m%d')
+    chunks = []
+    cur = datetime(start_dt.year, start_dt.month, 1)
+    while cur <= end_dt:
+        nxt = add_months(cur, chunk_months)
+        # Chunk ends on the last day before the next block
+        chunks.append((max(start_dt, cur), min(end_dt, nxt - timedelta(days=1))))
+        cur = nxt
+    return chunks
+
+
+def combine_chunks(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate chunk frames in request order, sort, and drop duplicate timestamps keeping the last."""
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames)
+    # Chunks normally arrive in order without overlap; skip the sorted and deduplicated copies then
+    if df.index.is_monotonic_increasing and df.index.is_unique:
+        return df
+    df = df.sort_index()
+    # Drop duplicate indices keeping the last non-null values
+    df = df[~df.index.duplicated(keep='last')]
+    return df
+
+
 # ----------------------------------------------
 # Public download functions (chunking + progress bars)
 # ----------------------------------------------
 
 def download_nasa_power_daily(lat: float, lon: float, start_date: str, end_date: str, parameters: List[str],
-                              chunk_years: int = 1, sleep_between: float = 1.0) -> pd.DataFrame:
+                              chunk_years: int = 1, sleep_between: float = 1.0,
+                              cache: Optional[ResponseCache] = None, base_url: str = BASE_URL_DAILY) -> pd.DataFrame:
     """
     Download NASA POWER daily data by chunking across years for reliability.
 
@@ -237,97 +463,149 @@ def download_nasa_power_daily(lat: float, lon: float, start_date: str, end_date:
         start_date, end_date: 'YYYYMMDD'
         parameters: list of variable names
         chunk_years: number of years per request (1 is safest)
-        sleep_between: polite delay between requests
+        sleep_between: polite delay between requests (skipped for cached chunks)
+        cache: optional ResponseCache; cached chunks are not requested again
+        base_url: daily point endpoint (e.g. a local mock_power_server)
     Returns: DataFrame indexed by date
     """
-    start_dt = datetime.strptime(start_date, '%Y%m%d')
-    end_dt = datetime.strptime(end_date, '%Y%m%d')
+    chunks = daily_chunks(start_date, end_date, chunk_years)
 
     frames = []
-    cur = datetime(start_dt.year, 1, 1)
-    pbar_total = end_dt.year - start_dt.year + 1
+    pbar_total = chunks[-1][1].year - chunks[0][0].year + 1 if chunks else 0
     with tqdm(total=pbar_total, desc='Daily year chunks', unit='year') as pbar:
-        while cur.year <= end_dt.year:
-            chunk_start = max(start_dt, datetime(cur.year, 1, 1))
-            chunk_end = min(end_dt, datetime(cur.year + chunk_years - 1, 12, 31))
-            url = _build_daily_url(lat, lon, chunk_start.strftime('%Y%m%d'), chunk_end.strftime('%Y%m%d'), parameters)
+        for chunk_start, chunk_end in chunks:
+            url = _build_daily_url(lat, lon, chunk_start.strftime('%Y%m%d'), chunk_end.strftime('%Y%m%d'), parameters,
+                                   base_url)
+            hits_before = cache.hits if cache is not None else 0
             try:
-                json_obj = http_get_json(url)
+                json_obj = fetch_chunk_json(url, chunk_end, cache)
                 df_part = parse_daily_response(json_obj)
                 if not df_part.empty:
                     frames.append(df_part)
             except Exception as e:
                 print(f"Warning: Daily chunk {chunk_start.date()} to {chunk_end.date()} failed: {e}")
-            time.sleep(sleep_between)
+            if cache is None or cache.hits == hits_before:
+                time.sleep(sleep_between)
             pbar.update(chunk_years)
-            cur = datetime(cur.year + chunk_years, 1, 1)
 
-    if not frames:
-        return pd.DataFrame()
-
-    df = pd.concat(frames).sort_index()
-    # Drop duplicate indices keeping the last non-null values
-    df = df[~df.index.duplicated(keep='last')]
-    return df
+    return combine_chunks(frames)
 
 
 def download_nasa_power_hourly(lat: float, lon: float, start_date: str, end_date: str, parameters: List[str],
-                               chunk_months: int = 1, sleep_between: float = 1.0) -> pd.DataFrame:
+                               chunk_months: int = 1, sleep_between: float = 1.0,
+                               cache: Optional[ResponseCache] = None,
+                               on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+                               base_url: str = BASE_URL_HOURLY) -> pd.DataFrame:
     """
     Download NASA POWER hourly data by chunking monthly for size and reliability.
 
     Note: Not all variables are available hourly; missing ones will appear as NaN.
+    With on_chunk, each parsed chunk is handed over as it arrives instead of being kept, and an
+    empty frame is returned (see stream_nasa_power_hourly).
     """
-    start_dt = datetime.strptime(start_date, '%Y%m%d')
-    end_dt = datetime.strptime(end_date, '%Y%m%d')
+    # Iterate in blocks of chunk_months calendar months
+    chunks = hourly_chunks(start_date, end_date, chunk_months)
 
     frames = []
-
-    # Iterate month by month
-    cur = datetime(start_dt.year, start_dt.month, 1)
-    # Compute number of month steps for progress bar
-    total_months = (end_dt.year - start_dt.year) * 12 + (end_dt.month - start_dt.month) + 1
-    with tqdm(total=total_months, desc='Hourly month chunks', unit='mo') as pbar:
-        while cur <= end_dt:
-            # Determine chunk end
-            year = cur.year
-            month = cur.month
-            chunk_start = max(start_dt, datetime(year, month, 1))
-            # Last day of month
-            if month == 12:
-                last_day = datetime(year, 12, 31)
-            else:
-                last_day = datetime(year, month + 1, 1) - timedelta(days=1)
-            chunk_end = min(end_dt, last_day)
-
-            url = _build_hourly_url(lat, lon, chunk_start.strftime('%Y%m%d'), chunk_end.strftime('%Y%m%d'), parameters)
+    with tqdm(total=len(chunks), desc='Hourly month chunks', unit='mo') as pbar:
+        for chunk_start, chunk_end in chunks:
+            url = _build_hourly_url(lat, lon, chunk_start.strftime('%Y%m%d'), chunk_end.strftime('%Y%m%d'), parameters,
+                                    base_url)
+            hits_before = cache.hits if cache is not None else 0
             try:
-                json_obj = http_get_json(url)
+                json_obj = fetch_chunk_json(url, chunk_end, cache)
                 df_part = parse_hourly_response(json_obj)
                 if not df_part.empty:
-                    frames.append(df_part)
+                    if on_chunk is not None:
+                        on_chunk(df_part)
+                    else:
+                        frames.append(df_part)
             except Exception as e:
                 print(f"Warning: Hourly chunk {chunk_start.date()} to {chunk_end.date()} failed: {e}")
-            time.sleep(sleep_between)
+            if cache is None or cache.hits == hits_before:
+                time.sleep(sleep_between)
             pbar.update(1)
-            # Move to next month
-            if month == 12:
-                cur = datetime(year + 1, 1, 1)
-            else:
-                cur = datetime(year, month + 1, 1)
 
-    if not frames:
-        return pd.DataFrame()
+    return combine_chunks(frames)
 
-    df = pd.concat(frames).sort_index()
-    df = df[~df.index.duplicated(keep='last')]
-    return df
+
+def stream_nasa_power_hourly(lat: float, lon: float, start_date: str, end_date: str, parameters: List[str],
+                             location: str, sleep_between: float = 1.0,
+                             cache: Optional[ResponseCache] = None, base_url: str = BASE_URL_HOURLY) -> List[str]:
+    """
+    Download hourly data writing every month chunk straight into data/raw/<location>_hourly_parts,
+    so memory stays at one chunk regardless of the date range. Returns the partition keys written.
+    """
+    keys = set()
+    download_nasa_power_hourly(lat, lon, start_date, end_date, parameters, sleep_between=sleep_between, cache=cache,
+                               on_chunk=lambda part: keys.update(write_hourly_partitions(part, location)),
+                               base_url=base_url)
+    return sorted(keys)
+
+
+def save_raw(df: pd.DataFrame, city_key: str, resolution: str, raw_format: str = 'store'):
+    """
+    Persist a downloaded frame as the binary raw store and/or the legacy CSV export. Compact (float32)
+    columns are stored as float32.
+    """
+    if raw_format in ('store', 'both'):
+        out_path = write_raw_store(df, city_key, resolution, dtype=None)
+        print(f"Saved {resolution} data to {out_path} with shape {df.shape}")
+    if raw_format in ('csv', 'both'):
+        out_path = raw_csv_path(city_key, resolution)
+        df.to_csv(out_path)
+        print(f"Saved {resolution} data to {out_path} with shape {df.shape}")
 
 
 # ----------------------------------------------
 # Main execution
 # ----------------------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Download NASA POWER daily and hourly point data.')
+    parser.add_argument('--raw-format', choices=['store', 'csv', 'both'], default='store',
+                        help='Write the binary columnar raw store, the legacy CSV export, or both')
+    parser.add_argument('--engine', choices=['async', 'serial'], default='async',
+                        help='async: all chunks of all locations concurrently over a pooled session; '
+                             'serial: one request at a time with fixed sleeps')
+    parser.add_argument('--concurrency', type=int, default=4, help='Max in-flight requests (async engine)')
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help='Max request starts per second across all in-flight requests (async engine)')
+    parser.add_argument('--adaptive-chunks', action='store_true',
+                        help='Grow request spans while responses are fast and shrink them after timeouts/5xx '
+                             '(async engine); per-request latency and size go to data/state/request_log.jsonl')
+    parser.add_argument('--stream-hourly', action='store_true',
+                        help='Write hourly chunks into monthly partitions (data/raw/<city>_hourly_parts) as they '
+                             'arrive instead of holding the full range in memory; ignores --raw-format for hourly')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='On-disk response cache / checkpoint directory')
+    parser.add_argument('--no-cache', action='store_true', help='Fetch every chunk and do not write the cache')
+    parser.add_argument('--cache-max-mb', type=float, default=1024.0, help='Evict cached responses beyond this size')
+    parser.add_argument('--refresh-current-year', action='store_true',
+                        help='Refetch chunks of the current year even if cached (history is always reused)')
+    parser.add_argument('--batch-size', type=int, default=25,
+                        help='Grid cells downloaded (and saved) per batch when the registry holds many points')
+    parser.add_argument('--force', action='store_true',
+                        help='Download locations already marked complete in data/state/download_progress.json '
+                             '(locations with failed chunks are always downloaded again)')
+    parser.add_argument('--api-url', default=API_URL,
+                        help='POWER API host, e.g. http://127.0.0.1:8765 for a local mock_power_server.py')
+    parser.add_argument('--memory-efficient', action='store_true',
+                        help='Hold downloaded frames as float32 wherever that is lossless and write them to the '
+                             'raw store as float32 (half the memory and disk; identical values)')
+    parser.add_argument('--max-memory', type=parse_memory, default=None,
+                        help='Memory budget, e.g. 512M or 2G: batches whose hourly frames would not fit stream '
+                             'hourly chunks into month partitions (see --stream-hourly)')
+    parser.add_argument('--memory-report', nargs='?', const='', default=None, metavar='PATH',
+                        help='Print wall time and peak RSS per stage and save them as JSON '
+                             '(default data/benchmarks/memory_download_<ts>.json)')
+    args = parser.parse_args()
+
+    base_url_daily = BASE_URL_DAILY.replace(API_URL, args.api_url.rstrip('/'))
+    base_url_hourly = BASE_URL_HOURLY.replace(API_URL, args.api_url.rstrip('/'))
+
+    cache = None if args.no_cache else ResponseCache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024),
+                                                       refresh_current_year=args.refresh_current_year)
+    progress = DownloadProgress()
+
     # Time ranges
     daily_start = '20050101'
     daily_end = '20241231'
@@ -338,34 +616,129 @@ if __name__ == "__main__":
     params_daily = list(PARAMETERS_DAILY.keys())
     params_hourly = list(PARAMETERS_HOURLY.keys())
 
-    for city_key, location in LOCATIONS.items():
+    tracker = StageMemory(enabled=args.memory_report is not None)
+    hourly_rows = (pd.Timestamp(hourly_end) - pd.Timestamp(hourly_start)).days * 24 + 24
+
+    def streams_hourly(n_cells: int) -> bool:
+        # Held hourly frames of a batch: parsed chunks plus their concatenation (float64 while parsing)
+        if args.stream_hourly or args.max_memory is None:
+            return args.stream_hourly
+        return n_cells * 2 * frame_nbytes(hourly_rows, len(params_hourly)) > args.max_memory
+
+    def download_serial(city_key: str, location: Dict[str, float], stream_hourly: bool):
         print(f"Downloading data for {location['name']} ({city_key}) ...")
         lat = location['lat']
         lon = location['lon']
 
         # DAILY
+        daily_df = None
         try:
-            daily_df = download_nasa_power_daily(lat, lon, daily_start, daily_end, params_daily, chunk_years=1)
-            if daily_df is not None and not daily_df.empty:
-                out_path = os.path.join('data', 'raw', f'{city_key}_daily_raw.csv')
-                daily_df.to_csv(out_path)
-                print(f"Saved daily data to {out_path} with shape {daily_df.shape}")
-            else:
-                print("No daily data returned.")
+            daily_df = download_nasa_power_daily(lat, lon, daily_start, daily_end, params_daily, chunk_years=1,
+                                                 cache=cache, base_url=base_url_daily)
         except Exception as e:
             print(f"Error downloading daily data for {city_key}: {e}")
 
         # HOURLY
+        hourly = None
         try:
-            hourly_df = download_nasa_power_hourly(lat, lon, hourly_start, hourly_end, params_hourly, chunk_months=1)
-            if hourly_df is not None and not hourly_df.empty:
-                out_path = os.path.join('data', 'raw', f'{city_key}_hourly_raw.csv')
-                hourly_df.to_csv(out_path)
-                print(f"Saved hourly data to {out_path} with shape {hourly_df.shape}")
+            if stream_hourly:
+                hourly = stream_nasa_power_hourly(lat, lon, hourly_start, hourly_end, params_hourly, city_key,
+                                                  cache=cache, base_url=base_url_hourly)
             else:
-                print("No hourly data returned (may be unavailable for some parameters or date ranges).")
+                hourly = download_nasa_power_hourly(lat, lon, hourly_start, hourly_end, params_hourly,
+                                                    chunk_months=1, cache=cache, base_url=base_url_hourly)
         except Exception as e:
             print(f"Error downloading hourly data for {city_key}: {e}")
 
         # Polite pause to help with rate limiting
         time.sleep(5)
+        return daily_df, hourly
+
+    def failed_chunks(location: Dict[str, float], base_url: str) -> int:
+        # Chunks of this cell that were still failing at the end of this run (recorded by the cache)
+        if cache is None:
+            return 0
+        cell = f"&longitude={location['lon']}&latitude={location['lat']}&"
+        return sum(url.startswith(base_url + '?') and cell in url for url in cache.run_failures)
+
+    def mark_fetched(city_key: str, resolution: str, rows: int, failed: int):
+        if failed:
+            print(f"{failed} {resolution} chunk(s) failed for {city_key}; it will be downloaded again on the next run")
+            progress.mark(city_key, resolution, 'partial', rows, error=f'{failed} chunk(s) failed')
+        else:
+            progress.mark(city_key, resolution, 'done', rows)
+
+    def save_cell(members: List[str], daily_df: Optional[pd.DataFrame], hourly, stream_hourly: bool):
+        # Every location in a grid cell gets the series fetched for its first member
+        location = LOCATIONS[members[0]]
+        daily_failed = failed_chunks(location, base_url_daily)
+        hourly_failed = failed_chunks(location, base_url_hourly)
+        for city_key in members:
+            if daily_df is not None and not daily_df.empty:
+                save_raw(daily_df, city_key, 'daily', args.raw_format)
+                mark_fetched(city_key, 'daily', len(daily_df), daily_failed)
+            else:
+                print(f"No daily data returned for {city_key}.")
+                progress.mark(city_key, 'daily', 'failed')
+            if stream_hourly:
+                if hourly and city_key != members[0]:
+                    shutil.copytree(hourly_parts_path(members[0]), hourly_parts_path(city_key), dirs_exist_ok=True)
+                print(f"Streamed {len(hourly or [])} hourly month partition(s) for {city_key}")
+                if hourly:
+                    mark_fetched(city_key, 'hourly', len(hourly), hourly_failed)
+                else:
+                    progress.mark(city_key, 'hourly', 'failed')
+            elif hourly is not None and not hourly.empty:
+                save_raw(hourly, city_key, 'hourly', args.raw_format)
+                mark_fetched(city_key, 'hourly', len(hourly), hourly_failed)
+            else:
+                print(f"No hourly data returned for {city_key} (may be unavailable for some parameters or date ranges).")
+                progress.mark(city_key, 'hourly', 'failed')
+        progress.save()
+
+    # Locations marked complete are skipped, unless the cache has to decide what is refetched: without a
+    # cache failed chunks are not tracked, and current-year chunks are mutable (--refresh-current-year
+    # or their TTL), while historical chunks are reused from the cache either way.
+    revisit = (args.force or cache is None or args.refresh_current_year
+               or max(daily_end, hourly_end)[:4] >= str(datetime.now().year))
+    pending = {k: v for k, v in LOCATIONS.items() if revisit or not progress.is_done(k)}
+    cells = list(coalesce_locations(pending).values())
+    print(f"{len(pending)} of {len(LOCATIONS)} location(s) to download in {len(cells)} POWER grid cell(s)")
+
+    try:
+        for b in range(0, len(cells), args.batch_size):
+            batch = cells[b:b + args.batch_size]
+            fetch = {members[0]: pending[members[0]] for members in batch}
+            stream = streams_hourly(len(fetch))
+            if stream and not args.stream_hourly:
+                print(f"Hourly frames of {len(fetch)} cell(s) exceed --max-memory; streaming to month partitions")
+            with tracker.stage('download', batch=b // args.batch_size + 1):
+                if args.engine == 'async':
+                    from nasa_power_async import download_locations
+
+                    print(f"Batch {b // args.batch_size + 1}: {', '.join(fetch)} "
+                          f"({args.concurrency} concurrent, {args.rate}/s) ...")
+                    results = download_locations(fetch, (daily_start, daily_end), (hourly_start, hourly_end),
+                                                 params_daily, params_hourly, concurrency=args.concurrency, rate=args.rate,
+                                                 base_url_daily=base_url_daily, base_url_hourly=base_url_hourly,
+                                                 cache=cache, stream_hourly=stream, adaptive=args.adaptive_chunks)
+                else:
+                    results = {key: download_serial(key, loc, stream) for key, loc in fetch.items()}
+                if args.memory_efficient:
+                    results = {key: (compact_frame(daily_df), hourly if stream else compact_frame(hourly))
+                               for key, (daily_df, hourly) in results.items()}
+            with tracker.stage('save', batch=b // args.batch_size + 1):
+                for members in batch:
+                    save_cell(members, *results[members[0]], stream)
+            del results
+    finally:
+        if cache is not None:
+            cache.close()  # flush batched manifest entries, also when the run is interrupted
+    if cache is not None:
+        print(cache.summary())
+    print(progress.summary(list(LOCATIONS)))
+    if tracker.enabled:
+        print(tracker.format())
+        config = {'engine': args.engine, 'batch_size': args.batch_size, 'memory_efficient': args.memory_efficient,
+                  'max_memory': args.max_memory, 'stream_hourly': args.stream_hourly}
+        print(f"Wrote {tracker.save('download', args.memory_report or None, **config)}")
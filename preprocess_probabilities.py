@@ -1,18 +1,25 @@
 import os
 import json
+import argparse
+import copy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from datetime import datetime, timezone
-from typing import Dict
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 from scipy import stats
 
-# Reuse locations from download script (duplicated here to keep scripts standalone)
-LOCATIONS: Dict[str, Dict[str, float]] = {
-    'tbilisi': {'lat': 41.7151, 'lon': 44.8271, 'name': 'Tbilisi, Georgia'},
-    'batumi': {'lat': 41.6168, 'lon': 41.6367, 'name': 'Batumi, Georgia'},
-    'kutaisi': {'lat': 42.2679, 'lon': 42.7050, 'name': 'Kutaisi, Georgia'},
-}
+from doy_query import DoySamples, save_doy_samples
+from location_registry import load_locations
+from memory_budget import StageMemory, compact_frame, doy_hour_keys, doy_year_keys, parse_memory, widen
+from raw_qc import qc_location
+from raw_store import load_raw_frame
+
+# Shared location registry (locations.json or $LOCATIONS_FILE), same as the download script
+LOCATIONS: Dict[str, Dict[str, float]] = load_locations()
 
 # Thresholds for extreme events (configurable)
 THRESHOLDS = {
@@ -68,6 +75,23 @@ THRESHOLDS = {
     'ALLSKY_SFC_SW_DWN': {},
 }
 
+# Percentile levels reported per DOY (name -> quantile)
+PERCENTILES: Dict[str, float] = {
+    'p25': 0.25,
+    'p50': 0.50,
+    'p75': 0.75,
+    'p90': 0.90,
+    'p95': 0.95,
+}
+
+# Hourly variables written by the download script (mirrors PARAMETERS_HOURLY there)
+HOURLY_VARIABLES = ['T2M', 'PRECTOTCORR', 'WS2M', 'WS10M', 'RH2M', 'PS', 'QV2M', 'ALLSKY_SFC_SW_DWN']
+
+# Hourly-only thresholds written at the top level of each hour entry (mm/hour for precipitation)
+HOURLY_EXTRA_THRESHOLDS = {
+    'PRECTOTCORR': {'probability_above_1mm': 1.0},
+}
+
 NASA_ATTRIBUTION = {
     'dataset': 'NASA POWER',
     'api_url': 'https://power.larc.nasa.gov/',
@@ -75,76 +99,372 @@ NASA_ATTRIBUTION = {
     'access_date': datetime.now(timezone.utc).date().isoformat(),
 }
 
+# Fixed seed so bootstrap confidence intervals are reproducible run to run
+BOOTSTRAP_SEED = 20250101
+
 os.makedirs(os.path.join('data', 'processed'), exist_ok=True)
 os.makedirs(os.path.join('data', 'demo'), exist_ok=True)
 
 
-def calculate_day_of_year_stats(df: pd.DataFrame, variable: str, thresholds: Dict[str, float]) -> Dict:
+def exceeds(values: np.ndarray, th_name: str, th_val: float) -> np.ndarray:
+    """Boolean exceedance mask; names containing 'above' test >, all others test <. NaN never exceeds."""
+    if 'above' in th_name:
+        return values > th_val
+    return values < th_val
+
+
+def grouped_sample_matrix(keys: np.ndarray, values: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Calculate statistics and probabilities by day-of-year for a given variable.
-    df is expected to have a DatetimeIndex named 'date'.
+    Scatter values into a NaN-padded (n_groups x max_count) matrix, ascending within each row.
+    keys are 0-based group ids. Returns (matrix, counts); a single sort replaces per-group filters.
     """
-    work = df.copy()
-    work = work.sort_index()
-    work = work[[variable]].dropna()
-    work['day_of_year'] = work.index.dayofyear
-    work['year'] = work.index.year
+    counts = np.bincount(keys, minlength=n_groups)
+    order = np.lexsort((values, keys))
+    keys_s = keys[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = np.arange(keys_s.shape[0]) - starts[keys_s]
+    width = int(counts.max()) if counts.size and counts.max() > 0 else 1
+    matrix = np.full((n_groups, width), np.nan)
+    matrix[keys_s, pos] = values[order]
+    return matrix, counts
+
+
+def _lerp(a: np.ndarray, b: np.ndarray, t: np.ndarray) -> np.ndarray:
+    # Same formulation numpy uses for 'linear' quantiles, so results match Series.quantile bit-for-bit
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1.0 - t), a + diff * t)
+
+
+def matrix_quantile(matrix: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Linear-interpolated quantile of each row of a sorted, NaN-padded sample matrix."""
+    n = np.maximum(counts, 1)
+    virtual = q * (n - 1)
+    lo = np.floor(virtual).astype(np.int64)
+    hi = np.minimum(lo + 1, n - 1)
+    a = np.take_along_axis(matrix, lo[:, None], axis=1)[:, 0]
+    b = np.take_along_axis(matrix, hi[:, None], axis=1)[:, 0]
+    out = _lerp(a, b, virtual - lo)
+    return np.where(counts > 0, out, np.nan)
+
+
+def matrix_order_stats(matrix: np.ndarray, counts: np.ndarray) -> Dict[str, np.ndarray]:
+    """Median, min, max and PERCENTILES of each row of a sorted, NaN-padded sample matrix."""
+    rows = np.arange(matrix.shape[0])
+    n = np.maximum(counts, 1)
+    mid_lo = (n - 1) // 2
+    mid_hi = n // 2
+    median = (matrix[rows, mid_lo] + matrix[rows, mid_hi]) / 2.0
+    median = np.where(mid_lo == mid_hi, matrix[rows, mid_lo], median)
+    return {
+        'median': median,
+        'min': matrix[:, 0],
+        'max': matrix[rows, n - 1],
+        'percentiles': {name: matrix_quantile(matrix, counts, q) for name, q in PERCENTILES.items()},
+    }
 
-    results: Dict[int, Dict] = {}
 
-    for doy in range(1, 367):
-        sel = work[work['day_of_year'] == doy][variable].dropna()
-        if sel.empty:
-            # Keep missing days out; validator will report
-            continue
+def matrix_stats(matrix: np.ndarray, counts: np.ndarray, thresholds: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """Per-row sample statistics of a sorted, NaN-padded sample matrix (see grouped_sample_matrix)."""
+    n = np.maximum(counts, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(matrix, axis=1) / n
+        sq = np.nansum((matrix - mean[:, None]) ** 2, axis=1)
+        std = np.where(counts > 1, np.sqrt(sq / np.maximum(counts - 1, 1)), 0.0)
+    probabilities = {
+        th_name: exceeds(matrix, th_name, th_val).sum(axis=1) / n
+        for th_name, th_val in thresholds.items()
+    }
+    return {
+        'count': counts,
+        'mean': mean,
+        'std': std,
+        'probabilities': probabilities,
+        **matrix_order_stats(matrix, counts),
+    }
+
+
+def yearly_matrix(doy: np.ndarray, year: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean value per (DOY, year) as a (366 x n_years) matrix with NaN for missing cells."""
+    years, year_idx = np.unique(year, return_inverse=True)
+    cell = (doy - 1).astype(np.int64) * years.shape[0] + year_idx
+    size = 366 * years.shape[0]
+    sums = np.bincount(cell, weights=values, minlength=size)
+    cnt = np.bincount(cell, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(cnt > 0, sums / np.maximum(cnt, 1), np.nan)
+    return means.reshape(366, years.shape[0]), years
+
+
+def matrix_trend(matrix: np.ndarray, years: np.ndarray, min_years: int = 4) -> Dict[str, np.ndarray]:
+    """Row-wise ordinary least-squares trend of a (DOY x year) matrix, equivalent to scipy.stats.linregress."""
+    mask = ~np.isnan(matrix)
+    n = mask.sum(axis=1)
+    nn = np.maximum(n, 1)
+    x = np.broadcast_to(years.astype(float), matrix.shape)
+    y = np.where(mask, matrix, 0.0)
+    xm = np.where(mask, x, 0.0).sum(axis=1) / nn
+    ym = y.sum(axis=1) / nn
+    dx = np.where(mask, x - xm[:, None], 0.0)
+    dy = np.where(mask, matrix - ym[:, None], 0.0)
+    ssxm = (dx * dx).sum(axis=1) / nn
+    ssym = (dy * dy).sum(axis=1) / nn
+    ssxym = (dx * dy).sum(axis=1) / nn
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = np.where((ssxm == 0.0) | (ssym == 0.0), np.nan, ssxym / np.sqrt(ssxm * ssym))
+        r = np.clip(r, -1.0, 1.0)
+        slope = ssxym / ssxm
+        df_t = np.maximum(n - 2, 1)
+        t = r * np.sqrt(df_t / ((1.0 - r + 1e-20) * (1.0 + r + 1e-20)))
+        p_value = 2.0 * stats.t.sf(np.abs(t), df_t)
+    return {
+        'valid': n >= min_years,
+        'slope': slope,
+        'p_value': p_value,
+        'r_squared': r ** 2,
+    }
+
+
+def doy_samples(df: pd.DataFrame, variable: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (float64 values, int16 DOY 1..366, int16 year) of the non-null rows of df[variable], in row order.
+    Compact (float32) columns are widened exactly (memory_budget.widen); no copy of the column is kept.
+    """
+    values = widen(df[variable].to_numpy())
+    present = ~np.isnan(values)
+    doy, year = doy_year_keys(df.index)
+    return values[present], doy[present], year[present]
+
+
+def doy_stats_arrays(df: pd.DataFrame, variable: str, thresholds: Dict[str, float]) -> Dict:
+    """
+    Grouped day-of-year statistics for one variable as arrays indexed by DOY-1 (length 366).
+    The column is sorted once by (DOY, value); every statistic is then a row-wise array operation.
+    """
+    values, doy, year = doy_samples(df, variable)
+
+    matrix, counts = grouped_sample_matrix(doy - 1, values, 366)
+    out = matrix_stats(matrix, counts, thresholds)
+    out['samples'] = matrix
+    ymat, years = yearly_matrix(doy, year, values)
+    out['yearly'] = ymat
+    out['years'] = years
+    out['trend'] = matrix_trend(ymat, years)
+    return out
+
+
+def circular_window_sum(a: np.ndarray, k: int) -> np.ndarray:
+    """Sum of rows d-k..d+k (wrapping around the 366-row DOY axis) for every row d, via one cumulative sum."""
+    if k == 0:
+        return a.astype(float)
+    ext = np.concatenate([a[-k:], a, a[:k]], axis=0).astype(float)
+    cs = np.concatenate([np.zeros((1,) + a.shape[1:]), np.cumsum(ext, axis=0)], axis=0)
+    return cs[2 * k + 1:] - cs[:-(2 * k + 1)]
+
+
+def _sequence_window_sum(a: np.ndarray, k: int) -> np.ndarray:
+    # Non-wrapping centred window sum along a 1-D chronological sequence (edges use the part that exists)
+    padded = np.concatenate([np.zeros(k), a, np.zeros(k)])
+    cs = np.concatenate([[0.0], np.cumsum(padded)])
+    return cs[2 * k + 1:] - cs[:-(2 * k + 1)]
+
+
+def window_doy_stats_arrays(df: pd.DataFrame, variable: str, thresholds: Dict[str, float], k: int) -> Dict:
+    """
+    Smoothed day-of-year climatology pooling DOYs d-k..d+k (wrapping at year end), in doy_stats_arrays layout.
+    Counts, means, variances and exceedance counts are circular window sums of per-DOY accumulators;
+    percentiles come from one sort of the pooled (366 x (2k+1)*years) sample matrix. Yearly values are
+    window means over the chronological (year x DOY) sequence, so early-January windows reach into the
+    previous December.
+    """
+    if not 0 <= k < 183:
+        raise ValueError(f'window half-width must be in 0..182 days, got {k}')
+    values, doy, year = doy_samples(df, variable)
+
+    matrix, counts = grouped_sample_matrix(doy - 1, values, 366)
+    # Shift by the overall mean before squaring so the sum-of-squares variance stays well conditioned
+    shift = float(values.mean()) if values.size else 0.0
+    centred = matrix - shift
+    per_doy = np.column_stack([
+        counts,
+        np.nansum(centred, axis=1),
+        np.nansum(centred ** 2, axis=1),
+    ] + [exceeds(matrix, name, val).sum(axis=1) for name, val in thresholds.items()])
+    pooled = circular_window_sum(per_doy, k)
+    n_pooled = np.rint(pooled[:, 0]).astype(np.int64)
+    n = np.maximum(n_pooled, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_c = pooled[:, 1] / n
+        var = np.maximum(pooled[:, 2] - pooled[:, 1] * mean_c, 0.0) / np.maximum(n_pooled - 1, 1)
+    probabilities = {name: np.rint(pooled[:, 3 + j]) / n for j, name in enumerate(thresholds)}
+
+    idx = (np.arange(366)[:, None] + np.arange(-k, k + 1)[None, :]) % 366
+    window_samples = np.sort(matrix[idx].reshape(366, -1), axis=1)
+    width = max(int(n_pooled.max()), 1) if n_pooled.size else 1
+    window_samples = window_samples[:, :width]
+
+    out = {
+        'count': n_pooled,
+        'mean': np.where(n_pooled > 0, mean_c + shift, np.nan),
+        'std': np.where(n_pooled > 1, np.sqrt(var), 0.0),
+        'probabilities': probabilities,
+        'samples': window_samples,
+        **matrix_order_stats(window_samples, n_pooled),
+    }
+
+    years, year_idx = np.unique(year, return_inverse=True)
+    cell = year_idx * 366 + (doy - 1)
+    size = years.shape[0] * 366
+    sums = _sequence_window_sum(np.bincount(cell, weights=values, minlength=size), k)
+    cnts = _sequence_window_sum(np.bincount(cell, minlength=size).astype(float), k)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ymat = np.where(cnts > 0.5, sums / np.maximum(cnts, 1.0), np.nan).reshape(years.shape[0], 366).T
+    # Keep a yearly value only where that (DOY, year) was itself observed
+    observed = np.bincount(cell, minlength=size).reshape(years.shape[0], 366).T > 0
+    ymat = np.where(observed, ymat, np.nan)
+    out['yearly'] = ymat
+    out['years'] = years
+    out['trend'] = matrix_trend(ymat, years)
+    return out
+
+
+def bootstrap_intervals(yearly: np.ndarray, thresholds: Dict[str, float], n_boot: int = 1000,
+                        seed: int = BOOTSTRAP_SEED, level: float = 0.95) -> Dict:
+    """
+    Year-resampling bootstrap bands for every threshold probability and PERCENTILES entry per DOY.
+    yearly is the (366 x n_years) matrix holding one sample per (DOY, year). All resamples are drawn as
+    one (n_boot x n_years) index array: probabilities become a single matrix product with the per-year
+    multiplicities. For percentiles the drawn indices are read as ranks into each DOY's sorted samples
+    (NaN last): a draw with replacement of ranks is a draw with replacement of that DOY's years, so the
+    sorted draws of a resample pick its order statistics straight from the sorted matrix and no resample
+    is sorted or materialised.
+    """
+    n_days, n_years = yearly.shape
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, n_years, size=(n_boot, n_years))
+    flat = (np.arange(n_boot)[:, None] * n_years + idx).ravel()
+    weights = np.bincount(flat, minlength=n_boot * n_years).reshape(n_boot, n_years).astype(float)
+    bounds = ((1.0 - level) / 2.0, 1.0 - (1.0 - level) / 2.0)
+
+    def band(stat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Quantiles of each DOY's bootstrap distribution; NaN resamples (no data drawn) are ignored
+        ordered = np.sort(stat, axis=1)
+        counts = (~np.isnan(ordered)).sum(axis=1)
+        return matrix_quantile(ordered, counts, bounds[0]), matrix_quantile(ordered, counts, bounds[1])
+
+    n_b = (~np.isnan(yearly)).astype(float) @ weights.T  # (366, n_boot) resampled sample sizes
+    probabilities = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for name, val in thresholds.items():
+            hits = exceeds(yearly, name, val).astype(float) @ weights.T
+            probabilities[name] = band(np.where(n_b > 0, hits / n_b, np.nan))
+
+    ordered = np.sort(yearly, axis=1)
+    ranks = np.sort(idx, axis=1)
+    # Draws of each resample landing below rank c, i.e. on one of the samples of a DOY with c of them
+    below = np.concatenate([np.zeros((n_boot, 1)), np.cumsum(weights, axis=1)], axis=1).astype(np.int64)
+    present = (~np.isnan(yearly)).sum(axis=1)
+    # DOYs with the same sample count share every resample's order-statistic positions
+    groups = [(rows, ordered[rows], below[:, c])
+              for c in np.unique(present[present > 0]) for rows in [np.flatnonzero(present == c)]]
+    boots = np.arange(n_boot)
+
+    def resample_quantile(q: float) -> np.ndarray:
+        out = np.full((n_days, n_boot), np.nan)
+        for rows, sub, drawn in groups:
+            n = np.maximum(drawn, 1)
+            virtual = q * (n - 1)
+            lo = np.floor(virtual).astype(np.int64)
+            hi = np.minimum(lo + 1, n - 1)
+            value = _lerp(sub[:, ranks[boots, lo]], sub[:, ranks[boots, hi]], virtual - lo)
+            out[rows] = np.where(drawn > 0, value, np.nan)
+        return out
+
+    percentiles = {name: band(resample_quantile(q)) for name, q in PERCENTILES.items()}
+    return {'level': level, 'n_boot': n_boot, 'probabilities': probabilities, 'percentiles': percentiles}
+
+
+def doy_records(arrays: Dict, variable: str) -> Dict[int, Dict]:
+    """Convert doy_stats_arrays output into the per-DOY dict layout written to daily_stats.json."""
+    results: Dict[int, Dict] = {}
+    pct = arrays['percentiles']
+    probs = arrays['probabilities']
+    trend = arrays['trend']
+    years = arrays['years']
+    boot = arrays.get('bootstrap')
+    for i in np.flatnonzero(arrays['count'] > 0):
         stats_dict = {
-            'day_of_year': doy,
+            'day_of_year': int(i + 1),
             'variable': variable,
-            'sample_size': int(sel.shape[0]),
-            'mean': float(sel.mean()),
-            'median': float(sel.median()),
-            'std': float(sel.std(ddof=1)) if sel.shape[0] > 1 else 0.0,
-            'min': float(sel.min()),
-            'max': float(sel.max()),
-            'percentiles': {
-                'p25': float(sel.quantile(0.25)),
-                'p50': float(sel.quantile(0.50)),
-                'p75': float(sel.quantile(0.75)),
-                'p90': float(sel.quantile(0.90)),
-                'p95': float(sel.quantile(0.95)),
-            },
+            'sample_size': int(arrays['count'][i]),
+            'mean': float(arrays['mean'][i]),
+            'median': float(arrays['median'][i]),
+            'std': float(arrays['std'][i]),
+            'min': float(arrays['min'][i]),
+            'max': float(arrays['max'][i]),
+            'percentiles': {name: float(v[i]) for name, v in pct.items()},
+            'probabilities': {name: float(v[i]) for name, v in probs.items()},
         }
-        # Extreme event probabilities
-        probs = {}
-        for th_name, th_val in thresholds.items():
-            if 'above' in th_name:
-                prob = float((sel > th_val).mean())
-            else:
-                prob = float((sel < th_val).mean())
-            probs[th_name] = 0.0 if np.isnan(prob) else float(prob)
-        stats_dict['probabilities'] = probs
-
-        # Yearly means for this DOY
-        yearly = work[work['day_of_year'] == doy].groupby('year')[variable].mean().dropna()
+        if boot is not None:
+            stats_dict['confidence_intervals'] = {
+                'level': boot['level'],
+                'probabilities': {name: [float(lo[i]), float(hi[i])] for name, (lo, hi) in boot['probabilities'].items()},
+                'percentiles': {name: [float(lo[i]), float(hi[i])] for name, (lo, hi) in boot['percentiles'].items()},
+            }
+        row = arrays['yearly'][i]
+        present = ~np.isnan(row)
         stats_dict['yearly_values'] = [
-            {'year': int(y), 'value': float(v)} for y, v in yearly.items()
+            {'year': int(y), 'value': float(v)} for y, v in zip(years[present], row[present])
         ]
-        if yearly.shape[0] >= 4:
-            years = yearly.index.values.astype(float)
-            values = yearly.values.astype(float)
-            slope, intercept, r_value, p_value, std_err = stats.linregress(years, values)
+        if trend['valid'][i]:
+            p_value = float(trend['p_value'][i])
             stats_dict['trend'] = {
-                'slope': float(slope),
-                'p_value': float(p_value),
-                'r_squared': float(r_value ** 2),
+                'slope': float(trend['slope'][i]),
+                'p_value': p_value,
+                'r_squared': float(trend['r_squared'][i]),
                 'significant': bool(p_value < 0.05),
             }
-        results[doy] = stats_dict
-
+        results[int(i + 1)] = stats_dict
     return results
 
 
-def build_daily_json(city_key: str, daily_df: pd.DataFrame) -> Dict:
+def calculate_day_of_year_stats(df: pd.DataFrame, variable: str, thresholds: Dict[str, float],
+                                window: int = 0, bootstrap: int = 0, seed: int = BOOTSTRAP_SEED) -> Dict:
+    """
+    Calculate statistics and probabilities by day-of-year for a given variable.
+    df is expected to have a DatetimeIndex named 'date'.
+    window > 0 pools each DOY with its +/- window neighbouring days (see window_doy_stats_arrays).
+    bootstrap > 0 adds 95% confidence_intervals from that many year resamples (see bootstrap_intervals).
+    """
+    if window > 0:
+        if bootstrap > 0:
+            raise ValueError('bootstrap intervals are only available for unsmoothed (window=0) stats')
+        return doy_records(window_doy_stats_arrays(df, variable, thresholds, window), variable)
+    arrays = doy_stats_arrays(df, variable, thresholds)
+    if bootstrap > 0:
+        arrays['bootstrap'] = bootstrap_intervals(arrays['yearly'], thresholds, bootstrap, seed)
+    return doy_records(arrays, variable)
+
+
+def build_doy_samples(daily_df: pd.DataFrame) -> Dict[str, DoySamples]:
+    """Sorted per-DOY samples of every THRESHOLDS variable, persisted for arbitrary-threshold queries (doy_query)."""
+    samples = {}
+    for variable in THRESHOLDS:
+        if variable in daily_df.columns:
+            values, doy, _ = doy_samples(daily_df, variable)
+            matrix, counts = grouped_sample_matrix(doy - 1, values, 366)
+            samples[variable] = DoySamples.from_matrix(matrix, counts)
+    return samples
+
+
+def build_daily_json(city_key: str, daily_df: pd.DataFrame, precomputed: Optional[Dict[str, Dict]] = None,
+                     compact: bool = False, **stats_options) -> Dict:
+    """
+    Assemble daily_stats.json; precomputed maps variable -> calculate_day_of_year_stats() result (e.g. from workers).
+    With compact=True per-DOY yearly_values are moved into a packed year x DOY matrix (see pack_yearly_values),
+    which write_daily_json stores as a separate binary file next to a summary-only JSON.
+    stats_options (window, bootstrap, seed) are passed to calculate_day_of_year_stats; a smoothing
+    window is recorded under 'smoothing'.
+    """
     period = {
         'start': daily_df.index.min().date().isoformat() if not daily_df.empty else None,
         'end': daily_df.index.max().date().isoformat() if not daily_df.empty else None,
@@ -157,79 +477,166 @@ def build_daily_json(city_key: str, daily_df: pd.DataFrame) -> Dict:
         'nasa_source': NASA_ATTRIBUTION,
         'variables': {},
     }
+    if stats_options.get('window', 0) > 0:
+        city_stats['smoothing'] = {'method': 'circular_doy_window', 'window_days': stats_options['window']}
     # Populate available variables with computed stats
     for variable, thresholds in THRESHOLDS.items():
-        if variable in daily_df.columns:
-            city_stats['variables'][variable] = calculate_day_of_year_stats(daily_df, variable, thresholds)
+        if precomputed is not None and variable in precomputed:
+            city_stats['variables'][variable] = precomputed[variable]
+        elif variable in daily_df.columns:
+            city_stats['variables'][variable] = calculate_day_of_year_stats(daily_df, variable, thresholds, **stats_options)
     # Ensure core schema keys exist even if data unavailable, to avoid single-variable JSONs
     for variable in THRESHOLDS.keys():
         if variable not in city_stats['variables']:
             city_stats['variables'][variable] = {}
+    if compact:
+        pack_yearly_values(city_stats)
     return city_stats
 
 
-def build_hourly_json(city_key: str, hourly_df: pd.DataFrame) -> Dict:
-    if hourly_df is None or hourly_df.empty:
-        return {
-            'location': city_key,
-            'coordinates': LOCATIONS[city_key],
-            'data_period': {
-                'start': None,
-                'end': None,
-                'years': 0,
-                'note': 'No hourly data available',
-            },
-            'hourly_patterns': {},
-            'diurnal_patterns': {},
-            'nasa_source': NASA_ATTRIBUTION,
-        }
+def pack_yearly_values(city_stats: Dict) -> Dict:
+    """
+    Strip yearly_values from every DOY record (in place) and attach them as one float32 matrix of shape
+    (n_variables, n_years, 366) under city_stats['yearly_values'], NaN where a (year, DOY) is missing.
+    """
+    years = sorted({yv['year'] for day_map in city_stats['variables'].values()
+                    for rec in day_map.values() for yv in rec.get('yearly_values', [])})
+    year_pos = {y: i for i, y in enumerate(years)}
+    packed_vars = [var for var, day_map in city_stats['variables'].items() if day_map]
+    matrix = np.full((len(packed_vars), len(years), 366), np.nan, dtype=np.float32)
+    for v, var in enumerate(packed_vars):
+        for doy, rec in city_stats['variables'][var].items():
+            for yv in rec.pop('yearly_values', []):
+                matrix[v, year_pos[yv['year']], int(doy) - 1] = yv['value']
+    city_stats['yearly_values'] = {
+        'dtype': 'float32',
+        'byte_order': 'little',
+        'layout': 'variable x year x day_of_year',
+        'variables': packed_vars,
+        'years': years,
+        'matrix': matrix,
+    }
+    return city_stats
 
-    df = hourly_df.copy()
-    df = df.sort_index()
-    df['day_of_year'] = df.index.dayofyear
-    df['hour'] = df.index.hour
 
-    hourly_patterns = {}
+def write_daily_json(city_key: str, city_stats: Dict, processed_dir: str) -> List[str]:
+    """
+    Write daily stats as built by build_daily_json and return the written paths.
+    Full output is <city>_daily_stats.json (indent=2). Compact output is an unindented
+    <city>_daily_summary.json plus the packed <city>_daily_yearly.bin it references.
+    """
+    packed = city_stats.get('yearly_values')
+    if packed is None:
+        path = os.path.join(processed_dir, f'{city_key}_daily_stats.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(city_stats, f, indent=2)
+        return [path]
+
+    bin_name = f'{city_key}_daily_yearly.bin'
+    bin_path = os.path.join(processed_dir, bin_name)
+    packed['matrix'].astype('<f4').tofile(bin_path)
+    header = {k: v for k, v in packed.items() if k != 'matrix'}
+    header['file'] = bin_name
+    header['shape'] = list(packed['matrix'].shape)
+    summary = {**city_stats, 'format': 'compact', 'yearly_values': header}
+    path = os.path.join(processed_dir, f'{city_key}_daily_summary.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, separators=(',', ':'))
+    return [path, bin_path]
+
+
+def hourly_stats_arrays(hourly_df: pd.DataFrame, variable: str, thresholds: Dict[str, float]) -> Dict:
+    """
+    Grouped (DOY, hour) statistics for one hourly variable as arrays indexed by (DOY-1)*24 + hour.
+    One sort of the column replaces the 366 x 24 boolean filters.
+    """
+    values = widen(hourly_df[variable].to_numpy())
+    present = ~np.isnan(values)
+    matrix, counts = grouped_sample_matrix(doy_hour_keys(hourly_df.index)[present], values[present], 366 * 24)
+    return matrix_stats(matrix, counts, thresholds)
+
+
+def hourly_records(arrays: Dict, thresholds: Dict[str, float], extra: Dict[str, float]) -> Dict[str, Dict]:
+    """Convert hourly_stats_arrays output into the day_of_year_N -> hour_H layout of hourly_stats.json."""
+    count = arrays['count']
+    mean = arrays['mean'].tolist()
+    pct = {name: v.tolist() for name, v in arrays['percentiles'].items()}
+    probs = {name: arrays['probabilities'][name].tolist() for name in thresholds}
+    extra_probs = {name: arrays['probabilities'][name].tolist() for name in extra}
+
+    var_map: Dict[str, Dict] = {}
+    for key in np.flatnonzero(count > 0).tolist():
+        doy, h = divmod(key, 24)
+        entry = {'mean': mean[key]}
+        for name, v in extra_probs.items():
+            entry[name] = v[key]
+        entry['percentiles'] = {name: v[key] for name, v in pct.items()}
+        entry['probabilities'] = {name: v[key] for name, v in probs.items()}
+        var_map.setdefault(f'day_of_year_{doy + 1}', {})[f'hour_{h}'] = entry
+    return var_map
+
+
+def hourly_thresholds(var: str) -> Dict[str, float]:
+    """Every threshold hourly stats are computed for: the daily THRESHOLDS plus the hourly-only extras."""
+    return {**THRESHOLDS.get(var, {}), **HOURLY_EXTRA_THRESHOLDS.get(var, {})}
+
+
+def hourly_variable_stats(hourly_df: pd.DataFrame, var: str) -> Tuple[Dict, Optional[Dict]]:
+    """Hourly patterns and diurnal summary (None when the column is empty) for one hourly variable."""
+    return hourly_stats_from_arrays(hourly_stats_arrays(hourly_df, var, hourly_thresholds(var)), var)
+
+
+def hourly_stats_from_arrays(arrays: Dict, var: str) -> Tuple[Dict, Optional[Dict]]:
+    """hourly_variable_stats from precomputed (DOY, hour) arrays, e.g. from hourly_chunked accumulators."""
+    thresholds = dict(THRESHOLDS.get(var, {}))
+    extra = HOURLY_EXTRA_THRESHOLDS.get(var, {})
+    patterns = hourly_records(arrays, thresholds, extra)
+
+    # Hour-of-day means pooled over all days from the same grouped sums
+    sums = (arrays['mean'] * arrays['count']).reshape(366, 24).sum(axis=0)
+    counts = arrays['count'].reshape(366, 24).sum(axis=0)
+    if counts.sum() == 0:
+        return patterns, None
+    with np.errstate(invalid='ignore', divide='ignore'):
+        by_hour = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    diurnal = {
+        'peak_hour': int(np.nanargmax(by_hour)),
+        'lowest_hour': int(np.nanargmin(by_hour)),
+        'hourly_mean': [None if np.isnan(v) else float(v) for v in by_hour],
+    }
+    if var == 'T2M':
+        diurnal = {
+            'summary': 'Peak temperatures typically occur between 14:00-16:00 local time',
+            'hottest_hour': diurnal['peak_hour'],
+            'coldest_hour': diurnal['lowest_hour'],
+            **diurnal,
+        }
+    return patterns, diurnal
 
-    # Example: precipitation hourly probabilities above 1 mm
-    if 'PRECTOTCORR' in df.columns:
-        var = 'PRECTOTCORR'
-        var_map = {}
-        for doy in range(1, 367):
-            day_sel = df[df['day_of_year'] == doy]
-            if day_sel.empty:
-                continue
-            hour_map = {}
-            for h in range(24):
-                hs = day_sel[day_sel['hour'] == h][var].dropna()
-                if hs.empty:
-                    continue
-                hour_map[f'hour_{h}'] = {
-                    'mean': float(hs.mean()),
-                    'probability_above_1mm': float((hs > 1.0).mean()),
-                }
-            if hour_map:
-                var_map[f'day_of_year_{doy}'] = hour_map
-        hourly_patterns[var] = var_map
-
-    # Simple diurnal pattern for temperature
-    diurnal_patterns = {}
-    if 'T2M' in df.columns:
-        temp_by_hour = df.groupby('hour')['T2M'].mean().dropna()
-        if not temp_by_hour.empty:
-            diurnal_patterns['T2M'] = {
-                'summary': 'Peak temperatures typically occur between 14:00-16:00 local time',
-                'hottest_hour': int(temp_by_hour.idxmax()),
-                'coldest_hour': int(temp_by_hour.idxmin()),
-            }
 
-    period = {
-        'start': df.index.min().date().isoformat(),
-        'end': df.index.max().date().isoformat(),
-        'years': int(df.index.year.nunique()),
+def hourly_period(start: Optional[pd.Timestamp], end: Optional[pd.Timestamp], years: int) -> Dict:
+    if start is None:
+        return {'start': None, 'end': None, 'years': 0, 'note': 'No hourly data available'}
+    return {
+        'start': start.date().isoformat(),
+        'end': end.date().isoformat(),
+        'years': years,
         'note': 'Hourly data limited to recent years due to data volume',
     }
 
+
+def hourly_document(city_key: str, period: Dict, precomputed: Dict[str, Tuple[Dict, Optional[Dict]]]) -> Dict:
+    """The hourly_stats.json layout from per-variable hourly_variable_stats() results, in HOURLY_VARIABLES order."""
+    hourly_patterns = {}
+    diurnal_patterns = {}
+    for var in HOURLY_VARIABLES:
+        if var not in precomputed:
+            continue
+        patterns, diurnal = precomputed[var]
+        hourly_patterns[var] = patterns
+        if diurnal is not None:
+            diurnal_patterns[var] = diurnal
+
     return {
         'location': city_key,
         'coordinates': LOCATIONS[city_key],
@@ -240,6 +647,21 @@ def build_hourly_json(city_key: str, hourly_df: pd.DataFrame) -> Dict:
     }
 
 
+def build_hourly_json(city_key: str, hourly_df: pd.DataFrame,
+                      precomputed: Optional[Dict[str, Tuple[Dict, Optional[Dict]]]] = None) -> Dict:
+    """Assemble hourly_stats.json; precomputed maps variable -> hourly_variable_stats() result (e.g. from workers)."""
+    if hourly_df is None or hourly_df.empty:
+        return hourly_document(city_key, hourly_period(None, None, 0), {})
+
+    df = hourly_df
+    results = dict(precomputed or {})
+    for var in HOURLY_VARIABLES:
+        if var not in results and var in df.columns:
+            results[var] = hourly_variable_stats(df, var)
+    period = hourly_period(df.index.min(), df.index.max(), int(df.index.year.nunique()))
+    return hourly_document(city_key, period, results)
+
+
 def summarize_city(daily_df: pd.DataFrame, city_key: str) -> Dict:
     # Basic climate summary from daily data
     summary = {
@@ -255,6 +677,10 @@ def summarize_city(daily_df: pd.DataFrame, city_key: str) -> Dict:
     }
     if daily_df is None or daily_df.empty:
         return summary
+    # float64 columns for the pandas aggregations below (exact even for compact float32 frames)
+    daily_df = pd.DataFrame({col: widen(daily_df[col].to_numpy())
+                             for col in ('PRECTOTCORR', 'T2M', 'T2M_MAX', 'WS10M_MAX') if col in daily_df.columns},
+                            index=daily_df.index)
 
     # Annual precipitation (approx)
     if 'PRECTOTCORR' in daily_df.columns:
@@ -295,31 +721,240 @@ def summarize_city(daily_df: pd.DataFrame, city_key: str) -> Dict:
     return summary
 
 
-if __name__ == '__main__':
+def load_raw_frames(city_key: str, qc: str = 'off', hourly: bool = True,
+                    qc_reports: Optional[Dict[str, Dict]] = None,
+                    memory_efficient: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Daily and hourly raw frames from the binary raw store, falling back to the CSV exports.
+    qc='mask' runs raw_qc (fill values, impossible values and gaps become NaN, report written);
+    qc='fill' also interpolates short gaps. hourly=False skips the hourly frame (returned empty);
+    qc_reports are reports of resolutions QC'd elsewhere to include in the saved QC report.
+    memory_efficient=True returns compact frames (float32 columns where lossless, see memory_budget).
+    """
+    daily_df = load_raw_frame(city_key, 'daily')
+    hourly_df = load_raw_frame(city_key, 'hourly') if hourly else pd.DataFrame()
+    if qc != 'off':
+        frames = {'daily': daily_df, 'hourly': hourly_df} if hourly else {'daily': daily_df}
+        clean = qc_location(city_key, frames, fill=qc == 'fill', reports=qc_reports)
+        daily_df, hourly_df = clean['daily'], clean.get('hourly', hourly_df)
+    if memory_efficient:
+        daily_df, hourly_df = compact_frame(daily_df), compact_frame(hourly_df)
+    return daily_df, hourly_df
+
+
+def load_city(city_key: str, qc: str = 'off', hourly_memory: Optional[int] = None,
+              memory_efficient: bool = False,
+              max_memory: Optional[int] = None) -> Tuple[pd.DataFrame, Optional[pd.DataFrame], Optional[Dict]]:
+    """
+    (daily_df, hourly_df, hourly_json). With hourly_memory (bytes) the hourly stats are built out of core
+    by hourly_chunked within that budget: hourly_df is None and hourly_json is ready. Otherwise
+    hourly_json is None and the hourly frame is loaded whole (compact with memory_efficient). max_memory
+    (bytes) switches to the out-of-core path, with that budget, when the estimated in-memory peak of the
+    hourly frame does not fit.
+    """
+    if hourly_memory is None and max_memory is not None:
+        from hourly_chunked import hourly_fits_in_memory
+
+        if not hourly_fits_in_memory(city_key, max_memory, qc, memory_efficient):
+            hourly_memory = max_memory
+    if hourly_memory is None:
+        daily_df, hourly_df = load_raw_frames(city_key, qc, memory_efficient=memory_efficient)
+        return daily_df, hourly_df, None
+    from hourly_chunked import build_hourly_json_chunked
+
+    hourly_json, hourly_qc = build_hourly_json_chunked(city_key, hourly_memory, qc)
+    daily_df, _ = load_raw_frames(city_key, qc, hourly=False, qc_reports={'hourly': hourly_qc} if hourly_qc else None,
+                                  memory_efficient=memory_efficient)
+    return daily_df, None, hourly_json
+
+
+# ----------------------------------------------
+# Parallel execution: (city, variable) work units on a process pool
+# ----------------------------------------------
+
+def column_payload(df: pd.DataFrame, variable: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Non-null (datetime64 index, values) arrays of one column; all a worker task receives. Compact
+    columns stay float32, halving what is pickled to the worker.
+    """
+    col = df[variable].dropna()
+    return col.index.to_numpy(), col.to_numpy()
+
+
+def _column_frame(variable: str, index: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({variable: values}, index=pd.DatetimeIndex(index))
+
+
+def _daily_task(variable: str, index: np.ndarray, values: np.ndarray, stats_options: Dict) -> Dict:
+    frame = _column_frame(variable, index, values)
+    return calculate_day_of_year_stats(frame, variable, THRESHOLDS[variable], **stats_options)
+
+
+def _hourly_task(variable: str, index: np.ndarray, values: np.ndarray) -> Tuple[Dict, Optional[Dict]]:
+    return hourly_variable_stats(_column_frame(variable, index, values), variable)
+
+
+def process_cities(city_keys: List[str], workers: int = 1, incremental: bool = False,
+                   compact: bool = False, stats_options: Optional[Dict] = None,
+                   qc: str = 'off', hourly_memory: Optional[int] = None, memory_efficient: bool = False,
+                   max_memory: Optional[int] = None,
+                   tracker: Optional[StageMemory] = None) -> Iterator[Tuple[str, Dict, Dict, Dict, Dict[str, DoySamples]]]:
+    """
+    Yield (city_key, daily_json, hourly_json, summary, doy_samples) in city_keys order.
+    With workers > 1 each (city, variable) daily and hourly build runs on a process pool; only a few
+    cities are loaded ahead of the one being assembled so memory stays bounded for long city lists.
+    With incremental=True daily stats come from the persisted accumulators in incremental_stats,
+    folding in only rows newer than the stored watermark (window smoothing is not supported there).
+    stats_options (window, bootstrap, seed) are forwarded to calculate_day_of_year_stats; qc selects
+    the raw_qc mode applied as each city is loaded (see load_raw_frames). With hourly_memory (bytes)
+    hourly stats are streamed out of core within that budget; memory_efficient loads compact frames and
+    max_memory picks the out-of-core path per city when needed (see load_city). tracker records wall
+    time and peak RSS of the load, daily, hourly and summary stages of every city.
+    """
+    stats_options = stats_options or {}
+    tracker = tracker or StageMemory(enabled=False)
+
+    def load(city_key: str):
+        with tracker.stage('load', city=city_key):
+            return load_city(city_key, qc, hourly_memory, memory_efficient, max_memory)
+
+    def finish(city_key: str, daily_df: pd.DataFrame) -> Tuple[Dict, Dict[str, DoySamples]]:
+        with tracker.stage('summary', city=city_key):
+            return summarize_city(daily_df, city_key), build_doy_samples(daily_df)
+
+    if incremental:
+        if stats_options.get('window', 0) > 0:
+            raise ValueError('incremental mode does not support window smoothing')
+        from incremental_stats import update_location_state
+
+        for city_key in city_keys:
+            daily_df, hourly_df, hourly_json = load(city_key)
+            with tracker.stage('daily', city=city_key):
+                precomputed = update_location_state(city_key, daily_df, bootstrap=stats_options.get('bootstrap', 0),
+                                                    seed=stats_options.get('seed', BOOTSTRAP_SEED))
+                daily_json = build_daily_json(city_key, daily_df, precomputed, compact)
+            with tracker.stage('hourly', city=city_key):
+                hourly_json = hourly_json or build_hourly_json(city_key, hourly_df)
+            del hourly_df
+            yield (city_key, daily_json, hourly_json, *finish(city_key, daily_df))
+        return
+
+    if workers <= 1:
+        for city_key in city_keys:
+            daily_df, hourly_df, hourly_json = load(city_key)
+            with tracker.stage('daily', city=city_key):
+                daily_json = build_daily_json(city_key, daily_df, compact=compact, **stats_options)
+            with tracker.stage('hourly', city=city_key):
+                hourly_json = hourly_json or build_hourly_json(city_key, hourly_df)
+            del hourly_df
+            yield (city_key, daily_json, hourly_json, *finish(city_key, daily_df))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque = deque()
+
+        def submit(city_key: str):
+            daily_df, hourly_df, hourly_json = load(city_key)
+            daily_futures = {
+                var: pool.submit(_daily_task, var, *column_payload(daily_df, var), stats_options)
+                for var in THRESHOLDS if var in daily_df.columns
+            }
+            hourly_futures = {} if hourly_df is None else {
+                var: pool.submit(_hourly_task, var, *column_payload(hourly_df, var))
+                for var in HOURLY_VARIABLES if var in hourly_df.columns
+            }
+            pending.append((city_key, daily_df, hourly_df, hourly_json, daily_futures, hourly_futures))
+
+        remaining = iter(city_keys)
+        for city_key in islice(remaining, max(2, workers // 8)):
+            submit(city_key)
+        while pending:
+            city_key, daily_df, hourly_df, hourly_json, daily_futures, hourly_futures = pending.popleft()
+            with tracker.stage('daily', city=city_key):
+                daily_futures = {v: f.result() for v, f in daily_futures.items()}
+                daily_json = build_daily_json(city_key, daily_df, daily_futures, compact, **stats_options)
+            with tracker.stage('hourly', city=city_key):
+                if hourly_json is None:
+                    hourly_json = build_hourly_json(city_key, hourly_df, {v: f.result() for v, f in hourly_futures.items()})
+            del hourly_df
+            yield (city_key, daily_json, hourly_json, *finish(city_key, daily_df))
+            next_city = next(remaining, None)
+            if next_city is not None:
+                submit(next_city)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Preprocess raw NASA POWER data into probability JSON files.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Process-pool size for (city, variable) work units; 1 runs serially')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Fold only new daily rows into the persisted per-DOY state under data/state')
+    parser.add_argument('--output-format', choices=['full', 'compact', 'both'], default='full',
+                        help='full: <city>_daily_stats.json; compact: unindented <city>_daily_summary.json '
+                             'plus packed <city>_daily_yearly.bin; both: write all files')
+    parser.add_argument('--window-days', type=int, default=0,
+                        help='Smooth daily stats by pooling each DOY with its +/- N neighbouring days (e.g. 15)')
+    parser.add_argument('--bootstrap', type=int, default=0,
+                        help='Add 95%% confidence intervals from N year resamples (e.g. 1000) to every '
+                             'probability and percentile')
+    parser.add_argument('--bootstrap-seed', type=int, default=BOOTSTRAP_SEED)
+    parser.add_argument('--qc', choices=['off', 'mask', 'fill'], default='mask',
+                        help='Raw-data QC before the stats: mask drops fill values (-999), impossible values and '
+                             'inconsistent rows; fill also interpolates short gaps; reports go to '
+                             'data/processed/<city>_qc_report.json')
+    parser.add_argument('--hourly-out-of-core', action='store_true',
+                        help='Stream hourly raw data in bounded chunks into mergeable per-(DOY, hour) accumulators '
+                             'instead of loading it whole (identical hourly_stats.json and QC report, for every --qc mode)')
+    parser.add_argument('--hourly-memory-mb', type=float, default=256.0,
+                        help='Memory ceiling for --hourly-out-of-core accumulators and chunks')
+    parser.add_argument('--memory-efficient', action='store_true',
+                        help='Hold raw frames as float32 wherever that is lossless (identical outputs) and use '
+                             'int16/int8 calendar keys')
+    parser.add_argument('--max-memory', type=parse_memory, default=None,
+                        help='Memory budget, e.g. 512M or 2G: cities whose hourly frame would not fit are '
+                             'processed out of core within it (see --hourly-out-of-core)')
+    parser.add_argument('--memory-report', nargs='?', const='', default=None, metavar='PATH',
+                        help='Print wall time and peak RSS per stage and save them as JSON '
+                             '(default data/benchmarks/memory_preprocess_<ts>.json)')
+    args = parser.parse_args(argv)
+    if args.window_days < 0:
+        parser.error('--window-days must be >= 0')
+    if args.window_days > 182:
+        parser.error('--window-days must be at most 182 (half a year on each side)')
+    if args.incremental and args.window_days > 0:
+        parser.error('--window-days cannot be combined with --incremental')
+    if args.bootstrap > 0 and args.window_days > 0:
+        parser.error('--bootstrap is only available without --window-days')
+    stats_options = {'window': args.window_days, 'bootstrap': args.bootstrap, 'seed': args.bootstrap_seed}
+
     processed_dir = os.path.join('data', 'processed')
 
     all_locations = []
 
-    for city_key in ['tbilisi', 'batumi', 'kutaisi']:
-        print(f'Processing {city_key} ...')
-        daily_path = os.path.join('data', 'raw', f'{city_key}_daily_raw.csv')
-        hourly_path = os.path.join('data', 'raw', f'{city_key}_hourly_raw.csv')
+    tracker = StageMemory(enabled=args.memory_report is not None)
+    results = process_cities(list(LOCATIONS.keys()), workers=args.workers, incremental=args.incremental,
+                             compact=args.output_format == 'compact', stats_options=stats_options, qc=args.qc,
+                             hourly_memory=int(args.hourly_memory_mb * 1024 * 1024) if args.hourly_out_of_core else None,
+                             memory_efficient=args.memory_efficient, max_memory=args.max_memory, tracker=tracker)
+    for city_key, daily_json, hourly_json, summary, doy_samples in results:
+        print(f'Processed {city_key}')
 
-        daily_df = pd.read_csv(daily_path, index_col=0, parse_dates=True) if os.path.exists(daily_path) else pd.DataFrame()
-        hourly_df = pd.read_csv(hourly_path, index_col=0, parse_dates=True) if os.path.exists(hourly_path) else pd.DataFrame()
+        with tracker.stage('write', city=city_key):
+            # DAILY JSON
+            if args.output_format == 'both':
+                write_daily_json(city_key, daily_json, processed_dir)
+                daily_json = pack_yearly_values(copy.deepcopy(daily_json))
+            write_daily_json(city_key, daily_json, processed_dir)
 
-        # DAILY JSON
-        daily_json = build_daily_json(city_key, daily_df)
-        with open(os.path.join(processed_dir, f'{city_key}_daily_stats.json'), 'w', encoding='utf-8') as f:
-            json.dump(daily_json, f, indent=2)
+            # HOURLY JSON
+            with open(os.path.join(processed_dir, f'{city_key}_hourly_stats.json'), 'w', encoding='utf-8') as f:
+                json.dump(hourly_json, f, indent=2)
 
-        # HOURLY JSON
-        hourly_json = build_hourly_json(city_key, hourly_df)
-        with open(os.path.join(processed_dir, f'{city_key}_hourly_stats.json'), 'w', encoding='utf-8') as f:
-            json.dump(hourly_json, f, indent=2)
+            # Sorted per-DOY samples for arbitrary-threshold queries (doy_query.py)
+            save_doy_samples(city_key, doy_samples, processed_dir)
 
         # Summary contribution
-        all_locations.append(summarize_city(daily_df, city_key))
+        all_locations.append(summary)
 
     demo_summary = {
         'generated_at': datetime.now(timezone.utc).isoformat(),
@@ -338,3 +973,13 @@ if __name__ == '__main__':
         json.dump(demo_summary, f, indent=2)
 
     print('Processing complete.')
+    if tracker.enabled:
+        print(tracker.format())
+        config = {'workers': args.workers, 'qc': args.qc, 'memory_efficient': args.memory_efficient,
+                  'max_memory': args.max_memory, 'hourly_out_of_core': args.hourly_out_of_core}
+        print(f"Wrote {tracker.save('preprocess', args.memory_report or None, **config)}")
+
+
+if __name__ == '__main__':
+    main()
+
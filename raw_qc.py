@@ -0,0 +1,309 @@
+import os
+import json
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from location_registry import load_locations
+from memory_budget import VALUE_DTYPE, compact_column, widen
+from raw_store import RESOLUTIONS, load_raw_frame
+
+# Quality control for raw NASA POWER frames, run between download and preprocessing.
+#
+# Every check works on whole columns at once: the frame is reindexed onto its regular daily/hourly
+# grid (absent timestamps become gaps), then each column is tested with array comparisons and gap
+# runs are found from the edges of the invalid mask. Results are:
+#   clean frame  invalid values set to NaN; with fill=True, interior gaps of at most max_gap steps
+#                are linearly interpolated (never precipitation, where interpolation invents rain)
+#   mask         uint8 frame of QC_* bit flags with the clean frame's index and columns
+#   report       per-variable counts of each flag, gap runs, longest gap and valid fraction
+#
+# Reports go to data/processed/<city>_qc_report.json, masks to data/state/qc/<city>_<resolution>_mask.npz.
+
+QC_DIR = os.path.join('data', 'state', 'qc')
+PROCESSED_DIR = os.path.join('data', 'processed')
+
+FILL_VALUE = -999.0  # NASA POWER marks missing data with -999
+FREQ = {'daily': 'D', 'hourly': 'h'}
+MAX_GAP = {'daily': 2, 'hourly': 3}  # longest gap (in steps) that fill=True interpolates
+NO_INTERPOLATE = {'PRECTOTCORR'}
+
+# Bit flags of the QC mask
+QC_FILL = 1           # NASA POWER fill value
+QC_RANGE = 2          # physically impossible value
+QC_INCONSISTENT = 4   # contradicts another column (T2M_MIN above T2M_MAX)
+QC_MISSING = 8        # NaN or absent timestamp, including the cases above
+QC_INTERPOLATED = 16  # missing value replaced by interpolation
+
+# Physically possible ranges (not climatological ones); units as downloaded
+PHYSICAL_LIMITS: Dict[str, Tuple[float, float]] = {
+    'T2M': (-90.0, 60.0),
+    'T2M_MAX': (-90.0, 60.0),
+    'T2M_MIN': (-90.0, 60.0),
+    'PRECTOTCORR': (0.0, 2000.0),
+    'WS2M': (0.0, 110.0),
+    'WS10M': (0.0, 110.0),
+    'WS10M_MAX': (0.0, 110.0),
+    'RH2M': (0.0, 100.0),
+    'PS': (30.0, 110.0),             # kPa
+    'QV2M': (0.0, 40.0),             # g/kg
+    'ALLSKY_SFC_SW_DWN': (0.0, 15.0),  # kWh/m^2/day
+}
+HOURLY_LIMITS: Dict[str, Tuple[float, float]] = {
+    'ALLSKY_SFC_SW_DWN': (0.0, 1500.0),  # W/m^2
+}
+
+
+# ----------------------------------------------
+# Column-wise checks
+# ----------------------------------------------
+
+def gap_runs(invalid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start (inclusive) and end (exclusive) positions of each run of True in a boolean array."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], invalid.view(np.int8), [0]))))
+    return edges[::2], edges[1::2]
+
+
+def short_gap_mask(invalid: np.ndarray, max_gap: int) -> np.ndarray:
+    """True inside runs of at most max_gap invalid steps that have valid values on both sides."""
+    starts, ends = gap_runs(invalid)
+    keep = (ends - starts <= max_gap) & (starts > 0) & (ends < invalid.size)
+    marks = np.zeros(invalid.size + 1, dtype=np.int32)
+    marks[starts[keep]] += 1
+    marks[ends[keep]] -= 1
+    return np.cumsum(marks[:-1]) > 0
+
+
+def regular_grid(df: pd.DataFrame, resolution: str) -> Tuple[pd.DataFrame, int]:
+    """Sorted, de-duplicated frame reindexed onto its complete daily/hourly grid, and the duplicates dropped."""
+    duplicated = df.index.duplicated(keep='last')
+    df = df[~duplicated].sort_index()
+    grid = pd.date_range(df.index[0], df.index[-1], freq=FREQ[resolution], name=df.index.name)
+    if len(grid) == len(df) and grid.equals(df.index):
+        return df, int(duplicated.sum())
+    return df.reindex(grid), int(duplicated.sum())
+
+
+def variable_report(flags: np.ndarray, carried: int = 0) -> Tuple[Dict, int]:
+    """
+    Report entry of one column from its QC_* flags, and the length of the gap run still open at its end.
+    carried is the open run of the preceding piece of the series, which a leading gap continues.
+    """
+    invalid = (flags & QC_MISSING) != 0
+    starts, ends = gap_runs(invalid)
+    lengths = ends - starts
+    joined = bool(carried and starts.size and starts[0] == 0)
+    if joined:
+        lengths[0] += carried
+    missing = int(invalid.sum())
+    interpolated = int(np.count_nonzero(flags & QC_INTERPOLATED))
+    entry = {
+        'fill_values': int(np.count_nonzero(flags & QC_FILL)),
+        'out_of_range': int(np.count_nonzero(flags & QC_RANGE)),
+        'inconsistent': int(np.count_nonzero(flags & QC_INCONSISTENT)),
+        'missing': missing,
+        'gap_runs': int(starts.size) - joined,
+        'longest_gap': int(lengths.max()) if lengths.size else 0,
+        'interpolated': interpolated,
+        'unfilled': missing - interpolated,
+        'valid_fraction': float(1.0 - invalid.mean()) if invalid.size else 0.0,
+    }
+    open_run = int(lengths[-1]) if starts.size and ends[-1] == invalid.size else 0
+    return entry, open_run
+
+
+def frame_report(resolution: str, index: pd.DatetimeIndex, rows_present: int, missing_rows: int, duplicates: int,
+                 fill: bool, max_gap: int, variables: Dict[str, Dict]) -> Dict:
+    return {
+        'resolution': resolution,
+        'start': str(index[0]),
+        'end': str(index[-1]),
+        'rows': len(index),
+        'rows_present': rows_present,
+        'missing_rows': missing_rows,
+        'duplicate_rows': duplicates,
+        'interpolation': {'enabled': fill, 'max_gap': max_gap, 'excluded': sorted(NO_INTERPOLATE)},
+        'variables': variables,
+    }
+
+
+def qc_frame(df: pd.DataFrame, resolution: str, fill: bool = False,
+             max_gap: Optional[int] = None) -> Tuple[pd.DataFrame, pd.DataFrame, Dict]:
+    """
+    QC one raw frame. Returns (clean frame, uint8 QC_* mask, report); see the module comment.
+    max_gap defaults to MAX_GAP[resolution] and only matters with fill=True.
+    """
+    if df.empty:
+        return df, pd.DataFrame(index=df.index, dtype=np.uint8), {'resolution': resolution, 'rows': 0, 'variables': {}}
+    max_gap = MAX_GAP[resolution] if max_gap is None else max_gap
+    present_rows = len(df)
+    grid_df, duplicates = regular_grid(df, resolution)
+    absent = ~grid_df.index.isin(df.index)
+    limits = dict(PHYSICAL_LIMITS, **(HOURLY_LIMITS if resolution == 'hourly' else {}))
+
+    values = {var: np.array(widen(grid_df[var].to_numpy()), dtype=np.float64) for var in grid_df.columns}
+    flags = {var: np.zeros(len(grid_df), dtype=np.uint8) for var in grid_df.columns}
+    for var, v in values.items():
+        flags[var][np.isclose(v, FILL_VALUE)] |= QC_FILL
+        lower, upper = limits.get(var, (-np.inf, np.inf))
+        with np.errstate(invalid='ignore'):
+            flags[var][((v < lower) | (v > upper)) & (flags[var] == 0)] |= QC_RANGE
+    if 'T2M_MAX' in values and 'T2M_MIN' in values:
+        ok = (flags['T2M_MAX'] == 0) & (flags['T2M_MIN'] == 0)
+        with np.errstate(invalid='ignore'):
+            swapped = ok & (values['T2M_MIN'] > values['T2M_MAX'])
+        flags['T2M_MAX'][swapped] |= QC_INCONSISTENT
+        flags['T2M_MIN'][swapped] |= QC_INCONSISTENT
+
+    steps = np.arange(len(grid_df), dtype=np.float64)
+    report_vars: Dict[str, Dict] = {}
+    for var, v in values.items():
+        f = flags[var]
+        invalid = (f != 0) | np.isnan(v) | absent
+        f[invalid] |= QC_MISSING
+        v[invalid] = np.nan
+        if fill and var not in NO_INTERPOLATE and invalid.any() and not invalid.all():
+            fillable = short_gap_mask(invalid, max_gap)
+            v[fillable] = np.interp(steps[fillable], steps[~invalid], v[~invalid])
+            f[fillable] |= QC_INTERPOLATED
+        report_vars[var], _ = variable_report(f)
+
+    # Compact (float32) input stays compact unless interpolated values need float64
+    clean = pd.DataFrame({var: compact_column(v) if grid_df[var].dtype == VALUE_DTYPE else v
+                          for var, v in values.items()}, index=grid_df.index)
+    mask = pd.DataFrame(flags, index=grid_df.index)
+    report = frame_report(resolution, grid_df.index, present_rows - duplicates, int(absent.sum()), duplicates,
+                          fill, max_gap, report_vars)
+    return clean, mask, report
+
+
+def qc_chunks(chunks: Iterable[pd.DataFrame], resolution: str, fill: bool = False, max_gap: Optional[int] = None,
+              reports: Optional[List[Dict]] = None) -> Iterator[pd.DataFrame]:
+    """
+    QC consecutive, time-ordered chunks of one series and yield the clean frame piece by piece, exactly as
+    qc_frame on the whole series would produce it. Each chunk is QC'd after the raw rows not yet emitted plus
+    max_gap + 1 steps of look-back, and the last max_gap + 1 steps are held for the next chunk, so gaps across
+    a chunk edge are interpolated (or not) with the same neighbours. The report of every piece goes to reports;
+    merge_qc_reports of them equals the whole-series report.
+    """
+    max_gap = MAX_GAP[resolution] if max_gap is None else max_gap
+    step = pd.Timedelta(1, unit=FREQ[resolution])
+    hold = (max_gap + 1) * step
+    tail: Optional[pd.DataFrame] = None
+    cut: Optional[pd.Timestamp] = None  # first timestamp not yet emitted
+    open_runs: Dict[str, int] = {}
+    chunks = iter(chunks)
+    chunk = next(chunks, None)
+    while chunk is not None:
+        following = next(chunks, None)
+        raw = chunk if tail is None else pd.concat([tail, chunk])
+        chunk = following
+        if raw.empty:
+            continue
+        clean, mask, _ = qc_frame(raw, resolution, fill, max_gap)
+        if cut is not None and cut < clean.index[0]:
+            # no raw rows since the last piece: the absent steps in between still belong to the series
+            grid = pd.date_range(cut, clean.index[-1], freq=FREQ[resolution], name=clean.index.name)
+            clean, mask = clean.reindex(grid), mask.reindex(grid, fill_value=QC_MISSING)
+        stop = clean.index[-1] if following is None else clean.index[-1] - hold
+        emit = clean.index <= stop if cut is None else (clean.index >= cut) & (clean.index <= stop)
+        if emit.any():
+            piece, piece_mask = clean[emit], mask[emit]
+            if reports is not None:
+                present = raw.index[(raw.index >= piece.index[0]) & (raw.index <= piece.index[-1])]
+                duplicates = int(present.duplicated().sum())
+                variables = {}
+                for var in piece_mask.columns:
+                    variables[var], open_runs[var] = variable_report(piece_mask[var].to_numpy(), open_runs.get(var, 0))
+                reports.append(frame_report(resolution, piece.index, len(present) - duplicates,
+                                            int((~piece.index.isin(present)).sum()), duplicates, fill, max_gap,
+                                            variables))
+            yield piece
+            cut = piece.index[-1] + step
+        tail = raw if cut is None else raw[raw.index >= cut - hold]
+
+
+def merge_qc_reports(reports: List[Dict]) -> Dict:
+    """
+    Combine the reports of consecutive pieces of one series (bounded-memory preprocessing). Counts add up;
+    with the reports of qc_chunks gap runs spanning a piece edge count once, as in the whole-series report.
+    """
+    reports = [r for r in reports if r.get('rows')]
+    if not reports:
+        return {'resolution': None, 'rows': 0, 'variables': {}}
+    merged = dict(reports[0], end=reports[-1]['end'], variables={})
+    for key in ('rows', 'rows_present', 'missing_rows', 'duplicate_rows'):
+        merged[key] = sum(r[key] for r in reports)
+    for report in reports:
+        for var, entry in report['variables'].items():
+            total = merged['variables'].setdefault(var, dict.fromkeys(entry, 0))
+            for key, value in entry.items():
+                total[key] = max(total[key], value) if key == 'longest_gap' else total[key] + value
+    for entry in merged['variables'].values():
+        entry['valid_fraction'] = 1.0 - entry['missing'] / merged['rows']
+    return merged
+
+
+# ----------------------------------------------
+# Persistence and the preprocessing hook
+# ----------------------------------------------
+
+def save_qc_mask(mask: pd.DataFrame, city_key: str, resolution: str, qc_dir: str = QC_DIR) -> str:
+    os.makedirs(qc_dir, exist_ok=True)
+    path = os.path.join(qc_dir, f'{city_key}_{resolution}_mask.npz')
+    np.savez_compressed(path, timestamp=mask.index.to_numpy(dtype='datetime64[ns]').view(np.int64),
+                        columns=np.array(mask.columns, dtype=str), flags=mask.to_numpy(dtype=np.uint8))
+    return path
+
+
+def load_qc_mask(city_key: str, resolution: str, qc_dir: str = QC_DIR) -> pd.DataFrame:
+    with np.load(os.path.join(qc_dir, f'{city_key}_{resolution}_mask.npz')) as data:
+        index = pd.DatetimeIndex(data['timestamp'].view('datetime64[ns]'))
+        return pd.DataFrame(data['flags'], index=index, columns=data['columns'].tolist())
+
+
+def save_qc_report(city_key: str, reports: Dict[str, Dict], processed_dir: str = PROCESSED_DIR) -> str:
+    os.makedirs(processed_dir, exist_ok=True)
+    path = os.path.join(processed_dir, f'{city_key}_qc_report.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'location': city_key, **reports}, f, indent=2)
+    return path
+
+
+def summarize_report(report: Dict) -> str:
+    totals = {k: sum(v[k] for v in report['variables'].values())
+              for k in ('fill_values', 'out_of_range', 'inconsistent', 'missing', 'interpolated')}
+    return (f"{report['resolution']}: {report.get('missing_rows', 0)} missing rows, {totals['fill_values']} fill, "
+            f"{totals['out_of_range']} out of range, {totals['inconsistent']} inconsistent, "
+            f"{totals['missing']} missing values ({totals['interpolated']} interpolated)")
+
+
+def qc_location(city_key: str, frames: Dict[str, pd.DataFrame], fill: bool = False,
+                max_gap: Optional[Dict[str, int]] = None, processed_dir: str = PROCESSED_DIR,
+                qc_dir: str = QC_DIR, reports: Optional[Dict[str, Dict]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    QC each resolution's frame of one location, persist report and masks, and return the clean frames.
+    reports holds resolutions already QC'd elsewhere (chunk by chunk) to include in the saved report.
+    """
+    clean, reports = {}, dict(reports or {})
+    for resolution, df in frames.items():
+        clean[resolution], mask, reports[resolution] = qc_frame(df, resolution, fill, (max_gap or {}).get(resolution))
+        if not mask.empty:
+            save_qc_mask(mask, city_key, resolution, qc_dir)
+        print(f'QC {city_key} {summarize_report(reports[resolution])}')
+    save_qc_report(city_key, {r: reports[r] for r in RESOLUTIONS if r in reports}, processed_dir)
+    return clean
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='QC raw NASA POWER data: fill values, impossible values and gaps.')
+    parser.add_argument('--fill', action='store_true', help='Interpolate interior gaps up to the max gap length')
+    parser.add_argument('--max-gap-days', type=int, default=MAX_GAP['daily'])
+    parser.add_argument('--max-gap-hours', type=int, default=MAX_GAP['hourly'])
+    args = parser.parse_args()
+
+    for city_key in load_locations():
+        frames = {resolution: load_raw_frame(city_key, resolution) for resolution in RESOLUTIONS}
+        qc_location(city_key, frames, args.fill, {'daily': args.max_gap_days, 'hourly': args.max_gap_hours})
@@ -0,0 +1,316 @@
+import os
+import json
+import shutil
+import argparse
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Columnar binary raw store shared by the download and preprocessing scripts.
+#
+# Layout: data/raw/<location>_<resolution>/
+#   meta.json          column names, dtypes, row count, index name
+#   timestamp.npy      int64 nanoseconds since the Unix epoch (naive UTC-less timestamps as downloaded)
+#   <VARIABLE>.npy     one typed float32/float64 array per variable
+#
+# Plain .npy files can be memory-mapped with np.load(mmap_mode='r'), so readers only touch the
+# columns they use and skip CSV text parsing and datetime inference entirely.
+#
+# Streamed hourly downloads use a partitioned variant, one store per calendar month:
+# data/raw/<location>_hourly_parts/<YYYY-MM>/ with the same files as above. Chunks are merged into
+# their month partitions as they arrive (later rows win on duplicate timestamps), so writers never
+# hold more than one chunk and readers can iterate months lazily.
+#
+# Stores are replaced by writing <path>.tmp, renaming the live store aside to <path>.old, swapping the
+# new one in and only then deleting the aside copy. If a crash leaves no live store, readers (and the
+# partition merge) fall back to <path>.old, so there is always one complete copy on disk.
+
+RAW_DIR = os.path.join('data', 'raw')
+RESOLUTIONS = ('daily', 'hourly')
+INDEX_NAMES = {'daily': 'date', 'hourly': 'datetime'}
+TIMESTAMP_FILE = 'timestamp.npy'
+META_FILE = 'meta.json'
+PARTS_SUFFIX = 'hourly_parts'
+TMP_SUFFIX = '.tmp'
+OLD_SUFFIX = '.old'
+
+
+def raw_store_path(location: str, resolution: str, base_dir: str = RAW_DIR) -> str:
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'Unknown resolution {resolution!r}; expected one of {RESOLUTIONS}')
+    return os.path.join(base_dir, f'{location}_{resolution}')
+
+
+def raw_csv_path(location: str, resolution: str, base_dir: str = RAW_DIR) -> str:
+    return os.path.join(base_dir, f'{location}_{resolution}_raw.csv')
+
+
+def _live_path(path: str) -> str:
+    # The store itself, or the aside copy left behind by a write interrupted mid-swap
+    if not os.path.exists(os.path.join(path, META_FILE)) and os.path.exists(
+            os.path.join(path + OLD_SUFFIX, META_FILE)):
+        return path + OLD_SUFFIX
+    return path
+
+
+def raw_store_exists(location: str, resolution: str, base_dir: str = RAW_DIR) -> bool:
+    return os.path.exists(os.path.join(_live_path(raw_store_path(location, resolution, base_dir)), META_FILE))
+
+
+def _write_columns(df: pd.DataFrame, path: str, location: str, resolution: str, dtype: Optional[str]) -> str:
+    tmp_path = path + TMP_SUFFIX
+    old_path = path + OLD_SUFFIX
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)  # leftover of an interrupted write
+    os.makedirs(tmp_path)
+
+    index = pd.DatetimeIndex(df.index)
+    np.save(os.path.join(tmp_path, TIMESTAMP_FILE), index.as_unit('ns').asi8.astype(np.int64))
+    dtypes = {}
+    for col in df.columns:
+        column = pd.to_numeric(df[col], errors='coerce')
+        col_dtype = dtype or (np.float32 if column.dtype == np.float32 else np.float64)
+        values = column.to_numpy(dtype=col_dtype, na_value=np.nan)
+        np.save(os.path.join(tmp_path, f'{col}.npy'), values)
+        dtypes[col] = str(values.dtype)
+    meta = {
+        'location': location,
+        'resolution': resolution,
+        'index_name': df.index.name or INDEX_NAMES[resolution],
+        'rows': int(len(df)),
+        'columns': list(df.columns),
+        'dtypes': dtypes,
+    }
+    with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    if os.path.exists(path):
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+    return path
+
+
+def write_raw_store(df: pd.DataFrame, location: str, resolution: str, dtype: Optional[str] = 'float64',
+                    base_dir: str = RAW_DIR) -> str:
+    """
+    Write a DatetimeIndex-ed frame as one typed .npy per column plus an int64 timestamp column.
+    Files are written next to the target and swapped in, so readers never see a half-written store.
+    dtype=None keeps float32 columns (memory_budget.compact_frame) and stores everything else as float64.
+    """
+    return _write_columns(df, raw_store_path(location, resolution, base_dir), location, resolution, dtype)
+
+
+def _read_meta(path: str) -> Dict:
+    with open(os.path.join(_live_path(path), META_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_columns(path: str, columns: Optional[List[str]], mmap: bool, mmap_mode: str = 'r') -> Dict[str, np.ndarray]:
+    path = _live_path(path)
+    meta = _read_meta(path)
+    mode = mmap_mode if mmap else None
+    wanted = meta['columns'] if columns is None else [c for c in columns if c in meta['columns']]
+    out = {'timestamp': np.load(os.path.join(path, TIMESTAMP_FILE), mmap_mode=mode)}
+    for col in wanted:
+        out[col] = np.load(os.path.join(path, f'{col}.npy'), mmap_mode=mode)
+    return out
+
+
+def _read_frame(path: str, columns: Optional[List[str]], mmap: bool) -> pd.DataFrame:
+    # The frame wraps the loaded arrays without copying them (one block per column). Memory-mapped
+    # columns are mapped copy-on-write, so pages are read on first touch and in-place edits of the
+    # frame stay private to the process instead of failing on a read-only map.
+    meta = _read_meta(path)
+    arrays = _read_columns(path, columns, mmap, mmap_mode='c')
+    index = pd.DatetimeIndex(np.asarray(arrays.pop('timestamp')).view('datetime64[ns]'), name=meta['index_name'],
+                             copy=False)
+    return pd.DataFrame({col: np.asarray(values) for col, values in arrays.items()}, index=index, copy=False)
+
+
+def read_raw_meta(location: str, resolution: str, base_dir: str = RAW_DIR) -> Dict:
+    return _read_meta(raw_store_path(location, resolution, base_dir))
+
+
+def read_raw_columns(location: str, resolution: str, columns: Optional[List[str]] = None, mmap: bool = True,
+                     base_dir: str = RAW_DIR) -> Dict[str, np.ndarray]:
+    """Return {'timestamp': int64 ns, <column>: values} arrays, memory-mapped read-only by default."""
+    return _read_columns(raw_store_path(location, resolution, base_dir), columns, mmap)
+
+
+def read_raw_store(location: str, resolution: str, columns: Optional[List[str]] = None, mmap: bool = True,
+                   base_dir: str = RAW_DIR) -> pd.DataFrame:
+    """
+    Load the store as a DataFrame indexed like the CSV export (index named 'date' or 'datetime').
+    With mmap=True the columns stay memory-mapped (copy-on-write) rather than being read into memory.
+    """
+    return _read_frame(raw_store_path(location, resolution, base_dir), columns, mmap)
+
+
+# ----------------------------------------------
+# Monthly partitions for streamed hourly downloads
+# ----------------------------------------------
+
+def hourly_parts_path(location: str, base_dir: str = RAW_DIR) -> str:
+    return os.path.join(base_dir, f'{location}_{PARTS_SUFFIX}')
+
+
+def list_hourly_partitions(location: str, base_dir: str = RAW_DIR) -> List[str]:
+    """Sorted 'YYYY-MM' keys of the complete partitions of a location."""
+    path = hourly_parts_path(location, base_dir)
+    if not os.path.isdir(path):
+        return []
+    keys = set()
+    for name in os.listdir(path):
+        if name.endswith(TMP_SUFFIX):
+            continue
+        key = name[:-len(OLD_SUFFIX)] if name.endswith(OLD_SUFFIX) else name
+        if os.path.exists(os.path.join(_live_path(os.path.join(path, key)), META_FILE)):
+            keys.add(key)
+    return sorted(keys)
+
+
+def write_hourly_partitions(df: pd.DataFrame, location: str, dtype: str = 'float64',
+                            base_dir: str = RAW_DIR) -> List[str]:
+    """
+    Merge one downloaded chunk into its month partition(s) and return the partition keys touched.
+    Rows already stored for a month are combined with the chunk; on duplicate timestamps the chunk wins,
+    which also dedupes chunks that spill over a month boundary.
+    """
+    if df is None or df.empty:
+        return []
+    root = hourly_parts_path(location, base_dir)
+    os.makedirs(root, exist_ok=True)
+    keys = []
+    months = df.index.to_period('M')
+    for period in months.unique():
+        key = str(period)
+        part = df[months == period]
+        path = os.path.join(root, key)
+        if os.path.exists(os.path.join(_live_path(path), META_FILE)):
+            existing = _read_frame(path, None, mmap=False)
+            part = pd.concat([existing, part])
+            part = part[~part.index.duplicated(keep='last')]
+        _write_columns(part.sort_index(), path, location, 'hourly', dtype)
+        keys.append(key)
+    return keys
+
+
+def iter_hourly_partitions(location: str, columns: Optional[List[str]] = None, start: Optional[str] = None,
+                           end: Optional[str] = None, mmap: bool = True,
+                           base_dir: str = RAW_DIR) -> Iterator[pd.DataFrame]:
+    """Lazily yield one DataFrame per month partition in time order, optionally limited to start..end 'YYYY-MM'."""
+    root = hourly_parts_path(location, base_dir)
+    for key in list_hourly_partitions(location, base_dir):
+        if (start is not None and key < start) or (end is not None and key > end):
+            continue
+        yield _read_frame(os.path.join(root, key), columns, mmap)
+
+
+def _store_mtime(path: str) -> float:
+    return os.path.getmtime(path) if os.path.exists(path) else -1.0
+
+
+def raw_source(location: str, resolution: str, base_dir: str = RAW_DIR) -> Optional[str]:
+    """
+    Where raw data is read from: 'parts' (hourly month partitions, when written after the store),
+    'store' (binary store), 'csv' (legacy export) or None.
+    """
+    parts = list_hourly_partitions(location, base_dir) if resolution == 'hourly' else []
+    if parts and _store_mtime(hourly_parts_path(location, base_dir)) > _store_mtime(
+            os.path.join(_live_path(raw_store_path(location, resolution, base_dir)), META_FILE)):
+        return 'parts'
+    if raw_store_exists(location, resolution, base_dir):
+        return 'store'
+    if os.path.exists(raw_csv_path(location, resolution, base_dir)):
+        return 'csv'
+    return None
+
+
+def load_raw_frame(location: str, resolution: str, columns: Optional[List[str]] = None,
+                   base_dir: str = RAW_DIR) -> pd.DataFrame:
+    """
+    Prefer the binary store (or the hourly month partitions, whichever was written last), fall back to
+    the legacy CSV export, else an empty frame.
+    """
+    source = raw_source(location, resolution, base_dir)
+    if source == 'parts':
+        frames = list(iter_hourly_partitions(location, columns, mmap=False, base_dir=base_dir))
+        return pd.concat(frames)
+    if source == 'store':
+        return read_raw_store(location, resolution, columns, base_dir=base_dir)
+    if source == 'csv':
+        df = pd.read_csv(raw_csv_path(location, resolution, base_dir), index_col=0, parse_dates=True)
+        return df if columns is None else df[[c for c in columns if c in df.columns]]
+    return pd.DataFrame()
+
+
+# ----------------------------------------------
+# Bounded-memory readers
+# ----------------------------------------------
+
+def raw_row_count(location: str, resolution: str, base_dir: str = RAW_DIR) -> int:
+    """Rows load_raw_frame would return, from metadata where possible (CSV exports are line-counted)."""
+    source = raw_source(location, resolution, base_dir)
+    if source == 'parts':
+        root = hourly_parts_path(location, base_dir)
+        return sum(_read_meta(os.path.join(root, key))['rows'] for key in list_hourly_partitions(location, base_dir))
+    if source == 'store':
+        return int(read_raw_meta(location, resolution, base_dir)['rows'])
+    if source == 'csv':
+        with open(raw_csv_path(location, resolution, base_dir), 'rb') as f:
+            return max(0, sum(1 for _ in f) - 1)
+    return 0
+
+
+def iter_raw_chunks(location: str, resolution: str, columns: Optional[List[str]] = None, chunk_rows: int = 100_000,
+                    base_dir: str = RAW_DIR) -> Iterator[pd.DataFrame]:
+    """
+    Yield the frame load_raw_frame would return as consecutive pieces of at most chunk_rows rows
+    (month partitions are batched up to chunk_rows), so callers never hold more than one piece.
+    """
+    source = raw_source(location, resolution, base_dir)
+    if source == 'store':
+        path = raw_store_path(location, resolution, base_dir)
+        index_name = _read_meta(path)['index_name']
+        arrays = _read_columns(path, columns, mmap=True)
+        timestamps = arrays.pop('timestamp')
+        for start in range(0, timestamps.shape[0], chunk_rows):
+            stop = start + chunk_rows
+            index = pd.DatetimeIndex(np.array(timestamps[start:stop]).view('datetime64[ns]'), name=index_name)
+            yield pd.DataFrame({col: np.array(values[start:stop]) for col, values in arrays.items()}, index=index)
+    elif source == 'parts':
+        batch, rows = [], 0
+        for part in iter_hourly_partitions(location, columns, mmap=False, base_dir=base_dir):
+            batch.append(part)
+            rows += len(part)
+            if rows >= chunk_rows:
+                yield pd.concat(batch)
+                batch, rows = [], 0
+        if batch:
+            yield pd.concat(batch)
+    elif source == 'csv':
+        csv_path = raw_csv_path(location, resolution, base_dir)
+        header = pd.read_csv(csv_path, nrows=0).columns
+        usecols = None if columns is None else [header[0]] + [c for c in columns if c in header]
+        yield from pd.read_csv(csv_path, index_col=0, parse_dates=True, usecols=usecols, chunksize=chunk_rows)
+
+
+if __name__ == '__main__':
+    # One-off migration: convert existing CSV exports in data/raw into binary stores
+    parser = argparse.ArgumentParser(description='Convert data/raw/*_raw.csv files into the binary raw store.')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64')
+    args = parser.parse_args()
+
+    for name in sorted(os.listdir(RAW_DIR)):
+        for resolution in RESOLUTIONS:
+            suffix = f'_{resolution}_raw.csv'
+            if name.endswith(suffix):
+                location = name[:-len(suffix)]
+                df = pd.read_csv(os.path.join(RAW_DIR, name), index_col=0, parse_dates=True)
+                out = write_raw_store(df, location, resolution, dtype=args.dtype)
+                print(f'Wrote {out} with shape {df.shape}')
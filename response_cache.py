@@ -0,0 +1,229 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+# Persistent on-disk cache of NASA POWER chunk responses, doubling as a download checkpoint.
+#
+# Layout: data/cache/power/
+#   manifest.json          {key: {url, chunk_end, historical, status, size, fetched_at, last_used, error}}
+#   <key[:2]>/<key>.json.gz  gzip'd response body; key = sha256 of the request URL
+#
+# Chunks ending before the current calendar year are historical: NASA POWER no longer changes them,
+# so a cached copy is always reused. Current-year chunks are reused for `mutable_ttl` seconds, or
+# refetched immediately with refresh_current_year=True. Failed chunks are recorded with their error
+# so reruns retry exactly those. When the cache exceeds max_bytes, current-year entries are evicted
+# first, then the least recently used.
+#
+# The manifest is held in memory with a running byte total and written in batches (FLUSH_EVERY changes
+# or FLUSH_SECONDS) and on close(), so a run over many chunks does not rewrite it per chunk; an
+# interrupted run loses at most one batch of manifest entries, whose chunks are simply fetched again.
+
+CACHE_DIR = os.path.join('data', 'cache', 'power')
+MANIFEST_FILE = 'manifest.json'
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MUTABLE_TTL = 24 * 3600
+# The manifest is rewritten after this many changes or seconds (and on close), not on every chunk
+FLUSH_EVERY = 200
+FLUSH_SECONDS = 10.0
+# Eviction trims the cache to this share of max_bytes
+EVICT_TO = 0.9
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 mutable_ttl: float = DEFAULT_MUTABLE_TTL, refresh_current_year: bool = False,
+                 flush_every: int = FLUSH_EVERY, flush_seconds: float = FLUSH_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mutable_ttl = mutable_ttl
+        self.refresh_current_year = refresh_current_year
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.current_year = datetime.now().year
+        self.hits = 0
+        self.misses = 0
+        # URLs whose last request in this run failed after all retries (cleared by a later put)
+        self.run_failures: Set[str] = set()
+        # put/mark_failed may run on worker threads (asyncio.to_thread in the async engine)
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest: Dict[str, Dict] = self._load_manifest()
+        self._bytes = sum(e.get('size', 0) for e in self.manifest.values())
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+
+    # ---- manifest ----
+    def _manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, MANIFEST_FILE)
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # A corrupt manifest only costs refetches; entries are rebuilt as chunks complete
+            return {}
+
+    def _save_manifest(self):
+        with self._lock:
+            tmp = self._manifest_path() + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f)
+            os.replace(tmp, self._manifest_path())
+            self._pending = 0
+            self._flushed_at = time.monotonic()
+
+    def _changed(self):
+        """Count a manifest change; rewrite the manifest every flush_every changes or flush_seconds."""
+        with self._lock:
+            self._pending += 1
+            due = (self._pending >= self.flush_every
+                   or time.monotonic() - self._flushed_at >= self.flush_seconds)
+        if due:
+            self._save_manifest()
+
+    def flush(self):
+        """Write the manifest if it has unsaved changes."""
+        if self._pending:
+            self._save_manifest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json.gz')
+
+    def _drop(self, key: str):
+        entry = self.manifest.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.get('size', 0)
+
+    # ---- lookups ----
+    def _is_fresh(self, entry: Dict) -> bool:
+        if entry.get('historical'):
+            return True
+        if self.refresh_current_year:
+            return False
+        return time.time() - entry.get('fetched_at', 0) < self.mutable_ttl
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Cached response for url if present and fresh, else None."""
+        key = url_key(url)
+        entry = self.manifest.get(key)
+        if entry is None or entry.get('status') != 'ok' or not self._is_fresh(entry):
+            self.misses += 1
+            return None
+        try:
+            with gzip.open(self._body_path(key), 'rt', encoding='utf-8') as f:
+                obj = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._drop(key)
+            self._changed()
+            self.misses += 1
+            return None
+        entry['last_used'] = time.time()
+        self.hits += 1
+        return obj
+
+    def put(self, url: str, obj: Dict, chunk_end: datetime):
+        key = url_key(url)
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
+        now = time.time()
+        with self._lock:
+            self.run_failures.discard(url)
+            self._drop(key)
+            self.manifest[key] = {
+                'url': url,
+                'chunk_end': chunk_end.strftime('%Y%m%d'),
+                'historical': chunk_end.year < self.current_year,
+                'status': 'ok',
+                'size': os.path.getsize(path),
+                'fetched_at': now,
+                'last_used': now,
+            }
+            self._bytes += self.manifest[key]['size']
+            self.evict()
+        self._changed()
+
+    def mark_failed(self, url: str, chunk_end: datetime, error: Exception):
+        """Checkpoint a chunk that failed after all retries so it is reported and retried on the next run."""
+        key = url_key(url)
+        with self._lock:
+            self.run_failures.add(url)
+            if self.manifest.get(key, {}).get('status') == 'ok':
+                return  # keep a stale-but-valid copy rather than forgetting it
+            self._drop(key)
+            self.manifest[key] = {
+                'url': url,
+                'chunk_end': chunk_end.strftime('%Y%m%d'),
+                'historical': chunk_end.year < self.current_year,
+                'status': 'failed',
+                'size': 0,
+                'fetched_at': time.time(),
+                'last_used': time.time(),
+                'error': str(error),
+            }
+        self._changed()
+
+    def forget_failure(self, url: str):
+        """Drop a failure that was recovered another way (e.g. an adaptive span retried as smaller pieces)."""
+        key = url_key(url)
+        with self._lock:
+            self.run_failures.discard(url)
+            if self.manifest.get(key, {}).get('status') != 'failed':
+                return
+            self._drop(key)
+        self._changed()
+
+    def failed_chunks(self) -> List[str]:
+        return [e['url'] for e in self.manifest.values() if e.get('status') == 'failed']
+
+    # ---- size management ----
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def evict(self):
+        """
+        When the cache exceeds max_bytes, drop entries down to EVICT_TO of it: current-year entries first,
+        then least recently used. The headroom keeps the sort off the per-put path.
+        """
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            target = self.max_bytes * EVICT_TO
+            order = sorted(self.manifest.items(), key=lambda kv: (kv[1].get('historical', False), kv[1].get('last_used', 0)))
+            for key, _ in order:
+                if self._bytes <= target:
+                    break
+                try:
+                    os.remove(self._body_path(key))
+                except OSError:
+                    pass
+                self._drop(key)
+
+    def close(self):
+        """Persist the manifest, including last-used times gathered by cache hits."""
+        self._save_manifest()
+
+    def summary(self) -> str:
+        failed = self.failed_chunks()
+        text = (f'cache: {self.hits} hits, {self.misses} misses, {len(self.manifest)} entries, '
+                f'{self.total_bytes() / 1e6:.1f} MB')
+        if failed:
+            text += f'; {len(failed)} chunk(s) failed and will be retried on the next run'
+        return text
@@ -1,16 +1,25 @@
+import argparse
+import hashlib
+import inspect
 import json
 import os
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 from sklearn.linear_model import Ridge
 from sklearn.preprocessing import OneHotEncoder
 
-# Locations to process
-DEMO_LOCATIONS = ["tbilisi", "batumi", "kutaisi"]
+from forecast_cache import CACHE_DIR, DEFAULT_MAX_ENTRIES, ForecastCache, series_key
+from location_registry import load_locations
+from memory_budget import StageMemory, compact_frame, widen
+from raw_qc import qc_frame
+from raw_store import load_raw_frame
+
+# Locations to process (shared registry: locations.json or $LOCATIONS_FILE)
+DEMO_LOCATIONS = list(load_locations())
 
 # Variables mapping from NASA file to our names and unit conversions
 VAR_MAP = {
@@ -25,6 +34,9 @@ WIND_CANDIDATES = ["WS10M_MAX", "WS10M", "WS2M"]  # m/s; convert to km/h
 # Humidity variable
 HUM_VAR = "RH2M"  # %
 
+# Daily variables build_all_series can use, read from the raw store
+SERIES_VARIABLES = ["PRECTOTCORR", "T2M_MAX", "T2M"] + WIND_CANDIDATES + [HUM_VAR]
+
 PROCESSED_DIRS = [
     os.path.join("data", "processed"),
     os.path.join("frontend", "public", "static-data", "processed"),
@@ -32,6 +44,21 @@ PROCESSED_DIRS = [
 
 OUTPUT_DIR = os.path.join("frontend", "public", "static-data", "processed")
 
+# Ridge regularisation and the shortest series the regression is fitted on (shorter: monthly climatology)
+RIDGE_ALPHA = 1.0
+MIN_FIT_MONTHS = 24
+
+# Quantile levels of the probabilistic forecast. They come from out-of-sample errors of the same target
+# calendar month (or of all months when a month has fewer than MIN_MONTH_RESIDUALS of them): the ridge
+# model is refitted at rolling origins every ROLLING_STEP months from MIN_FIT_MONTHS of history and scored
+# over the following horizon. Series too short for that use inflated in-sample residuals.
+QUANTILES = [0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95]
+MIN_MONTH_RESIDUALS = 8
+ROLLING_STEP = 12
+
+# (preds, ci_lower, ci_upper, month labels, quantiles levels x horizon)
+Forecast = Tuple[np.ndarray, np.ndarray, np.ndarray, List[str], np.ndarray]
+
 
 @dataclass
 class SeriesSpec:
@@ -49,77 +76,158 @@ def load_daily_stats(location: str) -> Dict:
     raise FileNotFoundError(f"daily_stats not found for {location}")
 
 
+def series_unit(var_key: str) -> str:
+    if var_key == "PRECTOTCORR":
+        return "mm"
+    if var_key.startswith("T2M"):
+        return "°C"
+    if var_key.startswith("WS"):
+        return "km/h"  # we'll convert later
+    if var_key == "RH2M":
+        return "%"
+    return ""
+
+
+# ----------------------------------------------
+# Monthly aggregates: raw daily store first, packed yearly matrix or daily_stats.json as fallback
+# ----------------------------------------------
+
+def monthly_means(dates: np.ndarray, columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """
+    Calendar-month means of daily columns (NaN ignored), indexed by month start from the first to the
+    last month with data; months without any value are NaN. One bincount per column.
+    """
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    if months.size == 0:
+        return pd.DataFrame(columns=list(columns), dtype=float)
+    first = months.min()
+    keys = months - first
+    n_months = int(keys.max()) + 1
+    out = {}
+    for var, values in columns.items():
+        ok = ~np.isnan(values)
+        sums = np.bincount(keys[ok], weights=values[ok], minlength=n_months)
+        counts = np.bincount(keys[ok], minlength=n_months)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[var] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    index = pd.DatetimeIndex((first + np.arange(n_months)).astype("datetime64[M]").astype("datetime64[ns]"), name="date")
+    return pd.DataFrame(out, index=index)
+
+
+def monthly_frame_from_daily(daily_df: pd.DataFrame) -> pd.DataFrame:
+    """Monthly means of every SERIES_VARIABLES column of a DatetimeIndex-ed daily frame."""
+    dates = daily_df.index.to_numpy().astype("datetime64[D]")
+    return monthly_means(dates, {var: widen(daily_df[var].to_numpy())
+                                 for var in SERIES_VARIABLES if var in daily_df.columns})
+
+
+def load_monthly_raw(location: str, memory_efficient: bool = False) -> Optional[pd.DataFrame]:
+    """
+    Monthly means from the raw daily store (or CSV export) with the same QC masking preprocessing
+    applies by default (fill values, impossible values); None when there is no raw daily data.
+    memory_efficient=True holds the daily frame compact (float32 columns where lossless, see memory_budget).
+    """
+    daily_df = load_raw_frame(location, "daily", SERIES_VARIABLES)
+    if daily_df.empty:
+        return None
+    daily_df, _, _ = qc_frame(daily_df, "daily")
+    if memory_efficient:
+        daily_df = compact_frame(daily_df)
+    return monthly_frame_from_daily(daily_df)
+
+
+def yearly_matrix_dates(years: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (dates, valid) for a (year x DOY) matrix: dates[i, d] = Jan 1 of years[i] plus d days, exact in
+    leap years; valid is False for DOY 366 of non-leap years, which spills into the next year.
+    """
+    starts = (np.asarray(years, dtype=np.int64) - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+    dates = starts[:, None] + np.arange(366).astype("timedelta64[D]")
+    valid = dates.astype("datetime64[Y]") == starts.astype("datetime64[Y]")[:, None]
+    return dates, valid
+
+
+def monthly_frame_from_yearly(variables: List[str], years: np.ndarray, matrix: np.ndarray) -> pd.DataFrame:
+    """Monthly means from a (variable x year x DOY) matrix such as pack_yearly_values writes."""
+    dates, valid = yearly_matrix_dates(years)
+    return monthly_means(dates[valid], {var: widen(matrix[v])[valid] for v, var in enumerate(variables)})
+
+
+def stats_yearly_matrix(nasa: Dict, variables: List[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """(variables present, years, variable x year x DOY matrix) gathered from per-DOY yearly_values."""
+    present = [var for var in variables if nasa.get("variables", {}).get(var)]
+    cells = []
+    for v, var in enumerate(present):
+        for doy_str, day in nasa["variables"][var].items():
+            try:
+                doy = int(doy_str)
+            except ValueError:
+                continue
+            cells.extend((v, yv["year"], doy, yv["value"]) for yv in day.get("yearly_values", []))
+    if not cells:
+        return present, np.empty(0, dtype=np.int64), np.empty((len(present), 0, 366))
+    var_idx, year, doy, value = (np.array(col) for col in zip(*cells))
+    years, year_idx = np.unique(year.astype(np.int64), return_inverse=True)
+    matrix = np.full((len(present), years.size, 366), np.nan)
+    matrix[var_idx.astype(np.int64), year_idx, doy.astype(np.int64) - 1] = value.astype(float)
+    return present, years, matrix
+
+
+def load_packed_yearly(location: str) -> Optional[Tuple[List[str], np.ndarray, np.ndarray]]:
+    """(variables, years, matrix) from a compact <location>_daily_summary.json + packed .bin, if written."""
+    for base in PROCESSED_DIRS:
+        path = os.path.join(base, f"{location}_daily_summary.json")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.load(f).get("yearly_values")
+        if not header:
+            continue
+        matrix = np.fromfile(os.path.join(base, header["file"]), dtype="<f4").reshape(header["shape"])
+        return header["variables"], np.array(header["years"], dtype=np.int64), matrix
+    return None
+
+
+def load_monthly_frame(location: str, memory_efficient: bool = False) -> Tuple[pd.DataFrame, str]:
+    """
+    (monthly means per variable, source): the raw daily store when present, else the packed yearly
+    matrix of the compact output, else the yearly_values of daily_stats.json.
+    """
+    monthly = load_monthly_raw(location, memory_efficient)
+    if monthly is not None:
+        return monthly, "raw_daily"
+    packed = load_packed_yearly(location)
+    if packed is not None:
+        return monthly_frame_from_yearly(*packed), "packed_yearly"
+    return monthly_frame_from_yearly(*stats_yearly_matrix(load_daily_stats(location), SERIES_VARIABLES)), "daily_stats"
+
+
 def monthly_time_series(nasa: Dict, var_key: str) -> Tuple[pd.Series, str]:
     """
     Build a monthly mean time series across years using per-DOY yearly_values.
-    Returns series indexed by period (YYYY-MM) and unit string.
+    Returns series indexed by month start and unit string.
     """
     variables = nasa.get("variables", {})
     if var_key not in variables:
         raise KeyError(f"Variable {var_key} not in dataset")
 
-    # Determine year range from metadata
+    present, years, matrix = stats_yearly_matrix(nasa, [var_key])
+    # Restrict to the documented data period when there is one
     start = nasa.get("data_period", {}).get("start")
     end = nasa.get("data_period", {}).get("end")
-    if not start or not end:
-        # Fallback: infer from yearly_values keys
-        years = set()
-        for day in variables[var_key].values():
-            for yv in day.get("yearly_values", []):
-                years.add(yv.get("year"))
-        if not years:
-            raise ValueError("Cannot infer years from dataset")
-        start_year, end_year = min(years), max(years)
-    else:
-        start_year, end_year = int(start[:4]), int(end[:4])
-
-    # Build dataframe of daily values per date
-    rows = []
-    # Non-leap baseline for mapping DOY to month (we'll map by actual calendar using each year)
-    for doy_str, day in variables[var_key].items():
-        try:
-            doy = int(doy_str)
-        except ValueError:
-            continue
-        for yv in day.get("yearly_values", []):
-            y = int(yv["year"])
-            if y < start_year or y > end_year:
-                continue
-            # Create date from year and day-of-year
-            # Handle leap: cap at 365 for simplicity; if doy=366, map to Dec 31
-            dd = min(doy, 365)
-            date = pd.Timestamp(y, 1, 1) + pd.Timedelta(days=dd - 1)
-            rows.append({"date": date, "value": yv["value"]})
-
-    if not rows:
+    if start and end:
+        keep = (years >= int(start[:4])) & (years <= int(end[:4]))
+        years, matrix = years[keep], matrix[:, keep]
+    if not present or years.size == 0:
         raise ValueError(f"No data rows built for {var_key}")
 
-    df = pd.DataFrame(rows).dropna()
-    df = df.sort_values("date")
-    # Aggregate to monthly mean
-    s = df.set_index("date")["value"].resample("MS").mean()
-    # Drop any all-NaN months
-    s = s.dropna()
-
-    # Units
-    if var_key == "PRECTOTCORR":
-        unit = "mm"
-    elif var_key.startswith("T2M"):
-        unit = "°C"
-    elif var_key.startswith("WS"):
-        unit = "km/h"  # we'll convert later
-    elif var_key == "RH2M":
-        unit = "%"
-    else:
-        unit = ""
+    s = monthly_frame_from_yearly(present, years, matrix)[var_key].dropna()
+    return s, series_unit(var_key)
 
-    return s, unit
 
-
-def pick_wind_var(nasa: Dict) -> str:
-    variables = nasa.get("variables", {})
+def pick_wind_var(monthly: pd.DataFrame) -> str:
     for k in WIND_CANDIDATES:
-        if k in variables:
+        if k in monthly.columns and monthly[k].notna().any():
             return k
     raise KeyError("No wind variable present")
 
@@ -128,35 +236,30 @@ def to_kmh(series: pd.Series) -> pd.Series:
     return series * 3.6
 
 
-def build_all_series(nasa: Dict) -> List[SeriesSpec]:
+def build_all_series(monthly: pd.DataFrame) -> List[SeriesSpec]:
+    """Forecast targets from a monthly frame (see load_monthly_frame); variables without data are skipped."""
+    available = [var for var in monthly.columns if monthly[var].notna().any()]
     out: List[SeriesSpec] = []
 
     # Precipitation
-    try:
-        s, unit = monthly_time_series(nasa, "PRECTOTCORR")
-        out.append(SeriesSpec("precipitation", s, unit))
-    except Exception:
-        pass
+    if "PRECTOTCORR" in available:
+        out.append(SeriesSpec("precipitation", monthly["PRECTOTCORR"].dropna(), series_unit("PRECTOTCORR")))
 
     # Temperature (prefer T2M_MAX else T2M)
-    temp_key = "T2M_MAX" if "T2M_MAX" in nasa.get("variables", {}) else ("T2M" if "T2M" in nasa.get("variables", {}) else None)
+    temp_key = "T2M_MAX" if "T2M_MAX" in available else ("T2M" if "T2M" in available else None)
     if temp_key:
-        s, unit = monthly_time_series(nasa, temp_key)
-        out.append(SeriesSpec("temperature", s, unit))
+        out.append(SeriesSpec("temperature", monthly[temp_key].dropna(), series_unit(temp_key)))
 
     # Wind
     try:
-        wind_key = pick_wind_var(nasa)
-        s, unit = monthly_time_series(nasa, wind_key)
-        s = to_kmh(s)
-        out.append(SeriesSpec("windSpeed", s, "km/h"))
-    except Exception:
+        wind_key = pick_wind_var(monthly)
+        out.append(SeriesSpec("windSpeed", to_kmh(monthly[wind_key].dropna()), "km/h"))
+    except KeyError:
         pass
 
     # Humidity
-    if HUM_VAR in nasa.get("variables", {}):
-        s, unit = monthly_time_series(nasa, HUM_VAR)
-        out.append(SeriesSpec("humidity", s.clip(lower=0, upper=100), unit))
+    if HUM_VAR in available:
+        out.append(SeriesSpec("humidity", monthly[HUM_VAR].dropna().clip(lower=0, upper=100), series_unit(HUM_VAR)))
 
     return out
 
@@ -174,26 +277,104 @@ def make_features(index: pd.DatetimeIndex) -> np.ndarray:
     return X
 
 
-def forecast_series(series: pd.Series, horizon: int = 12) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+def future_index(last: pd.Timestamp, horizon: int) -> pd.DatetimeIndex:
+    return pd.period_range(last.to_period("M"), periods=horizon + 1, freq="M")[1:].to_timestamp()
+
+
+def month_residual_quantiles(months: np.ndarray, resid: np.ndarray, n_params: int,
+                             levels: List[float] = QUANTILES) -> np.ndarray:
+    """
+    Empirical QUANTILES of residuals (n x k, one column per series, no NaN) per calendar month as a
+    levels x 12 x k array. Months with fewer than MIN_MONTH_RESIDUALS residuals use the quantiles of all
+    residuals. Residuals are inflated by sqrt(n / (n - n_params)) for the parameters fitted to them
+    (n_params=0 for out-of-sample errors).
+    """
+    months = np.asarray(months, dtype=np.int64)
+    resid = np.asarray(resid, dtype=float).reshape(len(months), -1)
+    n, k = resid.shape
+    resid = resid * np.sqrt(n / max(n - n_params, 1))
+    pooled = np.quantile(resid, levels, axis=0)
+    by_month = np.empty((len(levels), 12, k))
+    for m in range(12):
+        rows = resid[months == m + 1]
+        by_month[:, m] = np.quantile(rows, levels, axis=0) if len(rows) >= MIN_MONTH_RESIDUALS else pooled
+    return by_month
+
+
+def rolling_origin_residuals(idx: pd.DatetimeIndex, Y: np.ndarray,
+                             horizon: int = 12) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Out-of-sample errors of the ridge forecast of every column of Y (n x k, no NaN): refitted on the first
+    c months for every ROLLING_STEP-th origin c from MIN_FIT_MONTHS and forecast as predict_group() does,
+    then compared with the observed months of the following horizon. Returns (target calendar months,
+    errors m x k).
+    """
+    Y = np.asarray(Y, dtype=float).reshape(len(idx), -1)
+    X = make_features(idx)
+    period = idx.to_period("M").asi8
+    month = idx.month.to_numpy()
+    # Future features depend only on the calendar month of the origin
+    future: Dict[int, np.ndarray] = {}
+    months, errors = [], []
+    for c in range(MIN_FIT_MONTHS, len(idx), ROLLING_STEP):
+        coef, intercept = ridge_fit(X[:c], Y[:c])
+        last = idx[c - 1]
+        if last.month not in future:
+            future[last.month] = make_features(future_index(last, horizon))
+        stop = int(np.searchsorted(period, period[c - 1] + horizon, side="right"))
+        lead = period[c:stop] - period[c - 1]
+        errors.append(Y[c:stop] - (future[last.month][lead - 1] @ coef + intercept))
+        months.append(month[c:stop])
+    if not errors:
+        return np.empty(0, dtype=np.int64), np.empty((0, Y.shape[1]))
+    return np.concatenate(months), np.vstack(errors)
+
+
+def forecast_residual_quantiles(idx: pd.DatetimeIndex, Y: np.ndarray, resid: np.ndarray, n_params: int,
+                                horizon: int = 12) -> np.ndarray:
+    """
+    Per-calendar-month quantiles (levels x 12 x k) of the rolling-origin errors of the ridge fit of Y on
+    make_features(idx), or of its in-sample residuals resid (n_params fitted) when there are fewer than
+    MIN_MONTH_RESIDUALS out-of-sample errors.
+    """
+    months, errors = rolling_origin_residuals(idx, Y, horizon)
+    if len(errors) >= MIN_MONTH_RESIDUALS:
+        return month_residual_quantiles(months, errors, 0)
+    return month_residual_quantiles(idx.month.to_numpy(), resid, n_params)
+
+
+def horizon_quantiles(preds: np.ndarray, by_month: np.ndarray, idx_future: pd.DatetimeIndex) -> np.ndarray:
+    """preds (horizon x k) plus the residual quantiles of each target's calendar month: levels x horizon x k."""
+    return preds.reshape(len(idx_future), -1)[None] + by_month[:, idx_future.month.to_numpy() - 1]
+
+
+def climatology_forecast(series: pd.Series, horizon: int = 12) -> Forecast:
+    """Seasonal monthly means of series repeated over the horizon, ±1.96 series std."""
+    last = series.index[-1]
+    idx_future = future_index(last, horizon)
+    month_means = series.groupby(series.index.month).mean()
+    preds = month_means.reindex(idx_future.month).fillna(series.mean()).to_numpy(dtype=float)
+    resid_std = float(series.std()) if series.std() == series.std() else 0.0
+    ci = 1.96 * resid_std
+    lower = preds - ci
+    upper = preds + ci
+    months = [ts.strftime("%b") for ts in idx_future]
+    resid = series.to_numpy(dtype=float) - month_means.reindex(series.index.month).to_numpy()
+    by_month = month_residual_quantiles(series.index.month.to_numpy(), resid, len(month_means))
+    return preds, lower, upper, months, horizon_quantiles(preds, by_month, idx_future)[:, :, 0]
+
+
+def forecast_series(series: pd.Series, horizon: int = 12) -> Forecast:
     series = series.dropna()
-    if len(series) < 24:
+    if len(series) < MIN_FIT_MONTHS:
         # Not enough data; repeat seasonal monthly means
-        last = series.index[-1]
-        idx_future = pd.period_range(last.to_period("M"), periods=horizon + 1, freq="M")[1:].to_timestamp()
-        month_means = series.groupby(series.index.month).mean()
-        preds = np.array([month_means.get(ts.month, series.mean()) for ts in idx_future], dtype=float)
-        resid_std = float(series.std()) if series.std() == series.std() else 0.0
-        ci = 1.96 * resid_std
-        lower = preds - ci
-        upper = preds + ci
-        months = [ts.strftime("%b") for ts in idx_future]
-        return preds, lower, upper, months
+        return climatology_forecast(series, horizon)
 
     idx = series.index
     X = make_features(idx)
     y = series.values.astype(float)
 
-    model = Ridge(alpha=1.0)
+    model = Ridge(alpha=RIDGE_ALPHA)
     model.fit(X, y)
 
     # Residual std for simple CI
@@ -203,19 +384,112 @@ def forecast_series(series: pd.Series, horizon: int = 12) -> Tuple[np.ndarray, n
 
     # Build future index
     last = idx[-1]
-    idx_future = pd.period_range(last.to_period("M"), periods=horizon + 1, freq="M")[1:].to_timestamp()
+    idx_future = future_index(last, horizon)
     X_future = make_features(idx_future)
     preds = model.predict(X_future)
 
     lower = preds - 1.96 * resid_std
     upper = preds + 1.96 * resid_std
     months = [ts.strftime("%b") for ts in idx_future]
-    return preds, lower, upper, months
+    by_month = forecast_residual_quantiles(idx, y, resid, X.shape[1] + 1, horizon)
+    return preds, lower, upper, months, horizon_quantiles(preds, by_month, idx_future)[:, :, 0]
 
 
-def save_forecast(location: str, specs: List[SeriesSpec]):
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+# ----------------------------------------------
+# Batched fitting: one design matrix and one multi-output ridge solve per shared monthly index
+# ----------------------------------------------
+
+def ridge_fit(X: np.ndarray, Y: np.ndarray, alpha: float = RIDGE_ALPHA) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ridge with intercept for every column of Y at once, as sklearn's Ridge solves it (centred design,
+    Cholesky solve of X'X + alpha*I). Returns (coef p x k, intercept k).
+    """
+    x_mean = X.mean(axis=0)
+    y_mean = Y.mean(axis=0)
+    Xc = X - x_mean
+    A = Xc.T @ Xc
+    A[np.diag_indices_from(A)] += alpha
+    coef = np.linalg.solve(A, Xc.T @ (Y - y_mean))
+    return coef, y_mean - x_mean @ coef
+
+
+def forecast_batch(series_list: List[pd.Series], horizon: int = 12) -> List[Forecast]:
+    """
+    forecast_series() for many series (any mix of variables and locations) in one go. Series sharing a
+    monthly index share one design matrix and one ridge solve over all of them; series shorter than
+    MIN_FIT_MONTHS take the climatology path of forecast_series(). Results are in input order.
+    """
+    results: List = [None] * len(series_list)
+    cleaned = [s.dropna() for s in series_list]
+    groups: Dict[bytes, List[int]] = {}
+    for i, s in enumerate(cleaned):
+        if len(s) < MIN_FIT_MONTHS:
+            results[i] = forecast_series(s, horizon)
+        else:
+            groups.setdefault(s.index.values.tobytes(), []).append(i)
+
+    for members in groups.values():
+        idx = cleaned[members[0]].index
+        Y = np.column_stack([cleaned[i].values.astype(float) for i in members])
+        preds, lower, upper, months, quantiles = predict_group(idx, fit_group(idx, Y, horizon), horizon)
+        for j, i in enumerate(members):
+            results[i] = (preds[:, j], lower[:, j], upper[:, j], months, quantiles[:, :, j])
+    return results
+
+
+def fit_group(idx: pd.DatetimeIndex, Y: np.ndarray,
+              horizon: int = 12) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (coef, intercept, residual std per column, error quantiles per calendar month for forecasts up to
+    horizon months ahead) of the ridge fit of every column of Y on make_features(idx).
+    """
+    X = make_features(idx)
+    coef, intercept = ridge_fit(X, Y)
+    resid = Y - (X @ coef + intercept)
+    resid_std = np.nanstd(resid, axis=0, ddof=1)
+    return coef, intercept, resid_std, forecast_residual_quantiles(idx, Y, resid, X.shape[1] + 1, horizon)
 
+
+def predict_group(idx: pd.DatetimeIndex, fit: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+                  horizon: int = 12) -> Forecast:
+    """
+    (preds, lower, upper) as horizon x series arrays, month labels, and quantiles as levels x horizon x
+    series, for the months after idx.
+    """
+    coef, intercept, resid_std, by_month = fit
+    idx_future = future_index(idx[-1], horizon)
+    preds = make_features(idx_future) @ coef + intercept
+    lower = preds - 1.96 * resid_std
+    upper = preds + 1.96 * resid_std
+    months = [ts.strftime("%b") for ts in idx_future]
+    return preds, lower, upper, months, horizon_quantiles(preds, by_month, idx_future)
+
+
+def humidity_climatology(history: pd.Series, target_months: List[int], preds: np.ndarray, lower: np.ndarray,
+                         upper: np.ndarray, quantiles: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The published humidity forecast: preds replaced by the calendar-month means of history (its overall mean
+    for months it lacks), the CI and quantiles moved along with the same offsets, all clipped to [0, 100].
+    """
+    # Use historical monthly means directly to ensure alignment with actuals
+    month_means = history.groupby(history.index.month).mean()
+    clim = month_means.reindex(target_months).to_numpy(dtype=float)
+    clim = np.where(np.isfinite(clim), clim, float(np.nanmean(history.values)))
+    # Re-center CI and quantiles around climatology with the same offsets
+    widths = (upper - lower) / 2.0
+    quantiles = quantiles - preds + clim
+    preds = clim
+    lower = preds - widths
+    upper = preds + widths
+    # Clip to physical bounds
+    return (np.clip(preds, 0.0, 100.0), np.clip(lower, 0.0, 100.0), np.clip(upper, 0.0, 100.0),
+            np.clip(quantiles, 0.0, 100.0))
+
+
+def forecast_payload(location: str, specs: List[SeriesSpec],
+                     fits: List[Forecast],
+                     source: Optional[str] = None) -> Dict:
+    """The *_monthly_forecast.json document for one location from its specs and their fits."""
     result: Dict = {
         "location": location,
         "generated_at": datetime.utcnow().isoformat() + "Z",
@@ -229,8 +503,13 @@ def save_forecast(location: str, specs: List[SeriesSpec]):
         },
         "ci_lower": {},
         "ci_upper": {},
+        # Per variable: quantile level -> horizon values (forecast plus that calendar month's residual quantile)
+        "quantiles": {},
         "meta": {
             "model": "Ridge + seasonal one-hot + trend + sin/cos",
+            "source": source,
+            "quantile_levels": QUANTILES,
+            "quantile_method": "per-calendar-month quantiles of rolling-origin out-of-sample errors",
             "units": {
                 "precipitation": "mm",
                 "temperature": "°C",
@@ -244,56 +523,142 @@ def save_forecast(location: str, specs: List[SeriesSpec]):
     month_abbr_to_num = {m: i for i, m in enumerate(["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"], start=1)}
 
     months_common: List[str] = []
-    for sp in specs:
-        preds, lower, upper, months = forecast_series(sp.values, horizon=12)
-
+    for sp, (preds, lower, upper, months, quantiles) in zip(specs, fits):
         # Humidity-specific calibration: replace with seasonal monthly climatology and clip to [0,100]
         if sp.name == "humidity":
-            # Use historical monthly means directly to ensure alignment with actuals
-            month_means = sp.values.groupby(sp.values.index.month).mean()
-            widths = (upper - lower) / 2.0
-            preds_list = []
-            for i, m_abbr in enumerate(months):
-                m_num = month_abbr_to_num.get(m_abbr, None)
-                clim = float(month_means.get(m_num, np.nan)) if m_num is not None else float("nan")
-                if not np.isfinite(clim):
-                    clim = float(np.nanmean(sp.values.values))
-                preds_list.append(clim)
-            preds = np.array(preds_list, dtype=float)
-            # Re-center CI around climatology with same half-width
-            lower = preds - widths
-            upper = preds + widths
-            # Clip to physical bounds
-            preds = np.clip(preds, 0.0, 100.0)
-            lower = np.clip(lower, 0.0, 100.0)
-            upper = np.clip(upper, 0.0, 100.0)
+            preds, lower, upper, quantiles = humidity_climatology(
+                sp.values, [month_abbr_to_num.get(m) for m in months], preds, lower, upper, quantiles)
 
         result["forecast"][sp.name] = [float(x) for x in preds]
         result["ci_lower"][sp.name] = [float(x) for x in lower]
         result["ci_upper"][sp.name] = [float(x) for x in upper]
+        result["quantiles"][sp.name] = {f"{q:g}": [float(x) for x in row] for q, row in zip(QUANTILES, quantiles)}
         if not months_common:
             months_common = months
 
     result["months"] = months_common
+    return result
+
 
+def write_forecast(location: str, result: Dict):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
     out_path = os.path.join(OUTPUT_DIR, f"{location}_monthly_forecast.json")
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
     print(f"Saved forecast: {out_path}")
 
 
-def main():
+def save_forecast(location: str, specs: List[SeriesSpec], source: Optional[str] = None,
+                  cache: Optional[ForecastCache] = None):
+    fits = cached_fits([sp.values for sp in specs], [f"{location}/{sp.name}" for sp in specs],
+                       lambda series: [forecast_series(s, horizon=12) for s in series], cache)
+    write_forecast(location, forecast_payload(location, specs, fits, source))
+
+
+def forecast_locations(batch: List[Tuple[str, List[SeriesSpec], Optional[str]]],
+                       cache: Optional[ForecastCache] = None) -> List[Tuple[str, Dict]]:
+    """(location, payload) for every (location, specs, source), fitted with one forecast_batch() call."""
+    fits = cached_fits([sp.values for _, specs, _ in batch for sp in specs],
+                       [f"{loc}/{sp.name}" for loc, specs, _ in batch for sp in specs],
+                       lambda series: forecast_batch(series, horizon=12), cache)
+    out = []
+    pos = 0
+    for location, specs, source in batch:
+        out.append((location, forecast_payload(location, specs, fits[pos:pos + len(specs)], source)))
+        pos += len(specs)
+    return out
+
+
+# ----------------------------------------------
+# Fit cache: unchanged series are served from data/cache/forecast instead of being refitted
+# ----------------------------------------------
+
+def model_config(horizon: int = 12) -> Dict:
+    """Everything besides the series that determines a fit: hyperparameters and the feature/fitting code."""
+    code = "".join(inspect.getsource(fn) for fn in (make_features, future_index, month_residual_quantiles,
+                                                     rolling_origin_residuals, forecast_residual_quantiles,
+                                                     horizon_quantiles, climatology_forecast, forecast_series,
+                                                     ridge_fit, forecast_batch, fit_group, predict_group))
+    return {
+        "alpha": RIDGE_ALPHA,
+        "min_fit_months": MIN_FIT_MONTHS,
+        "quantiles": QUANTILES,
+        "min_month_residuals": MIN_MONTH_RESIDUALS,
+        "rolling_step": ROLLING_STEP,
+        "horizon": horizon,
+        "code": hashlib.sha256(code.encode("utf-8")).hexdigest(),
+    }
+
+
+def cached_fits(series_list: List[pd.Series], labels: List[str],
+                fit: Callable[[List[pd.Series]], List[Forecast]],
+                cache: Optional[ForecastCache] = None) -> List[Forecast]:
+    """fit(series_list) where only series missing from the cache are fitted (and then stored under their label)."""
+    if cache is None:
+        return fit(series_list)
+    config = model_config(12)
+    keys = [series_key(s, config) for s in series_list]
+    fits = [cache.get(k) for k in keys]
+    missing = [i for i, f in enumerate(fits) if f is None]
+    if missing:
+        for i, f in zip(missing, fit([series_list[i] for i in missing])):
+            fits[i] = f
+            cache.put(keys[i], labels[i], f)
+    return fits
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Fit 12-month forecasts from monthly means of the raw daily data (processed stats as fallback).")
+    parser.add_argument("--memory-report", nargs="?", const="", default=None, metavar="PATH",
+                        help="Print wall time and peak RSS per stage and save them as JSON "
+                             "(default data/benchmarks/memory_forecast_<ts>.json)")
+    parser.add_argument("--memory-efficient", action="store_true",
+                        help="Hold raw daily frames as float32 wherever that is lossless (identical forecasts)")
+    parser.add_argument("--engine", choices=["batched", "serial"], default="batched",
+                        help="batched: one multi-output ridge solve per shared monthly index across all "
+                             "locations; serial: one sklearn Ridge per (location, variable)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Fitted-forecast cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Refit every series and do not write the cache")
+    parser.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Evict least recently used fits beyond this many")
+    args = parser.parse_args(argv)
+    tracker = StageMemory(enabled=args.memory_report is not None)
+    cache = None if args.no_cache else ForecastCache(args.cache_dir, args.cache_max_entries)
+
+    batch: List[Tuple[str, List[SeriesSpec], Optional[str]]] = []
     for loc in DEMO_LOCATIONS:
         try:
-            nasa = load_daily_stats(loc)
-            specs = build_all_series(nasa)
+            with tracker.stage("load", location=loc):
+                monthly, source = load_monthly_frame(loc, args.memory_efficient)
+            with tracker.stage("series", location=loc):
+                specs = build_all_series(monthly)
             if not specs:
                 print(f"No usable series for {loc}, skipping")
                 continue
-            save_forecast(loc, specs)
+            if args.engine == "serial":
+                with tracker.stage("forecast", location=loc):
+                    save_forecast(loc, specs, source, cache)
+            else:
+                batch.append((loc, specs, source))
         except Exception as e:
             print(f"Failed {loc}: {e}")
 
+    if batch:
+        with tracker.stage("forecast", locations=len(batch)):
+            payloads = forecast_locations(batch, cache)
+        with tracker.stage("write", locations=len(batch)):
+            for loc, result in payloads:
+                write_forecast(loc, result)
+
+    if cache is not None:
+        cache.close()
+        print(cache.summary())
+
+    if tracker.enabled:
+        print(tracker.format())
+        config = {"engine": args.engine, "memory_efficient": args.memory_efficient, "cache": cache is not None}
+        print(f"Wrote {tracker.save('forecast', args.memory_report or None, **config)}")
+
 
 if __name__ == "__main__":
     main()
@@ -18,6 +18,7 @@ VARIABLES_TO_CHECK = [
     'QV2M',
     'ALLSKY_SFC_SW_DWN',
 ]
+QC_MIN_VALID_FRACTION = 0.95  # raw columns with more missing/invalid values than this are reported
 
 
 def _is_number(x) -> bool:
@@ -28,6 +29,26 @@ def _is_number(x) -> bool:
         return False
 
 
+def _validate_packed_yearly(summary_path: str, header: Dict) -> List[str]:
+    issues: List[str] = []
+    for key in ['file', 'dtype', 'shape', 'variables', 'years']:
+        if key not in header:
+            issues.append(f"yearly_values: missing header key: {key}")
+    if issues:
+        return issues
+    bin_path = os.path.join(os.path.dirname(summary_path), header['file'])
+    if not os.path.exists(bin_path):
+        return [f"yearly_values: packed file not found: {bin_path}"]
+    shape = header['shape']
+    if shape[:2] != [len(header['variables']), len(header['years'])]:
+        issues.append(f"yearly_values: shape {shape} does not match variables/years lists")
+    expected = 4 * shape[0] * shape[1] * shape[2]
+    actual = os.path.getsize(bin_path)
+    if actual != expected:
+        issues.append(f"yearly_values: {header['file']} has {actual} bytes, expected {expected}")
+    return issues
+
+
 def validate_json_file(path: str) -> Dict:
     t0 = time.perf_counter()
     with open(path, 'r', encoding='utf-8') as f:
@@ -78,6 +99,10 @@ def validate_json_file(path: str) -> Dict:
                 if p is None or not _is_number(p) or not (0.0 <= float(p) <= 1.0):
                     issues.append(f"{var} DOY {dstr}: probability {name} out of bounds: {p}")
 
+    # Compact format: yearly values live in a packed float32 file referenced from the summary
+    if data.get('format') == 'compact':
+        issues.extend(_validate_packed_yearly(path, data.get('yearly_values', {})))
+
     return {
         'path': path,
         'size_kb': os.path.getsize(path) / 1024.0,
@@ -86,14 +111,32 @@ def validate_json_file(path: str) -> Dict:
     }
 
 
+def validate_qc_report(path: str) -> Dict:
+    """Surface raw-data problems recorded by raw_qc: columns left with too few valid values."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    issues: List[str] = []
+    for resolution in ['daily', 'hourly']:
+        for var, entry in data.get(resolution, {}).get('variables', {}).items():
+            if entry.get('valid_fraction', 0.0) < QC_MIN_VALID_FRACTION:
+                issues.append(f"{resolution} {var}: only {entry['valid_fraction']:.1%} valid raw values "
+                              f"({entry['fill_values']} fill, {entry['out_of_range']} out of range, "
+                              f"longest gap {entry['longest_gap']})")
+    return {'path': path, 'size_kb': os.path.getsize(path) / 1024.0, 'load_ms': 0.0, 'issues': issues}
+
+
 def validate_json_files():
     processed_dir = os.path.join('data', 'processed')
     reports = []
     for city in ['tbilisi', 'batumi', 'kutaisi']:
-        daily_path = os.path.join(processed_dir, f'{city}_daily_stats.json')
+        daily_paths = [
+            os.path.join(processed_dir, f'{city}_daily_stats.json'),
+            os.path.join(processed_dir, f'{city}_daily_summary.json'),
+        ]
         hourly_path = os.path.join(processed_dir, f'{city}_hourly_stats.json')
-        if os.path.exists(daily_path):
-            reports.append(validate_json_file(daily_path))
+        for daily_path in daily_paths:
+            if os.path.exists(daily_path):
+                reports.append(validate_json_file(daily_path))
         if os.path.exists(hourly_path):
             # Lightweight check for hourly
             t0 = time.perf_counter()
@@ -101,6 +144,9 @@ def validate_json_files():
                 _ = json.load(f)
             load_ms = (time.perf_counter() - t0) * 1000.0
             reports.append({'path': hourly_path, 'size_kb': os.path.getsize(hourly_path) / 1024.0, 'load_ms': load_ms, 'issues': []})
+        qc_path = os.path.join(processed_dir, f'{city}_qc_report.json')
+        if os.path.exists(qc_path):
+            reports.append(validate_qc_report(qc_path))
 
     # Print summary
     any_issues = False